@@ -2,7 +2,7 @@
 
 import React, {useEffect, useState, useRef} from "react";
 import Image from "next/image";
-import {apiFetch, BASE_MINI} from "@/app/api/api";
+import {apiFetch, BASE_MINI, BASE_URL} from "@/app/api/api";
 import backImage from "@/app/assets/backimage.svg";
 import Link from "next/link";
 import {useParams, useSearchParams} from "next/navigation";
@@ -64,6 +64,13 @@ const STATUS_STEPS: StatusStep[] = [
 
 const TABLE_PAGE_SIZE = 30;
 
+// Если разметка не сохранена заранее, бэкенд отрисует её по запросу
+const getResultSrc = (item: BatchItem): string | null => {
+    if (item.result !== null) return `${BASE_MINI}ml-media/${item.result}`;
+    if (item.preview !== null) return `${BASE_URL}vision/images/${item.id}/render/`;
+    return null;
+};
+
 export default function ProjectPage() {
     const {id} = useParams();
     const [photos, setPhotos] = useState<BatchItem[]>([]);
@@ -148,6 +155,35 @@ export default function ProjectPage() {
         loadInitialData();
     }, [id]);
 
+    // Прогресс обработки приходит потоком событий, без опроса статуса
+    useEffect(() => {
+        const source = new EventSource(`${BASE_URL}vision/batches/${id}/events/`);
+        let updated = false;
+
+        source.addEventListener("image", (event) => {
+            const data = JSON.parse((event as MessageEvent).data);
+            updated = true;
+            setPhotos(prev => prev.map(photo =>
+                photo.id === data.image_id
+                    ? {...photo, preview: data.preview, result: data.result}
+                    : photo
+            ));
+            setBatchStatus(prev =>
+                prev && prev.processing_status === "not_processed"
+                    ? {...prev, processing_status: "processing"}
+                    : prev
+            );
+        });
+
+        source.addEventListener("done", () => {
+            source.close();
+            // Дефекты и координаты подтягиваем одним запросом после окончания обработки
+            if (updated) loadInitialData();
+        });
+
+        return () => source.close();
+    }, [id]);
+
     useEffect(() => {
         const observer = new IntersectionObserver(
             (entries) => {
@@ -770,9 +806,9 @@ export default function ProjectPage() {
                                 </div>
 
                                 <div className="rounded-lg overflow-hidden bg-[#11111A] p-2 sm:p-3">
-                                    {currentPhoto.result !== null && (
+                                    {getResultSrc(currentPhoto) !== null && (
                                         <Image
-                                            src={`${BASE_MINI}ml-media/${currentPhoto.result}`}
+                                            src={getResultSrc(currentPhoto)!}
                                             alt="С разметкой"
                                             width={400}
                                             height={300}
@@ -780,7 +816,7 @@ export default function ProjectPage() {
                                             className="w-full h-auto object-cover rounded-lg"
                                         />
                                     )}
-                                    {currentPhoto.result === null && (
+                                    {getResultSrc(currentPhoto) === null && (
                                         <div
                                             className="relative w-full aspect-[4/3] flex flex-col items-center justify-center text-center">
                                             <p className="text-[#119BD7]">Находится в обработке</p>
@@ -910,7 +946,7 @@ export default function ProjectPage() {
 
                                         <button
                                             onClick={() => downloadImage(
-                                                `${BASE_MINI}ml-media/${currentPhoto.result}`,
+                                                getResultSrc(currentPhoto) ?? "",
                                                 `processed_${selectedIndex + 1}.jpg`
                                             )}
                                             className="flex-1 flex items-center justify-center gap-2 px-3 sm:px-4 py-2 sm:py-3 border-2 border-[#119BD7] text-[#119BD7] hover:bg-[#119BD7] hover:text-white hover:scale-105 hover:shadow-lg font-semibold rounded-lg transition-all duration-300 ease-in-out transform text-sm group"
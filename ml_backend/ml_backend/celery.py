@@ -1,6 +1,8 @@
 import os
 
 from celery import Celery
+from celery.signals import worker_process_init
+from kombu import Exchange, Queue
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ml_backend.settings')
 app = Celery('ml_backend')
@@ -15,9 +17,54 @@ app.conf.update(
     task_compression='gzip',
     result_compression='gzip',
     task_soft_time_limit=30,
-    worker_max_memory_per_child=150000,
     broker_transport_options={'visibility_timeout': 43200}
 )
 
 app.config_from_object('django.conf:settings', namespace='CELERY')
+
+# Очереди:
+#   inference   — инференс YOLO порциями наборов от диспетчера, долгие задачи;
+#   artifacts   — короткие задачи с бакетом и диспетчером: проверка загруженных файлов,
+#                 досылка порций инференса, удаление оригиналов, превью, результатов;
+#   maintenance — служебные задачи (экспорт моделей и прочее), очередь по умолчанию.
+# Каждую очередь слушает свой воркер, см. docker-compose.yml.
+app.conf.update(
+    task_queues=(
+        Queue('inference', Exchange('inference'), routing_key='inference',
+              queue_arguments={'x-max-priority': 10}),
+        Queue('artifacts', Exchange('artifacts'), routing_key='artifacts',
+              queue_arguments={'x-max-priority': 10}),
+        Queue('maintenance', Exchange('maintenance'), routing_key='maintenance',
+              queue_arguments={'x-max-priority': 10}),
+    ),
+    task_default_queue='maintenance',
+    task_default_exchange='maintenance',
+    task_default_routing_key='maintenance',
+    task_routes={
+        'vision.tasks.process_batch_task': {'queue': 'inference'},
+        'vision.tasks.delete_artifacts_task': {'queue': 'artifacts'},
+        'vision.tasks.confirm_batch_task': {'queue': 'artifacts'},
+        'vision.tasks.dispatch_task': {'queue': 'artifacts'},
+        'vision.tasks.export_model_task': {'queue': 'maintenance'},
+        'vision.tasks.reconcile_progress_task': {'queue': 'maintenance'},
+    },
+    task_queue_max_priority=10,
+    task_default_priority=5,
+    # Воркер берёт следующую задачу только после подтверждения текущей,
+    # поэтому долгий набор не держит у себя сообщения, которые мог бы взять свободный воркер
+    worker_prefetch_multiplier=1,
+)
+
 app.autodiscover_tasks()
+
+
+@worker_process_init.connect
+def preload_models(**kwargs):
+    from django.conf import settings
+
+    if not settings.VISION_PRELOAD_ENABLED:
+        return
+
+    from vision.registry import registry
+
+    registry.warm_up()
@@ -180,6 +180,7 @@ AWS_S3_REGION_NAME = "us-east-1"
 AWS_STORAGE_BUCKET_NAME = "ml-media"
 AWS_S3_USE_SSL = False
 AWS_S3_VERIFY = False
+AWS_S3_MAX_POOL_CONNECTIONS = int(os.getenv("AWS_S3_MAX_POOL_CONNECTIONS", "32"))
 
 S3_CLIENT_PUBLIC = boto3.client(
     "s3",
@@ -195,7 +196,10 @@ S3_CLIENT_PRIVATE = boto3.client(
     endpoint_url=AWS_S3_ENDPOINT_URL_PRIVATE,
     aws_access_key_id=AWS_ACCESS_KEY_ID,
     aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    config=Config(signature_version="s3v4"),
+    config=Config(
+        signature_version="s3v4",
+        max_pool_connections=AWS_S3_MAX_POOL_CONNECTIONS,
+    ),
     region_name=AWS_S3_REGION_NAME,
 )
 
@@ -254,6 +258,83 @@ CELERY_TASK_TRACK_STARTED = os.getenv("CELERY_TASK_TRACK_STARTED", "True").lower
     "1",
 )
 CELERY_TIMEZONE = os.getenv("CELERY_TIMEZONE", "UTC")
+CELERY_WORKER_MAX_MEMORY_PER_CHILD = int(
+    os.getenv("CELERY_WORKER_MAX_MEMORY_PER_CHILD", "2000000")
+)
+CELERY_BEAT_SCHEDULE = {
+    # Счётчики прогресса наборов в Redis сверяются с БД
+    "reconcile-batch-progress": {
+        "task": "vision.tasks.reconcile_progress_task",
+        "schedule": int(os.getenv("VISION_PROGRESS_RECONCILE_INTERVAL", "300")),
+    },
+}
+# Приоритеты сообщений Celery (0–10, больше — раньше).
+# Первая порция каждого набора (VISION_PRIORITY_IMAGE) обгоняет продолжение
+# уже идущих наборов (VISION_PRIORITY_BATCH), чтобы небольшая загрузка
+# не ждала окончания обработки многотысячного набора.
+VISION_PRIORITY_IMAGE = int(os.getenv("VISION_PRIORITY_IMAGE", "7"))
+VISION_PRIORITY_BATCH = int(os.getenv("VISION_PRIORITY_BATCH", "3"))
+VISION_PRIORITY_CLEANUP = int(os.getenv("VISION_PRIORITY_CLEANUP", "2"))
+# Диспетчер наборов: сколько задач инференса одновременно находится в брокере,
+# по сколько изображений в задаче и через сколько секунд неотчитавшаяся задача
+# перестаёт занимать место (не меньше time_limit process_batch_task)
+VISION_DISPATCH_WINDOW = int(os.getenv("VISION_DISPATCH_WINDOW", "8"))
+VISION_DISPATCH_UNIT = int(os.getenv("VISION_DISPATCH_UNIT", "32"))
+VISION_DISPATCH_DEADLINE = int(os.getenv("VISION_DISPATCH_DEADLINE", "3660"))
+# Диспетчер не добавляет задачи, пока в очереди inference больше сообщений, чем здесь,
+# и раз в VISION_DISPATCH_RECHECK секунд перепроверяет окно, пока есть работа
+VISION_DISPATCH_MAX_QUEUE_DEPTH = int(os.getenv("VISION_DISPATCH_MAX_QUEUE_DEPTH", "16"))
+VISION_DISPATCH_RECHECK = int(os.getenv("VISION_DISPATCH_RECHECK", "30"))
+
+# Инференс
+VISION_IMGSZ = 768
+VISION_CONF = 0.25
+# Сколько изображений прогоняется через модель за один вызов predict
+VISION_CHUNK_SIZE = int(os.getenv("VISION_CHUNK_SIZE", "8"))
+# Сколько результатов пакетной обработки записывать в БД одной транзакцией
+VISION_RESULT_FLUSH_SIZE = int(os.getenv("VISION_RESULT_FLUSH_SIZE", "32"))
+# Сколько тайлов подавать в один вызов predict в тайловом режиме
+VISION_TILE_BATCH = int(os.getenv("VISION_TILE_BATCH", "8"))
+VISION_MODEL_CACHE_MAX_BYTES = int(
+    os.getenv("VISION_MODEL_CACHE_MAX_BYTES", str(512 * 1024 * 1024))
+)
+VISION_PREFETCH_DEPTH = int(os.getenv("VISION_PREFETCH_DEPTH", "16"))
+VISION_DOWNLOAD_WORKERS = int(os.getenv("VISION_DOWNLOAD_WORKERS", "4"))
+VISION_UPLOAD_WORKERS = int(os.getenv("VISION_UPLOAD_WORKERS", "4"))
+VISION_UPLOAD_MAX_PENDING = int(os.getenv("VISION_UPLOAD_MAX_PENDING", "16"))
+VISION_ARTIFACT_WORKERS = int(os.getenv("VISION_ARTIFACT_WORKERS", "8"))
+# eager — размеченное изображение сохраняется в results/ сразу после инференса,
+# lazy — рисуется по detection_result при первом запросе
+VISION_RESULT_RENDER = os.getenv("VISION_RESULT_RENDER", "eager")
+VISION_RENDER_CACHE_MAX_BYTES = int(
+    os.getenv("VISION_RENDER_CACHE_MAX_BYTES", str(256 * 1024 * 1024))
+)
+# Кэш результатов инференса по хешу содержимого снимка
+VISION_RESULT_CACHE_MAX_BYTES = int(
+    os.getenv("VISION_RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+)
+# Кэш ответов списков и статистики, сбрасывается счётчиками версий
+VISION_RESPONSE_CACHE_MAX_BYTES = int(
+    os.getenv("VISION_RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024))
+)
+# Сколько снимков создаётся одним bulk_create при потоковой инициализации набора
+VISION_INIT_CHUNK_SIZE = int(os.getenv("VISION_INIT_CHUNK_SIZE", "500"))
+# Срок действия (с) и максимальный размер файла POST-политики загрузки в каталог набора
+VISION_UPLOAD_POLICY_EXPIRES = int(os.getenv("VISION_UPLOAD_POLICY_EXPIRES", "900"))
+VISION_UPLOAD_MAX_BYTES = int(os.getenv("VISION_UPLOAD_MAX_BYTES", str(50 * 1024 * 1024)))
+# Интервал (с) служебных сообщений в потоке событий набора при отсутствии событий
+VISION_EVENTS_HEARTBEAT = int(os.getenv("VISION_EVENTS_HEARTBEAT", "15"))
+VISION_INT8_CALIBRATION_IMAGES = int(os.getenv("VISION_INT8_CALIBRATION_IMAGES", "300"))
+VISION_PRELOAD_MODELS = [
+    int(model_id)
+    for model_id in os.getenv("VISION_PRELOAD_MODELS", "").split(",")
+    if model_id.strip()
+]
+# Воркерам без инференса (очереди artifacts, maintenance) модели заранее не нужны
+VISION_PRELOAD_ENABLED = os.getenv("VISION_PRELOAD_ENABLED", "True").lower() in (
+    "true",
+    "1",
+)
 
 DATABASES = {
     "default": {
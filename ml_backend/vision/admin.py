@@ -1,33 +1,74 @@
 from django.contrib import admin
 from unfold.admin import ModelAdmin
 
-from .models import AiModel, Batch, LepImage
+from .models import AiModel, Batch, BatchStats, DailyClassStats, Detection, LepImage
 
 
 @admin.register(AiModel)
 class AiModelAdmin(ModelAdmin):
-    list_display = ("name", "uploaded_at",)
+    list_display = ("name", "uploaded_at", "engine", "tile_size")
     search_fields = ("name",)
-    readonly_fields = ("uploaded_at",)
+    readonly_fields = ("uploaded_at", "engine_path", "engine_build")
+    actions = ("rebuild_engine",)
+
+    @admin.action(description="Пересобрать экспорт для CPU")
+    def rebuild_engine(self, request, queryset):
+        from .tasks import export_model_task
+
+        for model_obj in queryset.exclude(engine=AiModel.Engine.PYTORCH):
+            export_model_task.delay(model_obj.id)
 
 
 
 @admin.register(Batch)
 class BatchAdmin(ModelAdmin):
-    list_display = ("name", "id", "uploaded_at", "photo_count")
+    list_display = ("name", "id", "uploaded_at", "photo_count", "state")
+    list_filter = ("state",)
+    list_select_related = ("stats",)
     search_fields = ("name",)
-    readonly_fields = ("uploaded_at",)
+    readonly_fields = ("uploaded_at", "state")
 
     def photo_count(self, obj):
-        return obj.lepimage_set.count()
+        batch_stats = getattr(obj, "stats", None)
+        return batch_stats.total if batch_stats else 0
     photo_count.short_description = "Количество фото"
 
 
 @admin.register(LepImage)
 class LepImageAdmin(ModelAdmin):
-    list_display = ("file_key", "created_at", "latitude", "longitude")
-    list_filter = ("batch",)
+    list_display = ("file_key", "created_at", "latitude", "longitude", "has_damage", "damage_count")
+    list_filter = ("batch", "has_damage")
     autocomplete_fields = ("batch",)
     search_fields = ("file_key",)
-    readonly_fields = ("created_at",)
+    readonly_fields = (
+        "created_at",
+        "has_damage",
+        "damage_count",
+        "object_count",
+        "max_damage_confidence",
+        "class_counts",
+    )
     exclude = ("detection_result",)
+
+
+@admin.register(Detection)
+class DetectionAdmin(ModelAdmin):
+    list_display = ("class_name", "confidence", "image", "batch", "created_at")
+    list_filter = ("class_name",)
+    list_select_related = ("image", "batch")
+    raw_id_fields = ("image", "batch")
+    readonly_fields = ("created_at",)
+
+
+@admin.register(BatchStats)
+class BatchStatsAdmin(ModelAdmin):
+    list_display = ("batch", "day", "total", "processed", "images_with_damage", "damage_count")
+    list_select_related = ("batch",)
+    readonly_fields = ("batch", "day", "total", "processed", "images_with_damage", "damage_count")
+
+
+@admin.register(DailyClassStats)
+class DailyClassStatsAdmin(ModelAdmin):
+    list_display = ("day", "class_name", "count")
+    list_filter = ("class_name",)
+    readonly_fields = ("day", "class_name", "count")
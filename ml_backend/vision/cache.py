@@ -0,0 +1,122 @@
+import time
+
+from django_redis import get_redis_connection
+
+# Запись значения и обновление счётчика байт одним шагом: прежний размер
+# читается и вычитается атомарно, параллельные перезаписи ключа
+# не оставляют в счётчике лишних байт
+SET_SCRIPT = """
+local old_size = tonumber(redis.call("HGET", KEYS[3], ARGV[1]) or "0")
+local size = string.len(ARGV[2])
+redis.call("SET", KEYS[1], ARGV[2])
+redis.call("ZADD", KEYS[2], ARGV[3], ARGV[1])
+redis.call("HSET", KEYS[3], ARGV[1], size)
+return redis.call("INCRBY", KEYS[4], size - old_size)
+"""
+
+REMOVE_SCRIPT = """
+local size = tonumber(redis.call("HGET", KEYS[3], ARGV[1]) or "0")
+redis.call("DEL", KEYS[1])
+redis.call("ZREM", KEYS[2], ARGV[1])
+redis.call("HDEL", KEYS[3], ARGV[1])
+return redis.call("DECRBY", KEYS[4], size)
+"""
+
+
+class BoundedCache:
+    """
+    LRU-кэш бинарных значений в Redis с ограничением суммарного размера.
+
+    Размеры записей хранятся в отдельном хеше, порядок использования —
+    в sorted set по времени последнего обращения. При превышении ``max_bytes``
+    удаляются самые давние записи. Счётчики попаданий и промахов
+    общие для всех процессов.
+    """
+
+    def __init__(self, prefix: str, max_bytes: int):
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self._set_script = None
+        self._remove_script = None
+
+    @property
+    def redis(self):
+        return get_redis_connection("default")
+
+    def _data_key(self, key: str) -> str:
+        return f"{self.prefix}:data:{key}"
+
+    @property
+    def _lru_key(self) -> str:
+        return f"{self.prefix}:lru"
+
+    @property
+    def _sizes_key(self) -> str:
+        return f"{self.prefix}:sizes"
+
+    @property
+    def _bytes_key(self) -> str:
+        return f"{self.prefix}:bytes"
+
+    @property
+    def _stats_key(self) -> str:
+        return f"{self.prefix}:stats"
+
+    def get(self, key: str):
+        redis = self.redis
+        data = redis.get(self._data_key(key))
+        if data is None:
+            redis.hincrby(self._stats_key, "misses", 1)
+            return None
+
+        pipe = redis.pipeline()
+        pipe.zadd(self._lru_key, {key: time.time()})
+        pipe.hincrby(self._stats_key, "hits", 1)
+        pipe.execute()
+        return data
+
+    def set(self, key: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+
+        if self._set_script is None:
+            self._set_script = self.redis.register_script(SET_SCRIPT)
+        self._set_script(keys=self._keys(key), args=[key, data, time.time()], client=self.redis)
+
+        self._evict()
+
+    def delete(self, *keys: str):
+        for key in keys:
+            self._remove(key)
+
+    def stats(self) -> dict:
+        redis = self.redis
+        stats = {k.decode(): int(v) for k, v in redis.hgetall(self._stats_key).items()}
+        hits = stats.get("hits", 0)
+        misses = stats.get("misses", 0)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "entries": redis.zcard(self._lru_key),
+            "bytes": int(redis.get(self._bytes_key) or 0),
+            "max_bytes": self.max_bytes,
+        }
+
+    def _keys(self, key: str) -> list:
+        return [self._data_key(key), self._lru_key, self._sizes_key, self._bytes_key]
+
+    def _remove(self, key: str):
+        if self._remove_script is None:
+            self._remove_script = self.redis.register_script(REMOVE_SCRIPT)
+        self._remove_script(keys=self._keys(key), args=[key], client=self.redis)
+
+    def _evict(self):
+        redis = self.redis
+        while int(redis.get(self._bytes_key) or 0) > self.max_bytes:
+            oldest = redis.zpopmin(self._lru_key, 1)
+            if not oldest:
+                break
+            key = oldest[0][0].decode()
+            self._remove(key)
+            redis.hincrby(self._stats_key, "evictions", 1)
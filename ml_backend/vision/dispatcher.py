@@ -0,0 +1,273 @@
+import json
+import time
+
+from celery.utils import uuid
+from django.conf import settings
+from django_redis import get_redis_connection
+
+
+class BatchDispatcher:
+    """
+    Диспетчер, справедливо распределяющий инференс между наборами.
+
+    Изображения набора не отправляются в брокер целиком: их id лежат
+    в Redis в очереди набора, а в RabbitMQ одновременно находится не больше
+    ``window`` задач process_batch_task по ``unit_size`` изображений.
+    Освободившееся место наборы получают по кругу: после отправки порции
+    набор встаёт в конец очереди, а новый набор получает первую порцию
+    вне очереди. Поэтому маленький набор, подтверждённый после огромного,
+    получает первые результаты через одну порцию, а дальше наборы
+    чередуются по одной порции и огромный набор не простаивает,
+    пока новый догоняет его по числу порций.
+
+    Кроме окна учитывается фактическая глубина очереди в RabbitMQ:
+    если её заполнили другие источники (повторы задач, задачи,
+    отправленные в обход диспетчера),
+    диспетчер ждёт, пока воркеры её разберут. Пока в очереди диспетчера
+    есть работа, раз в ``recheck`` секунд запускается dispatch_task,
+    поэтому обработка продолжается, даже если воркер с задачей из окна погиб.
+
+    Ключи Redis:
+        {prefix}:pending:{batch_id} — список id изображений, ждущих отправки
+        {prefix}:sent:{batch_id}    — sorted set id отправленных, ещё не обработанных
+                                      изображений с дедлайном задачи в score
+        {prefix}:task:{task_id}     — набор и id изображений задачи из окна (JSON)
+        {prefix}:batches            — хеш batch_id -> параметры набора (JSON),
+                                      turn — место набора в круге
+        {prefix}:turn               — счётчик мест в круге
+        {prefix}:inflight           — sorted set id задач с дедлайном в score
+    """
+
+    def __init__(self, prefix: str, window: int, unit_size: int, deadline: int,
+                 queue: str, max_queue_depth: int, recheck: int):
+        self.prefix = prefix
+        self.window = window
+        self.unit_size = unit_size
+        self.deadline = deadline
+        self.queue = queue
+        self.max_queue_depth = max_queue_depth
+        self.recheck = recheck
+
+    @property
+    def redis(self):
+        return get_redis_connection("default")
+
+    def _pending_key(self, batch_id: int) -> str:
+        return f"{self.prefix}:pending:{batch_id}"
+
+    def _sent_key(self, batch_id: int) -> str:
+        return f"{self.prefix}:sent:{batch_id}"
+
+    def _task_key(self, task_id: str) -> str:
+        return f"{self.prefix}:task:{task_id}"
+
+    @property
+    def _batches_key(self) -> str:
+        return f"{self.prefix}:batches"
+
+    @property
+    def _inflight_key(self) -> str:
+        return f"{self.prefix}:inflight"
+
+    @property
+    def _turn_key(self) -> str:
+        return f"{self.prefix}:turn"
+
+    @property
+    def _lock_key(self) -> str:
+        return f"{self.prefix}:lock"
+
+    @property
+    def _recheck_key(self) -> str:
+        return f"{self.prefix}:recheck"
+
+    def enqueue(self, batch_id: int, model_id: int, image_ids: list, chunk_size: int):
+        """
+        Ставит изображения набора в очередь диспетчера и сразу пытается
+        отправить то, что помещается в окно.
+
+        Очередь набора заменяется: повторное подтверждение передаёт все
+        необработанные изображения, и дубли в очереди не появляются.
+        Изображения, уже отправленные в задачах окна, пропускаются.
+        """
+        redis = self.redis
+        with redis.lock(self._lock_key, timeout=60, blocking_timeout=10):
+            sent_key = self._sent_key(batch_id)
+            redis.zremrangebyscore(sent_key, "-inf", time.time())
+            if image_ids and redis.zcard(sent_key):
+                sent = redis.zmscore(sent_key, image_ids)
+                image_ids = [image_id for image_id, score in zip(image_ids, sent) if score is None]
+
+            pending_key = self._pending_key(batch_id)
+            if not image_ids:
+                redis.delete(pending_key)
+                redis.hdel(self._batches_key, batch_id)
+                return
+
+            state = redis.hget(self._batches_key, batch_id)
+            # Новый набор с turn 0 стоит в круге первым
+            state = json.loads(state) if state else {"served": 0, "turn": 0, "created": time.time()}
+            state.update(model_id=model_id, chunk_size=chunk_size)
+
+            pipe = redis.pipeline()
+            pipe.delete(pending_key)
+            pipe.rpush(pending_key, *image_ids)
+            pipe.hset(self._batches_key, batch_id, json.dumps(state))
+            pipe.execute()
+
+        self.dispatch()
+
+    def release(self, task_id: str) -> bool:
+        """
+        Освобождает место в окне и снимает отметку об отправке с изображений
+        задачи. Возвращает True, если задача была от диспетчера.
+        """
+        redis = self.redis
+        task = redis.get(self._task_key(task_id))
+        if task:
+            task = json.loads(task)
+            pipe = redis.pipeline()
+            pipe.zrem(self._sent_key(task["batch_id"]), *task["image_ids"])
+            pipe.delete(self._task_key(task_id))
+            pipe.execute()
+        return bool(redis.zrem(self._inflight_key, task_id))
+
+    def dispatch(self) -> int:
+        """
+        Заполняет свободные места окна порциями из наборов.
+
+        Returns:
+            int: количество отправленных задач
+        """
+        from .tasks import process_batch_task
+
+        redis = self.redis
+        sent = 0
+        with redis.lock(self._lock_key, timeout=60, blocking_timeout=10):
+            # Задачи, не отчитавшиеся до дедлайна (воркер убит), место не занимают
+            redis.zremrangebyscore(self._inflight_key, "-inf", time.time())
+            free = min(
+                self.window - redis.zcard(self._inflight_key),
+                self.max_queue_depth - self.queue_depth(),
+            )
+
+            while free > 0:
+                picked = self._pick_batch()
+                if picked is None:
+                    break
+                batch_id, state = picked
+
+                pending_key = self._pending_key(batch_id)
+                pipe = redis.pipeline()
+                pipe.lrange(pending_key, 0, self.unit_size - 1)
+                pipe.ltrim(pending_key, self.unit_size, -1)
+                image_ids, _ = pipe.execute()
+                if not image_ids:
+                    redis.hdel(self._batches_key, batch_id)
+                    continue
+
+                # Место в окне занимается до публикации, иначе быстрая задача
+                # может завершиться раньше, чем её id попадёт в окно
+                task_id = uuid()
+                deadline = time.time() + self.deadline
+                image_ids = [int(image_id) for image_id in image_ids]
+                pipe = redis.pipeline()
+                pipe.zadd(self._inflight_key, {task_id: deadline})
+                pipe.zadd(self._sent_key(batch_id), {image_id: deadline for image_id in image_ids})
+                pipe.expire(self._sent_key(batch_id), self.deadline)
+                pipe.set(
+                    self._task_key(task_id),
+                    json.dumps({"batch_id": batch_id, "image_ids": image_ids}),
+                    ex=self.deadline,
+                )
+                pipe.execute()
+                process_batch_task.apply_async(
+                    (batch_id, state["model_id"], state["chunk_size"]),
+                    {"image_ids": image_ids},
+                    task_id=task_id,
+                    priority=self._priority(state),
+                )
+
+                state["served"] += 1
+                state["turn"] = redis.incr(self._turn_key)
+                if redis.llen(pending_key):
+                    redis.hset(self._batches_key, batch_id, json.dumps(state))
+                else:
+                    redis.hdel(self._batches_key, batch_id)
+
+                free -= 1
+                sent += 1
+
+        if redis.hlen(self._batches_key):
+            self._schedule_recheck()
+        return sent
+
+    def queue_depth(self) -> int:
+        """
+        Количество сообщений, ждущих воркера в очереди брокера.
+        Если брокер не ответил, ограничением служит только окно.
+        """
+        from ml_backend.celery import app
+
+        try:
+            with app.connection_for_read() as connection:
+                return connection.default_channel.queue_declare(
+                    queue=self.queue, passive=True
+                ).message_count
+        except Exception:
+            return 0
+
+    def _schedule_recheck(self):
+        from .tasks import dispatch_task
+
+        # Одна отложенная проверка на все процессы
+        if self.redis.set(self._recheck_key, 1, nx=True, ex=self.recheck):
+            dispatch_task.apply_async(countdown=self.recheck)
+
+    def _pick_batch(self):
+        """
+        Следующий по кругу набор: с наименьшим turn, при равенстве — самый старый.
+        """
+        batches = self.redis.hgetall(self._batches_key)
+        if not batches:
+            return None
+
+        batch_id, state = min(
+            ((int(batch_id), json.loads(state)) for batch_id, state in batches.items()),
+            key=lambda item: (item[1].get("turn", 0), item[1]["created"]),
+        )
+        return batch_id, state
+
+    def _priority(self, state: dict) -> int:
+        # Первая порция набора обгоняет продолжение уже идущих наборов
+        if state["served"] == 0:
+            return settings.VISION_PRIORITY_IMAGE
+        return settings.VISION_PRIORITY_BATCH
+
+    def stats(self) -> dict:
+        redis = self.redis
+        batches = redis.hgetall(self._batches_key)
+        return {
+            "inflight": redis.zcard(self._inflight_key),
+            "window": self.window,
+            "queue_depth": self.queue_depth(),
+            "batches": {
+                int(batch_id): {
+                    **json.loads(state),
+                    "pending": redis.llen(self._pending_key(int(batch_id))),
+                }
+                for batch_id, state in batches.items()
+            },
+        }
+
+
+dispatcher = BatchDispatcher(
+    "dispatch",
+    window=settings.VISION_DISPATCH_WINDOW,
+    unit_size=settings.VISION_DISPATCH_UNIT,
+    deadline=settings.VISION_DISPATCH_DEADLINE,
+    queue="inference",
+    max_queue_depth=settings.VISION_DISPATCH_MAX_QUEUE_DEPTH,
+    recheck=settings.VISION_DISPATCH_RECHECK,
+)
+
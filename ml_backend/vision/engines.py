@@ -0,0 +1,179 @@
+import logging
+import os
+import tempfile
+
+import numpy as np
+import yaml
+from django.conf import settings
+from ultralytics import YOLO
+
+from .models import AiModel, LepImage
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    AiModel.Engine.ONNX: "onnx",
+    AiModel.Engine.OPENVINO: "openvino",
+    AiModel.Engine.OPENVINO_INT8: "openvino",
+}
+
+
+def export_engine(model_obj: AiModel) -> str:
+    """
+    Экспортирует веса модели в формат выбранного движка.
+
+    Экспорт делает ultralytics, результат кладётся рядом с исходным файлом:
+    ``best.onnx`` или каталог ``best_openvino_model/``. Вход динамический,
+    чтобы работали пакетный и тайловый режимы.
+
+    Для OpenVINO INT8 веса квантуются после обучения (NNCF), калибровка
+    идёт по оригиналам уже загруженных снимков, см. build_calibration_dataset.
+
+    Returns:
+        str: путь к экспортированной модели относительно MEDIA_ROOT
+    """
+    export_format = EXPORT_FORMATS[model_obj.engine]
+    model = YOLO(model_obj.model_file.path)
+
+    if model_obj.engine != AiModel.Engine.OPENVINO_INT8:
+        exported_path = model.export(
+            format=export_format,
+            imgsz=settings.VISION_IMGSZ,
+            dynamic=True,
+            half=False,
+        )
+        return os.path.relpath(exported_path, settings.MEDIA_ROOT)
+
+    with tempfile.TemporaryDirectory() as directory:
+        data = build_calibration_dataset(
+            model.names, directory, settings.VISION_INT8_CALIBRATION_IMAGES
+        )
+        exported_path = model.export(
+            format=export_format,
+            imgsz=settings.VISION_IMGSZ,
+            dynamic=True,
+            int8=True,
+            data=data,
+        )
+    return os.path.relpath(exported_path, settings.MEDIA_ROOT)
+
+
+def build_calibration_dataset(names: dict, directory: str, limit: int) -> str:
+    """
+    Собирает калибровочный набор для INT8 из оригиналов LepImage.
+
+    Разметка для калибровки не нужна: снимки попадают в набор как фон,
+    NNCF использует их только для сбора статистики активаций.
+
+    Returns:
+        str: путь к data.yaml в формате ultralytics
+    """
+    images_dir = os.path.join(directory, "images", "val")
+    os.makedirs(images_dir)
+
+    s3_client = settings.S3_CLIENT_PRIVATE
+    keys = LepImage.objects.order_by("?").values_list("file_key", flat=True)[:limit]
+
+    count = 0
+    for key in keys:
+        try:
+            obj = s3_client.get_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=key)
+        except Exception as e:
+            logger.warning("Skipping calibration image %s: %s", key, e)
+            continue
+        with open(os.path.join(images_dir, os.path.basename(key)), "wb") as f:
+            f.write(obj["Body"].read())
+        count += 1
+
+    if not count:
+        raise ValueError("Нет изображений для калибровки INT8")
+
+    data_path = os.path.join(directory, "data.yaml")
+    with open(data_path, "w") as f:
+        yaml.safe_dump(
+            {"path": directory, "train": "images/val", "val": "images/val", "names": names},
+            f,
+            allow_unicode=True,
+        )
+    return data_path
+
+
+def engine_weights_path(model_obj: AiModel):
+    """
+    Путь к экспортированной модели, если она собрана для текущих движка и файла весов.
+    """
+    if model_obj.engine == AiModel.Engine.PYTORCH or not model_obj.engine_path:
+        return None
+    if model_obj.engine_build != model_obj.engine_signature():
+        return None
+
+    path = os.path.join(settings.MEDIA_ROOT, model_obj.engine_path)
+    return path if os.path.exists(path) else None
+
+
+def load_engine(model_obj: AiModel):
+    """
+    Загружает модель в выбранном движке, при недоступности — исходные веса PyTorch.
+
+    Returns:
+        tuple: (модель YOLO, путь к загруженным весам, имя движка)
+    """
+    path = engine_weights_path(model_obj)
+    if path is not None:
+        try:
+            return YOLO(path, task="detect"), path, model_obj.engine
+        except Exception as e:
+            logger.warning(
+                "Failed to load %s engine for model %s, falling back to PyTorch: %s",
+                model_obj.engine, model_obj.id, e,
+            )
+
+    path = model_obj.model_file.path
+    return YOLO(path), path, AiModel.Engine.PYTORCH
+
+
+def match_detections(reference: list, candidate: list, iou_threshold: float = 0.5) -> dict:
+    """
+    Сравнивает детекции двух движков на одном изображении.
+
+    Рамки сопоставляются жадно по убыванию уверенности: пара засчитывается,
+    если классы совпадают и IoU не ниже порога.
+
+    Returns:
+        dict: число совпавших рамок, рамок в каждом наборе и средний модуль
+        разницы уверенности у совпавших пар
+    """
+    matched = 0
+    confidence_delta = 0.0
+    used = set()
+
+    for ref in sorted(reference, key=lambda item: -item["confidence"]):
+        best_iou, best_index = 0.0, None
+        for index, cand in enumerate(candidate):
+            if index in used or cand["class"] != ref["class"]:
+                continue
+            iou = box_iou(ref["bbox"], cand["bbox"])
+            if iou > best_iou:
+                best_iou, best_index = iou, index
+
+        if best_index is not None and best_iou >= iou_threshold:
+            used.add(best_index)
+            matched += 1
+            confidence_delta += abs(ref["confidence"] - candidate[best_index]["confidence"])
+
+    return {
+        "matched": matched,
+        "reference": len(reference),
+        "candidate": len(candidate),
+        "confidence_delta": confidence_delta / matched if matched else 0.0,
+    }
+
+
+def box_iou(a, b) -> float:
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    width = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    height = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
@@ -0,0 +1,104 @@
+import json
+import logging
+
+import redis.asyncio as aioredis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django_redis import get_redis_connection
+
+from .progress import progress
+
+logger = logging.getLogger(__name__)
+
+
+def batch_channel(batch_id: int) -> str:
+    return f"events:batch:{batch_id}"
+
+
+def publish(batch_id: int, event: str, data: dict):
+    """
+    Рассылает событие набора подписчикам через Redis pub/sub.
+    Ошибка публикации не должна ронять обработку, поэтому только логируется.
+    """
+    try:
+        get_redis_connection("default").publish(
+            batch_channel(batch_id), json.dumps({"event": event, "data": data})
+        )
+    except Exception as e:
+        logger.warning("Failed to publish %s event for batch %s: %s", event, batch_id, e)
+
+
+def publish_image_processed(image_obj, counters=None):
+    publish(image_obj.batch_id, "image", {
+        "image_id": image_obj.id,
+        "file_key": image_obj.file_key,
+        "detections_count": len(image_obj.detection_result or []),
+        "preview": image_obj.preview,
+        "result": image_obj.result,
+        "progress": counters,
+    })
+
+
+def publish_image_failed(batch_id: int, file_key: str, error: str, counters=None):
+    publish(batch_id, "error", {
+        "file_key": file_key,
+        "error": error,
+        "progress": counters,
+    })
+
+
+def format_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def is_finished(counters: dict) -> bool:
+    return counters["processed"] + counters["failed"] >= counters["total"]
+
+
+async def batch_events(batch_id: int):
+    """
+    Поток Server-Sent Events по набору.
+
+    Сначала отдаётся текущий прогресс, затем события по каждому
+    обработанному снимку. Пока событий нет, раз в VISION_EVENTS_HEARTBEAT
+    секунд отправляется комментарий, чтобы прокси не закрывали соединение.
+    Поток завершается событием ``done``, когда все снимки набора обработаны
+    или завершились ошибкой.
+    """
+    client = aioredis.from_url(settings.REDIS_URL)
+    pubsub = client.pubsub()
+    # Подписка до чтения прогресса, чтобы не потерять события между ними
+    await pubsub.subscribe(batch_channel(batch_id))
+    try:
+        counters = await sync_to_async(progress.get)(batch_id)
+        if counters is None:
+            # Набор удалён после проверки в представлении: поток закрывается,
+            # done не даёт клиенту переподключаться
+            yield format_event("error", {"error": "Batch not found"})
+            yield format_event("done", None)
+            return
+        yield format_event("progress", counters)
+        if counters["reviewed"] or (counters["total"] and is_finished(counters)):
+            yield format_event("done", counters)
+            return
+
+        while True:
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True,
+                timeout=settings.VISION_EVENTS_HEARTBEAT,
+            )
+            if message is None:
+                yield ": ping\n\n"
+                continue
+
+            payload = json.loads(message["data"])
+            yield format_event(payload["event"], payload["data"])
+
+            counters = payload["data"].get("progress")
+            if counters and is_finished(counters):
+                yield format_event("done", counters)
+                return
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
+        await client.aclose()
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from vision.models import LepImage
+from vision.response_cache import bump_versions
+from vision.writer import replace_detections
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет таблицу Detection по detection_result уже обработанных изображений"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk", type=int, default=500, help="Изображений в одной транзакции")
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Пересобрать детекции у всех изображений, а не только у тех, где их нет",
+        )
+
+    def handle(self, *args, **options):
+        images = LepImage.objects.filter(detection_result__isnull=False)
+        if not options["rebuild"]:
+            images = images.filter(detections__isnull=True)
+        images = images.only("id", "batch_id", "detection_result").order_by("id")
+
+        last_id = 0
+        total = 0
+        while True:
+            chunk = list(images.filter(id__gt=last_id)[:options["chunk"]])
+            if not chunk:
+                break
+
+            with transaction.atomic():
+                replace_detections(chunk)
+
+            last_id = chunk[-1].id
+            total += len(chunk)
+            self.stdout.write(f"Обработано изображений: {total}")
+
+        bump_versions()
+        self.stdout.write(self.style.SUCCESS(f"Готово, изображений: {total}"))
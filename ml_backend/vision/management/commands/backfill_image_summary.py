@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from vision.models import LepImage
+from vision.response_cache import bump_versions
+from vision.writer import SUMMARY_FIELDS
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет сводные поля (has_damage, damage_count, object_count, "
+        "max_damage_confidence, class_counts) по detection_result уже обработанных изображений"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk", type=int, default=500, help="Изображений в одном UPDATE")
+
+    def handle(self, *args, **options):
+        images = (
+            LepImage.objects.filter(detection_result__isnull=False)
+            .only("id", "detection_result")
+            .order_by("id")
+        )
+
+        last_id = 0
+        total = 0
+        while True:
+            chunk = list(images.filter(id__gt=last_id)[:options["chunk"]])
+            if not chunk:
+                break
+
+            for image_obj in chunk:
+                image_obj.summarize()
+            LepImage.objects.bulk_update(chunk, fields=SUMMARY_FIELDS)
+
+            last_id = chunk[-1].id
+            total += len(chunk)
+            self.stdout.write(f"Обработано изображений: {total}")
+
+        bump_versions()
+        self.stdout.write(self.style.SUCCESS(f"Готово, изображений: {total}"))
@@ -0,0 +1,99 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from ultralytics import YOLO
+
+from vision.engines import export_engine, match_detections
+from vision.models import AiModel, LepImage
+from vision.tasks import DecodedImage, extract_detections
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает движки инференса (PyTorch, ONNX Runtime, OpenVINO) "
+        "по задержке и пропускной способности и проверяет совпадение детекций с PyTorch"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("model_id", type=int, help="ID модели")
+        parser.add_argument("batch_id", type=int, help="ID набора с оригиналами в бакете")
+        parser.add_argument("--limit", type=int, default=32, help="Сколько изображений взять")
+        parser.add_argument("--chunk-size", type=int, default=8, help="Размер пачки для замера пропускной способности")
+        parser.add_argument(
+            "--engines",
+            default="onnx,openvino",
+            help="Экспортированные движки через запятую",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            model_obj = AiModel.objects.get(id=options["model_id"])
+        except AiModel.DoesNotExist:
+            raise CommandError(f"Модель {options['model_id']} не найдена")
+
+        s3_client = settings.S3_CLIENT_PRIVATE
+        keys = LepImage.objects.filter(batch_id=options["batch_id"]).values_list(
+            "file_key", flat=True
+        )[:options["limit"]]
+        frames = [
+            DecodedImage(
+                s3_client.get_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=key)["Body"].read()
+            ).frame
+            for key in keys
+        ]
+        if not frames:
+            raise CommandError("В наборе нет изображений")
+
+        engines = {AiModel.Engine.PYTORCH: YOLO(model_obj.model_file.path)}
+        for engine in options["engines"].split(","):
+            model_obj.engine = engine
+            self.stdout.write(f"Экспорт в {engine}...")
+            path = os.path.join(settings.MEDIA_ROOT, export_engine(model_obj))
+            engines[engine] = YOLO(path, task="detect")
+
+        self.stdout.write(f"Изображений: {len(frames)}, imgsz={settings.VISION_IMGSZ}")
+        self.stdout.write(
+            f"{'engine':>10} {'latency, ms':>12} {'img/s':>8} {'matched':>10} {'conf delta':>11}"
+        )
+
+        reference = None
+        for engine, model in engines.items():
+            # Прогрев: первый вызов инициализирует предиктор
+            model.predict(frames[0], imgsz=settings.VISION_IMGSZ, verbose=False)
+
+            detections = []
+            started = time.perf_counter()
+            for frame in frames:
+                r = model.predict(
+                    frame, imgsz=settings.VISION_IMGSZ, conf=settings.VISION_CONF,
+                    save=False, verbose=False,
+                )[0]
+                detections.append(extract_detections(r, model.names))
+            latency = (time.perf_counter() - started) / len(frames) * 1000
+
+            chunk_size = options["chunk_size"]
+            started = time.perf_counter()
+            for start in range(0, len(frames), chunk_size):
+                model.predict(
+                    frames[start:start + chunk_size], imgsz=settings.VISION_IMGSZ,
+                    conf=settings.VISION_CONF, save=False, verbose=False,
+                )
+            throughput = len(frames) / (time.perf_counter() - started)
+
+            if reference is None:
+                reference = detections
+
+            matched = total = 0
+            delta = 0.0
+            for ref, cand in zip(reference, detections):
+                parity = match_detections(ref, cand)
+                matched += parity["matched"]
+                total += max(parity["reference"], parity["candidate"])
+                delta += parity["confidence_delta"] * parity["matched"]
+
+            self.stdout.write(
+                f"{engine:>10} {latency:12.1f} {throughput:8.2f} "
+                f"{matched:>4}/{total:<5} {delta / matched if matched else 0.0:11.4f}"
+            )
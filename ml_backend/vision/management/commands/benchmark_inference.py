@@ -0,0 +1,75 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from vision.models import AiModel, LepImage
+from vision.registry import registry
+from vision.tasks import DecodedImage
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает скорость инференса (изображений в секунду): "
+        "по одному изображению на вызов predict и пачками разного размера"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("model_id", type=int, help="ID модели")
+        parser.add_argument("batch_id", type=int, help="ID набора с оригиналами в бакете")
+        parser.add_argument("--limit", type=int, default=64, help="Сколько изображений взять")
+        parser.add_argument(
+            "--chunk-sizes",
+            default="1,4,8,16",
+            help="Размеры пачек через запятую",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            model_obj = AiModel.objects.get(id=options["model_id"])
+        except AiModel.DoesNotExist:
+            raise CommandError(f"Модель {options['model_id']} не найдена")
+
+        chunk_sizes = [int(size) for size in options["chunk_sizes"].split(",")]
+
+        s3_client = settings.S3_CLIENT_PRIVATE
+        keys = LepImage.objects.filter(batch_id=options["batch_id"]).values_list(
+            "file_key", flat=True
+        )[:options["limit"]]
+
+        # Загружаем байты заранее, чтобы сеть не влияла на замер
+        blobs = []
+        for key in keys:
+            obj = s3_client.get_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=key)
+            blobs.append(obj["Body"].read())
+
+        if not blobs:
+            raise CommandError("В наборе нет изображений")
+
+        registry.warm_up([model_obj.id])
+        model = registry.get(model_obj)
+
+        self.stdout.write(f"Изображений: {len(blobs)}, imgsz={settings.VISION_IMGSZ}")
+
+        started = time.perf_counter()
+        for blob in blobs:
+            model.predict(
+                DecodedImage(blob).frame, imgsz=settings.VISION_IMGSZ, conf=settings.VISION_CONF,
+                save=False, verbose=False,
+            )
+        self._report("per-image", len(blobs), time.perf_counter() - started)
+
+        for chunk_size in chunk_sizes:
+            started = time.perf_counter()
+            for start in range(0, len(blobs), chunk_size):
+                frames = [DecodedImage(blob).frame for blob in blobs[start:start + chunk_size]]
+                model.predict(
+                    frames, imgsz=settings.VISION_IMGSZ, conf=settings.VISION_CONF,
+                    save=False, verbose=False,
+                )
+            self._report(f"chunk={chunk_size}", len(blobs), time.perf_counter() - started)
+
+    def _report(self, label, count, elapsed):
+        self.stdout.write(
+            f"{label:>12}: {count / elapsed:8.2f} img/s ({elapsed:.2f} s)"
+        )
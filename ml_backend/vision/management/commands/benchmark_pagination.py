@@ -0,0 +1,134 @@
+import time
+from urllib.parse import parse_qs, urlparse
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.pagination import Cursor, CursorPagination
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from vision.models import Batch, LepImage
+from vision.pagination import estimate_count
+from vision.views import BatchDetailPagination, BatchPagination
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает время глубоких страниц при навигации по номеру страницы "
+        "(COUNT(*) + OFFSET) и по курсору на синтетических данных. "
+        "Данные создаются во временной транзакции и откатываются"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--images", type=int, default=1_000_000, help="Снимков в одном наборе")
+        parser.add_argument("--batches", type=int, default=100_000, help="Наборов для списка")
+        parser.add_argument("--size", type=int, default=50, help="Размер страницы")
+        parser.add_argument(
+            "--pages",
+            default="1,100,1000,10000,19999",
+            help="Номера страниц через запятую",
+        )
+        parser.add_argument("--repeat", type=int, default=3, help="Повторов на замер, берётся лучший")
+
+    def handle(self, *args, **options):
+        self.size = options["size"]
+        self.repeat = options["repeat"]
+        pages = [int(page) for page in options["pages"].split(",")]
+        self.factory = APIRequestFactory()
+
+        try:
+            with transaction.atomic():
+                self.stdout.write("Создание данных...")
+                batch = self._create_data(options["images"], options["batches"])
+
+                self.stdout.write(f"\nСнимки набора: {options['images']}, страница {self.size}")
+                self._compare(
+                    LepImage.objects.filter(batch=batch).order_by("id"),
+                    BatchDetailPagination,
+                    pages,
+                )
+
+                self.stdout.write(f"\nСписок наборов: {options['batches'] + 1}, страница {self.size}")
+                self._compare(
+                    Batch.objects.order_by("-uploaded_at"),
+                    BatchPagination,
+                    pages,
+                )
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _create_data(self, images, batches):
+        batch = Batch.objects.create(name="benchmark")
+        chunk = 10_000
+        for start in range(0, images, chunk):
+            LepImage.objects.bulk_create(
+                LepImage(batch=batch, file_key=f"uploads/benchmark/{i}.jpg")
+                for i in range(start, min(start + chunk, images))
+            )
+        for start in range(0, batches, chunk):
+            Batch.objects.bulk_create(
+                Batch(name=f"benchmark {i}") for i in range(start, min(start + chunk, batches))
+            )
+        return batch
+
+    def _compare(self, queryset, pagination_class, pages):
+        ordering = pagination_class.cursor_ordering
+        field = ordering[0].lstrip("-")
+
+        exact, exact_time = self._measure(queryset.count)
+        estimate, estimate_time = self._measure(lambda: estimate_count(queryset))
+        self.stdout.write(
+            f"{'COUNT(*)':>12}: {exact:>9} за {exact_time * 1000:8.1f} мс\n"
+            f"{'оценка':>12}: {estimate:>9} за {estimate_time * 1000:8.1f} мс"
+        )
+
+        for page in pages:
+            offset = (page - 1) * self.size
+            if offset >= exact:
+                continue
+
+            _, page_time = self._measure(
+                lambda: self._paginate(pagination_class, queryset, {"page": page})
+            )
+
+            params = {"pagination": "cursor"}
+            if offset:
+                # Курсор, который вернула бы предыдущая страница
+                last = queryset.order_by(*ordering).values_list(field, flat=True)[offset - 1]
+                params["cursor"] = self._cursor(ordering, last)
+            _, cursor_time = self._measure(
+                lambda: self._paginate(pagination_class, queryset, params)
+            )
+
+            self.stdout.write(
+                f"{f'стр. {page}':>12}: номер {page_time * 1000:8.1f} мс, "
+                f"курсор {cursor_time * 1000:8.1f} мс"
+            )
+
+    def _paginate(self, pagination_class, queryset, params):
+        request = Request(
+            self.factory.get("/", {**params, "size": self.size}, HTTP_HOST="localhost")
+        )
+        return pagination_class().paginate_queryset(queryset, request)
+
+    def _cursor(self, ordering, position):
+        paginator = CursorPagination()
+        paginator.base_url = "http://localhost/"
+        paginator.ordering = ordering
+        url = paginator.encode_cursor(Cursor(offset=0, reverse=False, position=str(position)))
+        return parse_qs(urlparse(url).query)["cursor"][0]
+
+    def _measure(self, func):
+        best = None
+        result = None
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return result, best
@@ -0,0 +1,84 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from vision.models import Batch, LepImage
+from vision.writer import ResultWriter
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает число обращений к БД при записи результатов инференса: "
+        "save() на каждое изображение и ResultWriter с записью пачками. "
+        "Данные создаются во временной транзакции и откатываются"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--images", type=int, default=1000, help="Сколько изображений записать")
+        parser.add_argument(
+            "--flush-sizes",
+            default="32,128,500",
+            help="Размеры пачек ResultWriter через запятую",
+        )
+
+    def handle(self, *args, **options):
+        count = options["images"]
+        flush_sizes = [int(size) for size in options["flush_sizes"].split(",")]
+
+        self.stdout.write(f"Изображений: {count}")
+        self._run("save()", count, self._write_per_image)
+        for flush_size in flush_sizes:
+            self._run(
+                f"writer={flush_size}",
+                count,
+                lambda images, size=flush_size: self._write_bulk(images, size),
+            )
+
+    def _run(self, label, count, write):
+        try:
+            with transaction.atomic():
+                batch = Batch.objects.create(name="benchmark")
+                images = LepImage.objects.bulk_create(
+                    LepImage(batch=batch, file_key=f"uploads/benchmark/{i}.jpg")
+                    for i in range(count)
+                )
+                for index, image_obj in enumerate(images):
+                    image_obj.preview = f"previews/benchmark/{index}.jpg"
+                    image_obj.result = f"results/benchmark/{index}.jpg"
+                    image_obj.detection_result = [
+                        {"class": "vibration_damper", "confidence": 0.9, "bbox": [1, 2, 3, 4]}
+                    ]
+                    image_obj.latitude = 55.755800
+                    image_obj.longitude = 37.617300
+
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    write(images)
+                    elapsed = time.perf_counter() - started
+
+                self.stdout.write(
+                    f"{label:>12}: {len(queries):6d} запросов к БД, "
+                    f"{len(queries) * 1000 / count:8.1f} на 1000 изображений, "
+                    f"{elapsed:.2f} с"
+                )
+                raise Rollback
+        except Rollback:
+            pass
+
+    @staticmethod
+    def _write_per_image(images):
+        for image_obj in images:
+            image_obj.save()
+
+    @staticmethod
+    def _write_bulk(images, flush_size):
+        writer = ResultWriter(flush_size=flush_size)
+        for image_obj in images:
+            writer.add(image_obj)
+        writer.flush()
@@ -0,0 +1,85 @@
+import csv
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from ultralytics import YOLO
+
+from vision.engines import engine_weights_path, export_engine
+from vision.models import AiModel
+
+METRIC_COLUMNS = [
+    "metrics/precision(B)",
+    "metrics/recall(B)",
+    "metrics/mAP50(B)",
+    "metrics/mAP50-95(B)",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает INT8-вариант модели с исходными весами: "
+        "метрики на размеченном наборе (как в ai_results/*/results.csv) и задержку"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("model_id", type=int, help="ID модели")
+        parser.add_argument("data", help="data.yaml размеченного валидационного набора")
+        parser.add_argument("--output", default="quantization_report.csv", help="Куда сохранить отчёт")
+        parser.add_argument("--batch", type=int, default=4, help="Размер пачки при валидации")
+
+    def handle(self, *args, **options):
+        try:
+            model_obj = AiModel.objects.get(id=options["model_id"])
+        except AiModel.DoesNotExist:
+            raise CommandError(f"Модель {options['model_id']} не найдена")
+
+        model_obj.engine = AiModel.Engine.OPENVINO_INT8
+        int8_path = engine_weights_path(model_obj)
+        if int8_path is None:
+            self.stdout.write("INT8-вариант ещё не собран, квантуем...")
+            int8_path = os.path.join(settings.MEDIA_ROOT, export_engine(model_obj))
+
+        variants = {
+            AiModel.Engine.PYTORCH: YOLO(model_obj.model_file.path),
+            AiModel.Engine.OPENVINO_INT8: YOLO(int8_path, task="detect"),
+        }
+
+        rows = []
+        for engine, model in variants.items():
+            self.stdout.write(f"Валидация {engine}...")
+            metrics = model.val(
+                data=options["data"],
+                imgsz=settings.VISION_IMGSZ,
+                batch=options["batch"],
+                device="cpu",
+                plots=False,
+                verbose=False,
+            )
+            row = {"engine": engine}
+            row.update({column: round(metrics.results_dict[column], 5) for column in METRIC_COLUMNS})
+            row["speed/inference(ms)"] = round(metrics.speed["inference"], 3)
+            rows.append(row)
+
+        reference, quantized = rows
+        drift = {"engine": "drift"}
+        for column in METRIC_COLUMNS:
+            drift[column] = round(quantized[column] - reference[column], 5)
+        drift["speed/inference(ms)"] = round(
+            reference["speed/inference(ms)"] / quantized["speed/inference(ms)"], 2
+        )
+        rows.append(drift)
+
+        fieldnames = ["engine", *METRIC_COLUMNS, "speed/inference(ms)"]
+        with open(options["output"], "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+
+        for row in rows:
+            self.stdout.write(",".join(str(row[name]) for name in fieldnames))
+        self.stdout.write(
+            "В строке drift — разница метрик INT8 относительно PyTorch "
+            "и ускорение инференса (во сколько раз)."
+        )
+        self.stdout.write(self.style.SUCCESS(f"Отчёт сохранён в {options['output']}"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from vision.stats import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает с нуля сводки BatchStats и DailyClassStats по снимкам и детекциям. "
+        "Первичное заполнение делает миграция 0012_backfill_stats, команда нужна при расхождении счётчиков"
+    )
+
+    def handle(self, *args, **options):
+        batches, days = rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово: наборов {batches}, строк дневной статистики {days}"
+        ))
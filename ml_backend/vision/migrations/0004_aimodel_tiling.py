@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:27
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vision', '0003_lepimage_result_alter_batch_name'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='lepimage',
+            options={'ordering': ['id'], 'verbose_name': 'Фото', 'verbose_name_plural': 'Фото'},
+        ),
+        migrations.AddField(
+            model_name='aimodel',
+            name='tile_overlap',
+            field=models.FloatField(default=0.2, help_text='Доля перекрытия соседних тайлов', validators=[django.core.validators.MinValueValidator(0.0), django.core.validators.MaxValueValidator(0.5)], verbose_name='Перекрытие тайлов'),
+        ),
+        migrations.AddField(
+            model_name='aimodel',
+            name='tile_size',
+            field=models.PositiveIntegerField(blank=True, help_text='Если задан, снимки режутся на перекрывающиеся тайлы этого размера (px) и прогоняются без уменьшения', null=True, validators=[django.core.validators.MinValueValidator(64)], verbose_name='Размер тайла'),
+        ),
+        migrations.AlterField(
+            model_name='lepimage',
+            name='detection_result',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
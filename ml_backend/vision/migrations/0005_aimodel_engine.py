@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vision', '0004_aimodel_tiling'),
+    ]
+
+    operations = [
+        # Существующие модели остаются на PyTorch, ONNX — только для новых
+        migrations.AddField(
+            model_name='aimodel',
+            name='engine',
+            field=models.CharField(choices=[('pytorch', 'PyTorch'), ('onnx', 'ONNX Runtime'), ('openvino', 'OpenVINO')], default='pytorch', help_text='Веса экспортируются в этот формат после загрузки. Пока экспорта нет или он не загружается, используется PyTorch', max_length=20, verbose_name='Движок инференса'),
+        ),
+        migrations.AlterField(
+            model_name='aimodel',
+            name='engine',
+            field=models.CharField(choices=[('pytorch', 'PyTorch'), ('onnx', 'ONNX Runtime'), ('openvino', 'OpenVINO')], default='onnx', help_text='Веса экспортируются в этот формат после загрузки. Пока экспорта нет или он не загружается, используется PyTorch', max_length=20, verbose_name='Движок инференса'),
+        ),
+        migrations.AddField(
+            model_name='aimodel',
+            name='engine_build',
+            field=models.CharField(blank=True, default='', help_text='Движок и файл весов, из которых собран экспорт', max_length=600, verbose_name='Сборка экспорта'),
+        ),
+        migrations.AddField(
+            model_name='aimodel',
+            name='engine_path',
+            field=models.CharField(blank=True, default='', help_text='Путь к экспортированной модели относительно MEDIA_ROOT', max_length=500, verbose_name='Экспортированная модель'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vision', '0005_aimodel_engine'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='aimodel',
+            name='engine',
+            field=models.CharField(choices=[('pytorch', 'PyTorch'), ('onnx', 'ONNX Runtime'), ('openvino', 'OpenVINO'), ('openvino_int8', 'OpenVINO INT8')], default='onnx', help_text='Веса экспортируются в этот формат после загрузки. Пока экспорта нет или он не загружается, используется PyTorch', max_length=20, verbose_name='Движок инференса'),
+        ),
+    ]
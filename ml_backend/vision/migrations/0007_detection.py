@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vision', '0006_aimodel_engine_int8'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Detection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('class_name', models.CharField(max_length=64, verbose_name='Класс')),
+                ('confidence', models.FloatField(verbose_name='Уверенность')),
+                ('bbox', models.JSONField(help_text='Координаты рамки [x1, y1, x2, y2] в пикселях оригинала')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Создано')),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detections', to='vision.batch', verbose_name='Набор')),
+                ('image', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detections', to='vision.lepimage', verbose_name='Фото')),
+            ],
+            options={
+                'verbose_name': 'Детекция',
+                'verbose_name_plural': 'Детекции',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['batch', 'class_name'], name='vision_dete_batch_i_d18ca2_idx'), models.Index(fields=['class_name', 'created_at'], name='vision_dete_class_n_28af83_idx'), models.Index(fields=['created_at'], name='vision_dete_created_6f95e1_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vision', '0007_detection'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lepimage',
+            name='class_counts',
+            field=models.JSONField(blank=True, default=dict, help_text='Количество детекций по классам: {"nest": 2, ...}', verbose_name='Детекций по классам'),
+        ),
+        migrations.AddField(
+            model_name='lepimage',
+            name='damage_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Дефектов'),
+        ),
+        migrations.AddField(
+            model_name='lepimage',
+            name='has_damage',
+            field=models.BooleanField(default=False, verbose_name='Есть дефекты'),
+        ),
+        migrations.AddField(
+            model_name='lepimage',
+            name='max_damage_confidence',
+            field=models.FloatField(blank=True, null=True, verbose_name='Макс. уверенность дефекта'),
+        ),
+        migrations.AddField(
+            model_name='lepimage',
+            name='object_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Объектов'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vision', '0008_lepimage_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BatchStats',
+            fields=[
+                ('batch', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='vision.batch', verbose_name='Набор')),
+                ('day', models.DateField(db_index=True, help_text='День загрузки набора (UTC)', verbose_name='День')),
+                ('total', models.IntegerField(default=0, verbose_name='Всего снимков')),
+                ('processed', models.IntegerField(default=0, verbose_name='Обработано')),
+                ('images_with_damage', models.IntegerField(default=0, verbose_name='Снимков с дефектами')),
+                ('damage_count', models.IntegerField(default=0, verbose_name='Дефектов')),
+            ],
+            options={
+                'verbose_name': 'Сводка по набору',
+                'verbose_name_plural': 'Сводки по наборам',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyClassStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('class_name', models.CharField(max_length=64, verbose_name='Класс')),
+                ('count', models.IntegerField(default=0, verbose_name='Детекций')),
+            ],
+            options={
+                'verbose_name': 'Статистика за день',
+                'verbose_name_plural': 'Статистика по дням',
+                'ordering': ['day', 'class_name'],
+                'constraints': [models.UniqueConstraint(fields=('day', 'class_name'), name='unique_daily_class_stats')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:45
+
+from django.db import migrations, models
+
+
+def mark_reviewed(apps, schema_editor):
+    # Остальные состояния считает миграция 0012_backfill_stats по сводкам
+    Batch = apps.get_model('vision', 'Batch')
+    Batch.objects.filter(status=True).update(state='reviewed')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vision', '0009_stats_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='batch',
+            name='state',
+            field=models.CharField(choices=[('not_processed', 'Загружен'), ('processing', 'Обрабатывается'), ('completed', 'Обработан'), ('reviewed', 'Просмотрен')], default='not_processed', editable=False, help_text='Обновляется vision.stats по счётчикам BatchStats и признаку просмотра', max_length=20, verbose_name='Состояние обработки'),
+        ),
+        migrations.RunPython(mark_reviewed, migrations.RunPython.noop),
+    ]
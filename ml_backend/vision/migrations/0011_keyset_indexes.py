@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vision', '0010_batch_state'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='batch',
+            index=models.Index(fields=['uploaded_at', 'id'], name='vision_batc_uploade_cd6f82_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lepimage',
+            index=models.Index(fields=['batch', 'id'], name='vision_lepi_batch_i_416799_idx'),
+        ),
+    ]
@@ -0,0 +1,138 @@
+from datetime import timezone as dt_timezone
+
+from django.db import migrations
+from django.db.models import Case, Count, Exists, F, OuterRef, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+
+CHUNK = 500
+
+# Копии vision.models на момент миграции: миграция не должна зависеть
+# от того, как классы и сводки будут считаться в будущем
+DAMAGE_CLASSES = ('bad_insulator', 'damaged_insulator', 'nest')
+OBJECT_CLASSES = (
+    'vibration_damper',
+    'festoon_insulators',
+    'traverse',
+    'polymer_insulators',
+    'safety_sign',
+)
+BATCH_COUNTERS = ('total', 'processed', 'images_with_damage', 'damage_count')
+
+
+def backfill_images(apps):
+    """
+    Создаёт недостающие детекции и заполняет сводные поля обработанных снимков,
+    как backfill_detections и backfill_image_summary.
+    """
+    LepImage = apps.get_model('vision', 'LepImage')
+    Detection = apps.get_model('vision', 'Detection')
+
+    images = (
+        LepImage.objects.filter(detection_result__isnull=False)
+        .only('id', 'batch_id', 'detection_result')
+        .order_by('id')
+    )
+    last_id = 0
+    while True:
+        chunk = list(images.filter(id__gt=last_id)[:CHUNK])
+        if not chunk:
+            break
+
+        with_detections = set(
+            Detection.objects.filter(image_id__in=[image.id for image in chunk])
+            .values_list('image_id', flat=True)
+        )
+        detections = []
+        for image in chunk:
+            class_counts = {}
+            damage_confidences = []
+            for item in image.detection_result or []:
+                class_counts[item['class']] = class_counts.get(item['class'], 0) + 1
+                if item['class'] in DAMAGE_CLASSES:
+                    damage_confidences.append(item['confidence'])
+                if image.id not in with_detections:
+                    detections.append(Detection(
+                        image_id=image.id,
+                        batch_id=image.batch_id,
+                        class_name=item['class'],
+                        confidence=item['confidence'],
+                        bbox=item['bbox'],
+                    ))
+
+            image.class_counts = class_counts
+            image.damage_count = len(damage_confidences)
+            image.object_count = sum(class_counts.get(name, 0) for name in OBJECT_CLASSES)
+            image.has_damage = bool(damage_confidences)
+            image.max_damage_confidence = max(damage_confidences, default=None)
+
+        Detection.objects.bulk_create(detections, batch_size=1000)
+        LepImage.objects.bulk_update(chunk, fields=[
+            'has_damage', 'damage_count', 'object_count', 'max_damage_confidence', 'class_counts',
+        ])
+        last_id = chunk[-1].id
+
+
+def rebuild_stats(apps):
+    """
+    Пересчитывает сводки и состояние наборов, как rebuild_stats.
+    """
+    Batch = apps.get_model('vision', 'Batch')
+    BatchStats = apps.get_model('vision', 'BatchStats')
+    DailyClassStats = apps.get_model('vision', 'DailyClassStats')
+    Detection = apps.get_model('vision', 'Detection')
+
+    batches = Batch.objects.annotate(
+        total=Count('lepimage'),
+        processed=Count('lepimage', filter=Q(lepimage__detection_result__isnull=False)),
+        images_with_damage=Count('lepimage', filter=Q(lepimage__has_damage=True)),
+        damage_count=Sum('lepimage__damage_count'),
+    ).values('id', 'uploaded_at', *BATCH_COUNTERS)
+    daily = (
+        Detection.objects.annotate(day=TruncDate('batch__uploaded_at', tzinfo=dt_timezone.utc))
+        .values('day', 'class_name')
+        .annotate(count=Count('id'))
+    )
+
+    BatchStats.objects.all().delete()
+    DailyClassStats.objects.all().delete()
+    BatchStats.objects.bulk_create(
+        [
+            BatchStats(
+                batch_id=row['id'],
+                day=row['uploaded_at'].astimezone(dt_timezone.utc).date(),
+                **{field: row[field] or 0 for field in BATCH_COUNTERS},
+            )
+            for row in batches
+        ],
+        batch_size=1000,
+    )
+    DailyClassStats.objects.bulk_create([DailyClassStats(**row) for row in daily], batch_size=1000)
+
+    counters = BatchStats.objects.filter(batch_id=OuterRef('id'))
+    Batch.objects.update(state=Case(
+        When(status=True, then=Value('reviewed')),
+        When(Exists(counters.filter(processed=0)), then=Value('not_processed')),
+        When(Exists(counters.filter(processed__lt=F('total'))), then=Value('processing')),
+        When(Exists(counters.filter(processed=F('total'))), then=Value('completed')),
+        default=Value('not_processed'),
+    ))
+
+
+def backfill(apps, schema_editor):
+    """
+    Заполняет детекции, сводные поля снимков и сводки по уже обработанным
+    снимкам, чтобы после migrate статистика не была нулевой.
+    """
+    backfill_images(apps)
+    rebuild_stats(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vision', '0011_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -1,16 +1,73 @@
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.utils import timezone
+
+# Классы модели, считающиеся дефектами, и классы обычных объектов ЛЭП
+DAMAGE_CLASSES = ("bad_insulator", "damaged_insulator", "nest")
+OBJECT_CLASSES = (
+    "vibration_damper",
+    "festoon_insulators",
+    "traverse",
+    "polymer_insulators",
+    "safety_sign",
+)
 
 
 class AiModel(models.Model):
+    class Engine(models.TextChoices):
+        PYTORCH = "pytorch", "PyTorch"
+        ONNX = "onnx", "ONNX Runtime"
+        OPENVINO = "openvino", "OpenVINO"
+        OPENVINO_INT8 = "openvino_int8", "OpenVINO INT8"
+
     model_file = models.FileField(
         upload_to="models/", max_length=500, verbose_name="Файл"
     )
     name = models.CharField(max_length=255, verbose_name="Название")
     uploaded_at = models.DateTimeField(auto_now_add=True, verbose_name="Загружено")
+    tile_size = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(64)],
+        help_text="Если задан, снимки режутся на перекрывающиеся тайлы этого размера (px) "
+                  "и прогоняются без уменьшения",
+        verbose_name="Размер тайла",
+    )
+    tile_overlap = models.FloatField(
+        default=0.2,
+        validators=[MinValueValidator(0.0), MaxValueValidator(0.5)],
+        help_text="Доля перекрытия соседних тайлов",
+        verbose_name="Перекрытие тайлов",
+    )
+    engine = models.CharField(
+        max_length=20,
+        choices=Engine.choices,
+        default=Engine.ONNX,
+        help_text="Веса экспортируются в этот формат после загрузки. "
+                  "Пока экспорта нет или он не загружается, используется PyTorch",
+        verbose_name="Движок инференса",
+    )
+    engine_path = models.CharField(
+        max_length=500,
+        blank=True,
+        default="",
+        help_text="Путь к экспортированной модели относительно MEDIA_ROOT",
+        verbose_name="Экспортированная модель",
+    )
+    engine_build = models.CharField(
+        max_length=600,
+        blank=True,
+        default="",
+        help_text="Движок и файл весов, из которых собран экспорт",
+        verbose_name="Сборка экспорта",
+    )
 
     def __str__(self):
         return self.name
 
+    def engine_signature(self) -> str:
+        return f"{self.engine}:{self.model_file.name}"
+
     class Meta:
         ordering = ["-uploaded_at"]
         verbose_name = "Модель ИИ"
@@ -18,15 +75,34 @@ class AiModel(models.Model):
 
 
 class Batch(models.Model):
+    class State(models.TextChoices):
+        # Значения совпадают с processing_status в ответах API
+        UPLOADED = "not_processed", "Загружен"
+        PROCESSING = "processing", "Обрабатывается"
+        COMPLETED = "completed", "Обработан"
+        REVIEWED = "reviewed", "Просмотрен"
+
     name = models.CharField(max_length=100, verbose_name="Название", null=True, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True, verbose_name="Загружено")
     status = models.BooleanField(default=False, verbose_name="Просмотрено")
+    state = models.CharField(
+        max_length=20,
+        choices=State.choices,
+        default=State.UPLOADED,
+        editable=False,
+        help_text="Обновляется vision.stats по счётчикам BatchStats и признаку просмотра",
+        verbose_name="Состояние обработки",
+    )
 
     def __str__(self):
         return self.name or '---'
 
     class Meta:
         ordering = ["-uploaded_at"]
+        indexes = [
+            # Навигация по курсору в списке наборов
+            models.Index(fields=["uploaded_at", "id"]),
+        ]
         verbose_name = "Набор фото"
         verbose_name_plural = "Наборы фото"
 
@@ -70,11 +146,134 @@ class LepImage(models.Model):
     )
     created_at = models.DateTimeField(null=True, blank=True, verbose_name="Создано")
     detection_result = models.JSONField(blank=True, null=True)
+    has_damage = models.BooleanField(default=False, verbose_name="Есть дефекты")
+    damage_count = models.PositiveIntegerField(default=0, verbose_name="Дефектов")
+    object_count = models.PositiveIntegerField(default=0, verbose_name="Объектов")
+    max_damage_confidence = models.FloatField(
+        null=True, blank=True, verbose_name="Макс. уверенность дефекта"
+    )
+    class_counts = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Количество детекций по классам: {\"nest\": 2, ...}",
+        verbose_name="Детекций по классам",
+    )
 
     def __str__(self):
         return self.file_key
 
+    def summarize(self):
+        """
+        Заполняет сводные поля по detection_result.
+        Вызывается при записи результата, чтобы статистика и выдача
+        читали готовые колонки и не разбирали JSON на каждом запросе.
+        """
+        class_counts = {}
+        damage_confidences = []
+        for item in self.detection_result or []:
+            class_counts[item["class"]] = class_counts.get(item["class"], 0) + 1
+            if item["class"] in DAMAGE_CLASSES:
+                damage_confidences.append(item["confidence"])
+
+        self.class_counts = class_counts
+        self.damage_count = len(damage_confidences)
+        self.object_count = sum(class_counts.get(name, 0) for name in OBJECT_CLASSES)
+        self.has_damage = bool(damage_confidences)
+        self.max_damage_confidence = max(damage_confidences, default=None)
+
     class Meta:
         ordering = ["id"]
+        indexes = [
+            # Снимки набора по порядку id: навигация по курсору без сортировки
+            models.Index(fields=["batch", "id"]),
+        ]
         verbose_name = "Фото"
-        verbose_name_plural = "Фото"
\ No newline at end of file
+        verbose_name_plural = "Фото"
+
+
+class Detection(models.Model):
+    """
+    Отдельная детекция модели. Дублирует элементы LepImage.detection_result
+    в виде строк, чтобы аналитика считалась в SQL, а не разбором JSON.
+    """
+    image = models.ForeignKey(
+        LepImage, on_delete=models.CASCADE, related_name="detections", verbose_name="Фото"
+    )
+    batch = models.ForeignKey(
+        Batch, on_delete=models.CASCADE, related_name="detections", verbose_name="Набор"
+    )
+    class_name = models.CharField(max_length=64, verbose_name="Класс")
+    confidence = models.FloatField(verbose_name="Уверенность")
+    bbox = models.JSONField(help_text="Координаты рамки [x1, y1, x2, y2] в пикселях оригинала")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="Создано")
+
+    def __str__(self):
+        return f"{self.class_name} {self.confidence:.2f}"
+
+    @classmethod
+    def from_result(cls, image: LepImage) -> list:
+        """
+        Строит несохранённые детекции из detection_result снимка.
+        """
+        return [
+            cls(
+                image_id=image.id,
+                batch_id=image.batch_id,
+                class_name=item["class"],
+                confidence=item["confidence"],
+                bbox=item["bbox"],
+            )
+            for item in image.detection_result or []
+        ]
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["batch", "class_name"]),
+            models.Index(fields=["class_name", "created_at"]),
+            models.Index(fields=["created_at"]),
+        ]
+        verbose_name = "Детекция"
+        verbose_name_plural = "Детекции"
+
+
+class BatchStats(models.Model):
+    """
+    Сводка по набору, которую vision.stats обновляет инкрементально
+    при записи результатов и удалении снимков.
+    """
+    batch = models.OneToOneField(
+        Batch, on_delete=models.CASCADE, primary_key=True, related_name="stats", verbose_name="Набор"
+    )
+    day = models.DateField(db_index=True, help_text="День загрузки набора (UTC)", verbose_name="День")
+    total = models.IntegerField(default=0, verbose_name="Всего снимков")
+    processed = models.IntegerField(default=0, verbose_name="Обработано")
+    images_with_damage = models.IntegerField(default=0, verbose_name="Снимков с дефектами")
+    damage_count = models.IntegerField(default=0, verbose_name="Дефектов")
+
+    def __str__(self):
+        return str(self.batch_id)
+
+    class Meta:
+        verbose_name = "Сводка по набору"
+        verbose_name_plural = "Сводки по наборам"
+
+
+class DailyClassStats(models.Model):
+    """
+    Количество детекций класса за день загрузки наборов (UTC).
+    """
+    day = models.DateField(verbose_name="День")
+    class_name = models.CharField(max_length=64, verbose_name="Класс")
+    count = models.IntegerField(default=0, verbose_name="Детекций")
+
+    def __str__(self):
+        return f"{self.day} {self.class_name}: {self.count}"
+
+    class Meta:
+        ordering = ["day", "class_name"]
+        constraints = [
+            models.UniqueConstraint(fields=["day", "class_name"], name="unique_daily_class_stats"),
+        ]
+        verbose_name = "Статистика за день"
+        verbose_name_plural = "Статистика по дням"
@@ -0,0 +1,170 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+# Параметры режима курсора для extend_schema представлений
+CURSOR_PARAMETERS = [
+    OpenApiParameter(
+        name="pagination",
+        type=str,
+        enum=["page", "cursor"],
+        description="cursor — навигация по курсору без COUNT(*) и OFFSET",
+    ),
+    OpenApiParameter(name="cursor", type=str, description="Курсор из ссылок next/previous"),
+    OpenApiParameter(
+        name="estimate",
+        type=bool,
+        description="В режиме курсора добавить в ответ estimated_count",
+    ),
+]
+
+
+def estimate_count(queryset) -> int:
+    """
+    Оценка количества строк по плану запроса Postgres вместо COUNT(*).
+    На других СУБД возвращает точный count().
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return queryset.count()
+
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class KeysetOptInPagination(PageNumberPagination):
+    """
+    Постраничная навигация по номеру страницы, а с ``?pagination=cursor`` —
+    по курсору (keyset). Курсор хранит значения всех полей ``cursor_ordering``
+    последней (первой) строки страницы, и соседняя страница выбирается
+    условием ``(uploaded_at, id) < (…, …)`` без COUNT(*) и OFFSET: глубокие
+    страницы не медленнее первой, а строки с одинаковым первым полем
+    не пропускаются и не повторяются. Последнее поле ``cursor_ordering``
+    должно быть уникальным.
+
+    В режиме курсора общего количества нет; с ``?estimate=true`` в ответ
+    добавляется ``estimated_count``. Представление может отдать дешёвое
+    значение методом ``estimate_count(queryset)``, иначе используется
+    оценка по плану запроса.
+    """
+    page_size = 10
+    page_size_query_param = "size"
+    max_page_size = 50
+
+    mode_query_param = "pagination"
+    cursor_query_param = "cursor"
+    estimate_query_param = "estimate"
+    cursor_ordering = ("id",)
+    invalid_cursor_message = "Invalid cursor"
+
+    cursor_mode = False
+    estimated_count = None
+
+    def is_cursor_mode(self, request) -> bool:
+        return request.query_params.get(self.mode_query_param) == "cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.is_cursor_mode(request)
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.estimated_count = None
+        if request.query_params.get(self.estimate_query_param) in ("1", "true"):
+            estimate = getattr(view, "estimate_count", estimate_count)
+            self.estimated_count = estimate(queryset)
+
+        fields = [
+            (queryset.model._meta.get_field(name.lstrip("-")), name.startswith("-"))
+            for name in self.cursor_ordering
+        ]
+        values, reverse = self.decode_cursor(request, fields)
+
+        # Назад по списку — та же выборка в обратном порядке
+        ordering = [f"{'-' if descending != reverse else ''}{field.name}" for field, descending in fields]
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self.after(fields, values, reverse))
+
+        page_size = self.get_page_size(request)
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        self.next_position = self.previous_position = None
+        if rows and (has_more or reverse):
+            self.next_position = [field.value_to_string(rows[-1]) for field, _ in fields]
+        if rows and (has_more if reverse else values is not None):
+            self.previous_position = [field.value_to_string(rows[0]) for field, _ in fields]
+        return rows
+
+    @staticmethod
+    def after(fields, values, reverse: bool) -> Q:
+        """
+        Условие «строка идёт после позиции» в порядке полей:
+        (a < x) OR (a = x AND b < y) для убывающих полей.
+        """
+        condition = Q()
+        for index, (field, descending) in enumerate(fields):
+            lookup = "lt" if descending != reverse else "gt"
+            equal = {fields[i][0].name: values[i] for i in range(index)}
+            condition |= Q(**equal, **{f"{field.name}__{lookup}": values[index]})
+        return condition
+
+    def decode_cursor(self, request, fields) -> tuple:
+        """
+        Returns:
+            tuple: значения полей позиции (или None) и признак движения назад
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode()))
+            values = [field.to_python(value) for (field, _), value in zip(fields, cursor["p"], strict=True)]
+            return values, bool(cursor.get("r"))
+        except (TypeError, KeyError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position, reverse: bool) -> str:
+        cursor = {"p": position, "r": 1} if reverse else {"p": position}
+        encoded = urlsafe_b64encode(json.dumps(cursor, separators=(",", ":")).encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+
+        payload = {
+            "next": self.next_position and self.encode_cursor(self.next_position, reverse=False),
+            "previous": self.previous_position and self.encode_cursor(self.previous_position, reverse=True),
+        }
+        if self.estimated_count is not None:
+            payload["estimated_count"] = self.estimated_count
+        payload["results"] = data
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema["required"] = ["results"]
+        response_schema["properties"]["count"]["description"] = "Только при навигации по номеру страницы"
+        response_schema["properties"]["estimated_count"] = {
+            "type": "integer",
+            "description": "Оценка количества при pagination=cursor и estimate=true",
+        }
+        return response_schema
@@ -0,0 +1,92 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def _reset_shared_pool():
+    # Потоки не переживают fork: дочерний процесс создаёт свой пул
+    global _shared_pool, _shared_pool_lock
+    _shared_pool = None
+    _shared_pool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_shared_pool)
+
+
+def shared_pool() -> ThreadPoolExecutor:
+    """
+    Общий пул потоков процесса для кодирования и загрузки артефактов.
+    """
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = ThreadPoolExecutor(
+                max_workers=settings.VISION_ARTIFACT_WORKERS,
+                thread_name_prefix="artifacts",
+            )
+        return _shared_pool
+
+
+def prefetch(items, fetch, depth: int, workers: int):
+    """
+    Загружает элементы в пуле потоков с опережением.
+
+    Одновременно в работе не больше ``depth`` элементов, поэтому память
+    ограничена глубиной очереди, а не размером набора. Порядок сохраняется.
+
+    Yields:
+        tuple: (элемент, результат fetch или None, исключение или None)
+    """
+    iterator = iter(items)
+    pending = deque()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        def submit_next():
+            for item in iterator:
+                pending.append((item, pool.submit(fetch, item)))
+                return
+
+        for _ in range(depth):
+            submit_next()
+
+        while pending:
+            item, future = pending.popleft()
+            try:
+                result, error = future.result(), None
+            except Exception as e:
+                result, error = None, e
+
+            submit_next()
+            yield item, result, error
+
+
+class BackgroundUploader:
+    """
+    Пул потоков для загрузки артефактов в бакет.
+
+    Число ещё не завершённых задач ограничено ``max_pending``:
+    при переполнении ``submit`` блокируется, пока не освободится место.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def submit(self, fn, *args, **kwargs):
+        self._slots.acquire()
+        try:
+            future = self._pool.submit(fn, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,137 @@
+import datetime
+import functools
+import hashlib
+import hmac
+import logging
+from urllib.parse import quote, urlsplit
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+ALGORITHM = "AWS4-HMAC-SHA256"
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def _hmac(key: bytes, msg: str) -> bytes:
+    return hmac.new(key, msg.encode(), hashlib.sha256).digest()
+
+
+class S3Presigner:
+    """
+    Подпись pre-signed URL для PUT по схеме SigV4 (query string), как
+    generate_presigned_url у boto3, но без построения модели запроса
+    botocore на каждый ключ.
+
+    Ключ подписи и область учётных данных считаются один раз на пачку
+    ключей, на каждый URL остаются один SHA-256 и один HMAC — это в десятки
+    раз быстрее boto3 при инициализации наборов из тысяч файлов.
+    Поддерживается только path-style адресация на endpoint без пути,
+    как у клиентов MinIO; для остальных настроек конструктор бросает ValueError.
+    """
+
+    def __init__(self, endpoint_url: str, region: str, credentials):
+        """
+        Args:
+            endpoint_url: адрес S3 без пути
+            region: регион подписи
+            credentials: учётные данные botocore; читаются при каждой подписи,
+                поэтому обновляемые временные ключи с токеном не устаревают
+        """
+        parts = urlsplit(endpoint_url)
+        if not parts.scheme or not parts.netloc or parts.path.strip("/") or parts.query:
+            raise ValueError(f"Unsupported endpoint for presigning: {endpoint_url}")
+        self.base_url = f"{parts.scheme}://{parts.netloc}"
+        # Заголовок host подписывается как у botocore: в нижнем регистре
+        # и без порта по умолчанию, в URL порт остаётся как в endpoint
+        self.host = parts.hostname
+        if ":" in self.host:
+            self.host = f"[{self.host}]"
+        if parts.port is not None and parts.port != DEFAULT_PORTS.get(parts.scheme):
+            self.host = f"{self.host}:{parts.port}"
+        self.region = region
+        self.credentials = credentials
+
+    @classmethod
+    def from_client(cls, client):
+        """
+        Presigner с endpoint, регионом и учётными данными клиента boto3.
+        """
+        addressing_style = (client.meta.config.s3 or {}).get("addressing_style", "auto")
+        if addressing_style == "virtual":
+            raise ValueError("Only path-style addressing is supported")
+        return cls(client.meta.endpoint_url, client.meta.region_name, client._get_credentials())
+
+    def presign_put_many(self, bucket: str, keys, expires: int = 3600, now=None):
+        """
+        Args:
+            bucket: бакет
+            keys: ключи объектов
+            expires: срок действия ссылок, с
+            now: время подписи (UTC), по умолчанию текущее
+
+        Yields:
+            str: URL для PUT каждого ключа в порядке ``keys``
+        """
+        credentials = self.credentials.get_frozen_credentials() if self.credentials else None
+        access_key = credentials.access_key if credentials else ""
+        secret_key = credentials.secret_key if credentials else ""
+        session_token = credentials.token if credentials else None
+
+        now = now or datetime.datetime.now(datetime.UTC)
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        datestamp = now.strftime("%Y%m%d")
+        scope = f"{datestamp}/{self.region}/s3/aws4_request"
+
+        signing_key = _hmac(f"AWS4{secret_key}".encode(), datestamp)
+        for part in (self.region, "s3", "aws4_request"):
+            signing_key = _hmac(signing_key, part)
+
+        query = (
+            f"X-Amz-Algorithm={ALGORITHM}"
+            f"&X-Amz-Credential={quote(f'{access_key}/{scope}', safe='')}"
+            f"&X-Amz-Date={amz_date}"
+            f"&X-Amz-Expires={expires}"
+        )
+        # В каноническом запросе параметры отсортированы, в URL токен идёт
+        # последним, как у boto3
+        token = f"&X-Amz-Security-Token={quote(session_token, safe='')}" if session_token else ""
+        canonical_query = f"{query}{token}&X-Amz-SignedHeaders=host"
+        query = f"{query}&X-Amz-SignedHeaders=host{token}"
+        request_tail = f"\n{canonical_query}\nhost:{self.host}\n\nhost\nUNSIGNED-PAYLOAD"
+        sign_prefix = f"{ALGORITHM}\n{amz_date}\n{scope}\n"
+
+        for key in keys:
+            path = quote(f"/{bucket}/{key}", safe="/~")
+            canonical_request = f"PUT\n{path}{request_tail}"
+            string_to_sign = sign_prefix + hashlib.sha256(canonical_request.encode()).hexdigest()
+            signature = hmac.new(signing_key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+            yield f"{self.base_url}{path}?{query}&X-Amz-Signature={signature}"
+
+
+@functools.cache
+def _public_presigner():
+    try:
+        return S3Presigner.from_client(settings.S3_CLIENT_PUBLIC)
+    except ValueError as e:
+        logger.warning("Falling back to boto3 presigning: %s", e)
+        return None
+
+
+def presign_put_urls(bucket: str, keys, expires: int = 3600):
+    """
+    Pre-signed URL для PUT каждого ключа через публичный клиент S3.
+    Presigner создаётся при первом вызове; если endpoint клиента
+    он не поддерживает, ссылки подписывает boto3.
+
+    Yields:
+        str: URL в порядке ``keys``
+    """
+    presigner = _public_presigner()
+    if presigner is not None:
+        yield from presigner.presign_put_many(bucket, keys, expires=expires)
+        return
+    for key in keys:
+        yield settings.S3_CLIENT_PUBLIC.generate_presigned_url(
+            "put_object", Params={"Bucket": bucket, "Key": key}, ExpiresIn=expires
+        )
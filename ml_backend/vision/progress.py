@@ -0,0 +1,211 @@
+from datetime import datetime
+
+from django.db.models import Count, Q
+from django_redis import get_redis_connection
+
+from .models import Batch, LepImage
+
+# Увеличивает счётчик, только если хеш набора уже есть в Redis.
+# Иначе частичный хеш (например, только processed) выглядел бы как
+# настоящее состояние; отсутствующий хеш восстанавливается из БД при чтении.
+INCREMENT_IF_EXISTS = """
+if redis.call("EXISTS", KEYS[1]) == 0 then
+    return nil
+end
+for i = 2, #ARGV, 2 do
+    redis.call("HINCRBY", KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call("EXPIRE", KEYS[1], ARGV[1])
+return redis.call("HMGET", KEYS[1], "total", "processed", "failed")
+"""
+
+
+def processing_status(reviewed: bool, total: int, processed: int) -> str:
+    if reviewed:
+        return "reviewed"
+    if processed == 0:
+        return "not_processed"
+    if processed < total:
+        return "processing"
+    if processed == total:
+        return "completed"
+    return "not_processed"
+
+
+class BatchProgress:
+    """
+    Счётчики обработки наборов в Redis: всего снимков, обработано, с ошибкой.
+
+    Хеш набора хранит и поля, нужные для ответа о статусе (название,
+    дата загрузки, признак просмотра), поэтому статус отдаётся без запросов
+    к Postgres. Задачи и сигналы меняют счётчики атомарно через HINCRBY.
+    Если хеша нет (истёк TTL, Redis перезапущен), он пересчитывается из БД
+    при первом чтении; reconcile_progress_task периодически сверяет
+    существующие хеши с БД.
+
+    Ключ: {prefix}:{batch_id}
+    """
+
+    def __init__(self, prefix: str, ttl: int):
+        self.prefix = prefix
+        self.ttl = ttl
+        self._increment = None
+
+    @property
+    def redis(self):
+        return get_redis_connection("default")
+
+    def _key(self, batch_id: int) -> str:
+        return f"{self.prefix}:{batch_id}"
+
+    def get(self, batch_id: int):
+        """
+        Returns:
+            dict: id, name, uploaded_at, reviewed, total, processed, failed
+            или None, если набора нет
+        """
+        data = self.redis.hgetall(self._key(batch_id))
+        if data:
+            return self._decode(batch_id, data)
+        return self.reconcile(batch_id)
+
+    def get_many(self, batch_ids) -> dict:
+        batch_ids = list(batch_ids)
+        pipe = self.redis.pipeline()
+        for batch_id in batch_ids:
+            pipe.hgetall(self._key(batch_id))
+
+        result = {}
+        for batch_id, data in zip(batch_ids, pipe.execute()):
+            result[batch_id] = self._decode(batch_id, data) if data else self.reconcile(batch_id)
+        return result
+
+    def increment(self, batch_id: int, **counters):
+        """
+        Атомарно меняет счётчики: increment(batch_id, processed=1, total=-1).
+
+        Returns:
+            dict: новые значения total, processed, failed
+            или None, если хеша набора нет в Redis
+        """
+        counters = {field: value for field, value in counters.items() if value}
+        if not counters:
+            return None
+
+        if self._increment is None:
+            self._increment = self.redis.register_script(INCREMENT_IF_EXISTS)
+
+        args = [self.ttl]
+        for field, value in counters.items():
+            args.extend((field, value))
+        values = self._increment(keys=[self._key(batch_id)], args=args, client=self.redis)
+        if values is None:
+            return None
+        return dict(zip(("total", "processed", "failed"), map(int, values)))
+
+    def reset_failed(self, batch_id: int):
+        key = self._key(batch_id)
+        if self.redis.exists(key):
+            self.redis.hset(key, "failed", 0)
+
+    def update_meta(self, batch: Batch):
+        key = self._key(batch.id)
+        if self.redis.exists(key):
+            self.redis.hset(key, mapping=self._meta(batch))
+
+    def forget(self, batch_id: int):
+        self.redis.delete(self._key(batch_id))
+
+    def reconcile(self, batch_id: int):
+        """
+        Пересчитывает хеш набора из БД. Счётчик ошибок в БД не хранится
+        и сохраняется из прежнего хеша.
+        """
+        batch = Batch.objects.filter(id=batch_id).first()
+        if batch is None:
+            self.forget(batch_id)
+            return None
+
+        counts = LepImage.objects.filter(batch_id=batch_id).aggregate(
+            total=Count("id"),
+            processed=Count("id", filter=Q(detection_result__isnull=False)),
+        )
+        return self._store(batch, counts["total"], counts["processed"])
+
+    def reconcile_all(self) -> int:
+        """
+        Сверяет с БД все хеши, которые сейчас есть в Redis.
+
+        Returns:
+            int: количество сверенных наборов
+        """
+        batch_ids = [
+            int(key.decode().rsplit(":", 1)[1])
+            for key in self.redis.scan_iter(match=f"{self.prefix}:*", count=500)
+        ]
+        if not batch_ids:
+            return 0
+
+        counts = {
+            row["batch_id"]: row
+            for row in LepImage.objects.filter(batch_id__in=batch_ids)
+            .values("batch_id")
+            .annotate(
+                total=Count("id"),
+                processed=Count("id", filter=Q(detection_result__isnull=False)),
+            )
+        }
+        batches = Batch.objects.in_bulk(batch_ids)
+
+        for batch_id in batch_ids:
+            batch = batches.get(batch_id)
+            if batch is None:
+                self.forget(batch_id)
+                continue
+            row = counts.get(batch_id, {"total": 0, "processed": 0})
+            self._store(batch, row["total"], row["processed"])
+        return len(batches)
+
+    def _store(self, batch: Batch, total: int, processed: int) -> dict:
+        key = self._key(batch.id)
+        failed = self.redis.hget(key, "failed")
+        data = {
+            **self._meta(batch),
+            "total": total,
+            "processed": processed,
+            "failed": int(failed) if failed else 0,
+        }
+
+        pipe = self.redis.pipeline()
+        pipe.hset(key, mapping=data)
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+        return self._decode(batch.id, data)
+
+    @staticmethod
+    def _meta(batch: Batch) -> dict:
+        return {
+            "name": batch.name or "",
+            "uploaded_at": batch.uploaded_at.isoformat(),
+            "reviewed": int(batch.status),
+        }
+
+    @staticmethod
+    def _decode(batch_id: int, data: dict) -> dict:
+        data = {
+            key.decode() if isinstance(key, bytes) else key:
+                value.decode() if isinstance(value, bytes) else value
+            for key, value in data.items()
+        }
+        return {
+            "id": int(batch_id),
+            "name": data["name"] or None,
+            "uploaded_at": datetime.fromisoformat(data["uploaded_at"]),
+            "reviewed": bool(int(data["reviewed"])),
+            "total": int(data["total"]),
+            "processed": int(data["processed"]),
+            "failed": int(data["failed"]),
+        }
+
+
+progress = BatchProgress("progress", ttl=24 * 60 * 60)
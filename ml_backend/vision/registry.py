@@ -0,0 +1,144 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+from .engines import engine_weights_path, load_engine
+from .models import AiModel
+
+logger = logging.getLogger(__name__)
+
+
+def weights_fingerprint(path: str) -> tuple:
+    """
+    Отпечаток файла весов: время изменения и размер.
+    Меняется при замене файла, не требуя чтения всех весов для подсчёта хеша.
+    """
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def estimate_model_bytes(model, path: str) -> int:
+    """
+    Оценивает объём памяти, занимаемый моделью.
+
+    Для PyTorch-моделей суммирует размер параметров и буферов,
+    для остальных форматов берёт размер файлов весов.
+    """
+    module = getattr(model, "model", None)
+    try:
+        tensors = list(module.parameters()) + list(module.buffers())
+        size = sum(t.numel() * t.element_size() for t in tensors)
+        if size:
+            return size
+    except Exception:
+        pass
+
+    if os.path.isdir(path):
+        return sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, names in os.walk(path)
+            for name in names
+        )
+    return os.path.getsize(path)
+
+
+class ModelRegistry:
+    """
+    Процессный LRU-кэш загруженных YOLO моделей.
+
+    Ключ — id записи AiModel, выбранный движок и отпечаток файла весов,
+    поэтому замена файла или смена движка у той же записи приводит
+    к перезагрузке. Суммарный объём моделей ограничен ``max_bytes``;
+    при превышении выгружаются давно не использованные.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._models = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, model_obj: AiModel):
+        path = engine_weights_path(model_obj) or model_obj.model_file.path
+        fingerprint = (model_obj.engine, path, weights_fingerprint(path))
+
+        with self._lock:
+            entry = self._models.get(model_obj.id)
+            if entry is not None and entry["fingerprint"] == fingerprint:
+                self._models.move_to_end(model_obj.id)
+                self.hits += 1
+                return entry["model"]
+
+            self.misses += 1
+            model, loaded_path, engine = load_engine(model_obj)
+            self._models[model_obj.id] = {
+                "fingerprint": fingerprint,
+                "model": model,
+                "engine": engine,
+                "size": estimate_model_bytes(model, loaded_path),
+            }
+            self._models.move_to_end(model_obj.id)
+            self._evict()
+            return model
+
+    def invalidate(self, model_id: int):
+        with self._lock:
+            self._models.pop(model_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+    def warm_up(self, model_ids=None):
+        """
+        Загружает модели заранее и прогоняет пустой кадр,
+        чтобы первая задача на воркере не платила за инициализацию предиктора.
+        """
+        if model_ids is None:
+            model_ids = settings.VISION_PRELOAD_MODELS
+
+        if model_ids:
+            queryset = AiModel.objects.filter(id__in=model_ids)
+        else:
+            queryset = AiModel.objects.all()[:1]
+
+        dummy = np.zeros((64, 64, 3), dtype=np.uint8)
+        for model_obj in queryset:
+            try:
+                model = self.get(model_obj)
+                model.predict(dummy, imgsz=settings.VISION_IMGSZ, verbose=False)
+            except Exception as e:
+                logger.warning("Failed to preload model %s: %s", model_obj.id, e)
+
+        logger.info("Model registry warmed up: %s", self.stats())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "models": {
+                    model_id: entry["engine"] for model_id, entry in self._models.items()
+                },
+                "bytes": self._total_bytes(),
+            }
+
+    def _total_bytes(self) -> int:
+        return sum(entry["size"] for entry in self._models.values())
+
+    def _evict(self):
+        # Последнюю загруженную модель не выгружаем, даже если она одна больше лимита
+        while len(self._models) > 1 and self._total_bytes() > self.max_bytes:
+            model_id, _ = self._models.popitem(last=False)
+            self.evictions += 1
+            logger.info("Evicted model %s from registry", model_id)
+
+
+registry = ModelRegistry(max_bytes=settings.VISION_MODEL_CACHE_MAX_BYTES)
@@ -0,0 +1,108 @@
+import hashlib
+import json
+from io import BytesIO
+
+from PIL import ExifTags, Image, ImageDraw, ImageFont, ImageOps
+from django.conf import settings
+
+from .cache import BoundedCache
+from .models import LepImage
+
+RENDER_SIZES = {
+    "full": None,
+    "preview": 512,
+}
+
+render_cache = BoundedCache("render", max_bytes=settings.VISION_RENDER_CACHE_MAX_BYTES)
+
+
+def class_color(name: str) -> tuple:
+    """
+    Стабильный цвет рамки для класса.
+    """
+    digest = hashlib.md5(name.encode()).digest()
+    return 64 + digest[0] % 192, 64 + digest[1] % 192, 64 + digest[2] % 192
+
+
+def draw_detections(image: Image.Image, detections: list, scale: float = 1.0) -> Image.Image:
+    """
+    Рисует рамки и подписи детекций поверх изображения.
+
+    Args:
+        image: PIL изображение в режиме RGB
+        detections: список детекций из LepImage.detection_result
+        scale: коэффициент пересчёта координат bbox под размер изображения
+    """
+    draw = ImageDraw.Draw(image)
+    line_width = max(1, round(max(image.size) / 400))
+    font = ImageFont.load_default(size=max(10, line_width * 6))
+
+    for item in detections:
+        x1, y1, x2, y2 = (coord * scale for coord in item["bbox"])
+        color = class_color(item["class"])
+        label = f"{item['class']} {item['confidence']:.2f}"
+
+        draw.rectangle((x1, y1, x2, y2), outline=color, width=line_width)
+
+        left, top, right, bottom = draw.textbbox((0, 0), label, font=font)
+        text_width = right - left + 2 * line_width
+        text_height = bottom - top + 2 * line_width
+        text_top = y1 - text_height if y1 > text_height else y1
+        draw.rectangle(
+            (x1, text_top, x1 + text_width, text_top + text_height),
+            fill=color,
+        )
+        draw.text((x1 + line_width, text_top), label, fill=(255, 255, 255), font=font)
+
+    return image
+
+
+def render_key(image_obj: LepImage, size: str) -> str:
+    """
+    Ключ кэша учитывает сами детекции, поэтому после повторной обработки
+    изображения старая отрисовка не используется.
+    """
+    digest = hashlib.md5(
+        json.dumps(image_obj.detection_result, sort_keys=True).encode()
+    ).hexdigest()[:16]
+    return f"{image_obj.id}:{size}:{digest}"
+
+
+def render_image(image_obj: LepImage, size: str = "full") -> bytes:
+    """
+    Возвращает JPEG с разметкой из кэша или рисует его по оригиналу.
+    """
+    key = render_key(image_obj, size)
+    data = render_cache.get(key)
+    if data is not None:
+        return data
+
+    obj = settings.S3_CLIENT_PRIVATE.get_object(
+        Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=image_obj.file_key
+    )
+    image = Image.open(BytesIO(obj["Body"].read()))
+    # Рамки посчитаны по кадру, повёрнутому по EXIF (cv2.imdecode),
+    # поэтому ширина берётся с учётом поворота
+    orientation = image.getexif().get(ExifTags.Base.Orientation, 1)
+    original_width = image.height if orientation in (5, 6, 7, 8) else image.width
+
+    max_side = RENDER_SIZES[size]
+    if max_side:
+        # Для JPEG декодируем сразу в уменьшенном масштабе
+        image.draft("RGB", (max_side, max_side))
+    image = ImageOps.exif_transpose(image).convert("RGB")
+    if max_side:
+        image.thumbnail((max_side, max_side))
+
+    draw_detections(image, image_obj.detection_result or [], image.width / original_width)
+
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    data = buffer.getvalue()
+
+    render_cache.set(key, data)
+    return data
+
+
+def forget_renders(image_obj: LepImage):
+    render_cache.delete(*(render_key(image_obj, size) for size in RENDER_SIZES))
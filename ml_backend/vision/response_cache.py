@@ -0,0 +1,142 @@
+import hashlib
+import json
+import logging
+import time
+from datetime import timezone as dt_timezone
+from functools import wraps
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django_redis import get_redis_connection
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .cache import BoundedCache
+
+logger = logging.getLogger(__name__)
+
+response_cache = BoundedCache("responses", max_bytes=settings.VISION_RESPONSE_CACHE_MAX_BYTES)
+
+GLOBAL_SCOPE = "global"
+
+
+def batch_scope(batch_id: int) -> str:
+    return f"batch:{batch_id}"
+
+
+def version_key(scope: str) -> str:
+    return f"responses:version:{scope}"
+
+
+def seed_version(pipe, scope: str):
+    """
+    Заводит отсутствующий счётчик версий со значения time.time_ns().
+    После очистки Redis счётчик не начинается заново с нуля, и ETag,
+    выданные до очистки, не совпадают с ETag новых данных.
+    """
+    pipe.set(version_key(scope), time.time_ns(), nx=True)
+
+
+def current_version(scope: str) -> int:
+    pipe = get_redis_connection("default").pipeline()
+    seed_version(pipe, scope)
+    pipe.get(version_key(scope))
+    return int(pipe.execute()[-1])
+
+
+def bump_versions(*batch_ids: int):
+    """
+    Сбрасывает закэшированные ответы: увеличивает общий счётчик версий
+    и счётчики перечисленных наборов. Старые записи больше не читаются
+    и вытесняются из BoundedCache как давно не использованные.
+    """
+    try:
+        pipe = get_redis_connection("default").pipeline()
+        for scope in [GLOBAL_SCOPE, *{batch_scope(batch_id) for batch_id in batch_ids}]:
+            seed_version(pipe, scope)
+            pipe.incr(version_key(scope))
+        pipe.execute()
+    except Exception as e:
+        logger.warning("Failed to bump response cache versions: %s", e)
+
+
+def bump_versions_on_commit(*batch_ids: int):
+    """
+    Сбрасывает версии после коммита: иначе параллельный запрос успел бы
+    закэшировать старые данные уже под новой версией.
+    """
+    transaction.on_commit(lambda: bump_versions(*batch_ids))
+
+
+def set_validators(response, etag: str):
+    response.headers["ETag"] = etag
+    # Клиент хранит ответ, но перепроверяет его при каждом запросе
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def cached_response(per_batch: bool = False):
+    """
+    Кэширует успешные ответы GET-метода представления и отвечает
+    на условные запросы.
+
+    Ключ — имя представления, версия, хост, дата, формат ответа и параметры
+    запроса. Для ``per_batch`` версией служит счётчик набора из kwargs["pk"],
+    иначе — общий счётчик. Хеш ключа служит ETag: запрос с совпавшим
+    If-None-Match получает 304 без обращения к БД и сериализации.
+    Last-Modified не отдаётся: с точностью до секунды он дал бы 304
+    на If-Modified-Since после изменения в ту же секунду.
+
+    Args:
+        per_batch: ответ зависит только от одного набора
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            scope = batch_scope(kwargs["pk"]) if per_batch else GLOBAL_SCOPE
+            try:
+                version = current_version(scope)
+            except Exception as e:
+                logger.warning("Response cache is unavailable: %s", e)
+                return method(self, request, *args, **kwargs)
+
+            # Хост входит в ключ из-за абсолютных ссылок пагинации,
+            # дата — из-за окна «последние 7 дней» в статистике
+            today = timezone.now().astimezone(dt_timezone.utc).date()
+            params = hashlib.sha256(json.dumps([
+                request.get_host(),
+                today.isoformat(),
+                request.accepted_media_type,
+                sorted(request.query_params.lists()),
+            ]).encode()).hexdigest()[:16]
+            key = f"{type(self).__name__}:{kwargs.get('pk', '')}:{version}:{params}"
+            etag = quote_etag(hashlib.sha256(key.encode()).hexdigest()[:32])
+
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                return set_validators(not_modified, etag)
+
+            try:
+                data = response_cache.get(key)
+            except Exception as e:
+                logger.warning("Response cache is unavailable: %s", e)
+                data = None
+            if data is not None:
+                return set_validators(Response(json.loads(data)), etag)
+
+            response = method(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                try:
+                    response_cache.set(key, json.dumps(response.data, cls=JSONEncoder).encode())
+                except Exception as e:
+                    logger.warning("Failed to cache response %s: %s", key, e)
+                set_validators(response, etag)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+
+from .cache import BoundedCache
+from .models import AiModel
+from .pipeline import shared_pool
+from .utils import make_derived_key
+
+logger = logging.getLogger(__name__)
+
+result_cache = BoundedCache("inference", max_bytes=settings.VISION_RESULT_CACHE_MAX_BYTES)
+
+
+def inference_params(model_obj: AiModel) -> dict:
+    """
+    Всё, от чего зависит результат инференса, кроме самих байтов снимка.
+    """
+    return {
+        "weights": model_obj.model_file.name,
+        "engine": model_obj.engine,
+        "engine_build": model_obj.engine_build,
+        "imgsz": settings.VISION_IMGSZ,
+        "conf": settings.VISION_CONF,
+        "tile_size": model_obj.tile_size,
+        "tile_overlap": model_obj.tile_overlap,
+        "render": settings.VISION_RESULT_RENDER,
+    }
+
+
+def result_cache_key(img_data: bytes, model_obj: AiModel) -> str:
+    """
+    Ключ кэша: sha256 содержимого снимка, id модели и хеш параметров инференса.
+    Одинаковые байты под разными именами файлов дают один ключ.
+    """
+    params_digest = hashlib.sha256(
+        json.dumps(inference_params(model_obj), sort_keys=True).encode()
+    ).hexdigest()[:16]
+    return f"{hashlib.sha256(img_data).hexdigest()}:{model_obj.id}:{params_digest}"
+
+
+def lookup_result(key: str):
+    data = result_cache.get(key)
+    return json.loads(data) if data is not None else None
+
+
+def remember_result(key: str, image_obj):
+    """
+    Сохраняет детекции и ключи артефактов обработанного снимка.
+    """
+    entry = {
+        "detection_result": image_obj.detection_result,
+        "latitude": str(image_obj.latitude) if image_obj.latitude is not None else None,
+        "longitude": str(image_obj.longitude) if image_obj.longitude is not None else None,
+        "result": image_obj.result,
+        "preview": image_obj.preview,
+    }
+    try:
+        result_cache.set(key, json.dumps(entry).encode())
+    except Exception as e:
+        logger.warning("Failed to cache inference result %s: %s", key, e)
+
+
+def reuse_result(key: str, entry: dict, image_obj) -> bool:
+    """
+    Копирует закэшированные артефакты под ключи нового снимка и заполняет запись.
+
+    Копирование идёт на стороне MinIO, поэтому новый снимок не зависит
+    от судьбы исходного. Если исходные файлы уже удалены, запись кэша
+    сбрасывается и возвращается False — снимок нужно обработать заново.
+    """
+    s3_client = settings.S3_CLIENT_PRIVATE
+    bucket = settings.AWS_STORAGE_BUCKET_NAME
+
+    copies = {"preview": make_derived_key(image_obj.file_key, "previews")}
+    if entry["result"]:
+        copies["result"] = make_derived_key(image_obj.file_key, "results")
+
+    def copy(field):
+        if copies[field] == entry[field]:
+            # Повторная обработка того же снимка: файлы уже на месте
+            s3_client.head_object(Bucket=bucket, Key=entry[field])
+            return
+        s3_client.copy_object(
+            Bucket=bucket,
+            Key=copies[field],
+            CopySource={"Bucket": bucket, "Key": entry[field]},
+            ACL="public-read",
+        )
+
+    futures = [shared_pool().submit(copy, field) for field in copies]
+    try:
+        for future in futures:
+            future.result()
+    except Exception as e:
+        logger.info("Cached artifacts for %s are gone, dropping entry: %s", key, e)
+        result_cache.delete(key)
+        return False
+
+    image_obj.detection_result = entry["detection_result"]
+    image_obj.latitude = entry["latitude"]
+    image_obj.longitude = entry["longitude"]
+    image_obj.preview = copies["preview"]
+    image_obj.result = copies.get("result")
+    return True
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 
-from .models import AiModel, Batch, LepImage
+from .models import AiModel, Batch, LepImage, DAMAGE_CLASSES, OBJECT_CLASSES
+from .progress import processing_status
 
 
 class AiModelListSerializer(serializers.ModelSerializer):
@@ -10,35 +11,22 @@ class AiModelListSerializer(serializers.ModelSerializer):
 
 
 class BatchListSerializer(serializers.ModelSerializer):
+    """
+    Читает только сам набор и его сводку: queryset должен делать
+    select_related("stats"), тогда страница списка — один запрос.
+    """
     photo_count = serializers.SerializerMethodField()
-    processing_status = serializers.SerializerMethodField()
+    processing_status = serializers.ChoiceField(
+        source="state", choices=Batch.State.choices, read_only=True
+    )
 
     class Meta:
         model = Batch
         fields = ("id", "name", "uploaded_at", "photo_count", "processing_status",)
 
     def get_photo_count(self, obj) -> int:
-        return obj.lepimage_set.count()
-
-    def get_processing_status(self, obj) -> str:
-        if obj.status:
-            return "reviewed"
-
-        images = LepImage.objects.filter(batch=obj)
-        total = images.count()
-
-        processed_count = images.filter(detection_result__isnull=False).count()
-
-        if processed_count == 0:
-            return "not_processed"
-
-        if processed_count < total:
-            return "processing"
-
-        if processed_count == total:
-            return "completed"
-
-        return "not_processed"
+        batch_stats = getattr(obj, "stats", None)
+        return batch_stats.total if batch_stats else 0
 
 
 class LepImageSerializer(serializers.ModelSerializer):
@@ -57,40 +45,35 @@ class LepImageSerializer(serializers.ModelSerializer):
             "latitude",
             "longitude",
             "uploaded_at",
+            "has_damage",
+            "damage_count",
+            "object_count",
+            "max_damage_confidence",
+            "class_counts",
             "damages",
             "objects"
         ]
 
-    def _filter_detections(self, data, target_classes):
-        if not data:
-            return []
-
+    def _filter_detections(self, obj, target_classes):
+        # Детекции берутся из prefetch_related("detections"), JSON не разбирается
         return [
             {
-                "class": item.get("class"),
-                "confidence": item.get("confidence")
+                "class": detection.class_name,
+                "confidence": detection.confidence
             }
-            for item in data
-            if item.get("class") in target_classes
+            for detection in obj.detections.all()
+            if detection.class_name in target_classes
         ]
 
     def get_damages(self, obj):
-        damage_classes = {
-            "bad_insulator",
-            "damaged_insulator",
-            "nest"
-        }
-        return self._filter_detections(obj.detection_result, damage_classes)
+        if not obj.damage_count:
+            return []
+        return self._filter_detections(obj, DAMAGE_CLASSES)
 
     def get_objects(self, obj):
-        object_classes = {
-            "vibration_damper",
-            "festoon_insulators",
-            "traverse",
-            "polymer_insulators",
-            "safety_sign"
-        }
-        return self._filter_detections(obj.detection_result, object_classes)
+        if not obj.object_count:
+            return []
+        return self._filter_detections(obj, OBJECT_CLASSES)
 
 
 class UploadFileItemSerializer(serializers.Serializer):
@@ -99,42 +82,65 @@ class UploadFileItemSerializer(serializers.Serializer):
     longitude = serializers.DecimalField(max_digits=9, decimal_places=6, required=False)
 
 
-class InitUploadSerializer(serializers.Serializer):
+class InitUploadHeaderSerializer(serializers.Serializer):
+    """Первая строка NDJSON-запроса при потоковой инициализации"""
     batch_name = serializers.CharField(required=False, allow_blank=True, allow_null=True)
-    files = UploadFileItemSerializer(many=True)
+
+
+class InitUploadSerializer(InitUploadHeaderSerializer):
+    upload_mode = serializers.ChoiceField(
+        choices=["url", "policy"],
+        default="url",
+        help_text="url — ссылка на каждый файл, policy — одна POST-политика на каталог набора",
+    )
+    files = UploadFileItemSerializer(many=True, required=False)
+
+    def validate(self, attrs):
+        if attrs["upload_mode"] == "url" and not attrs.get("files"):
+            raise serializers.ValidationError({"files": "Обязательное поле в режиме url."})
+        if attrs["upload_mode"] == "policy" and attrs.get("files"):
+            raise serializers.ValidationError(
+                {"files": "В режиме policy файлы регистрируются при подтверждении загрузки."}
+            )
+        return attrs
+
+
+class UploadPolicySerializer(serializers.Serializer):
+    """Presigned POST-политика на каталог набора"""
+    url = serializers.URLField(help_text="Адрес для multipart/form-data POST")
+    fields = serializers.DictField(
+        child=serializers.CharField(),
+        help_text="Поля формы; к ним добавляются Content-Type (image/*) и file",
+    )
+    prefix = serializers.CharField(help_text="Каталог набора, ключ файла — prefix + имя файла")
+    expires_at = serializers.DateTimeField()
 
 
 class ConfirmUploadSerializer(serializers.Serializer):
     batch_id = serializers.IntegerField()
     model_id = serializers.IntegerField()
+    chunk_size = serializers.IntegerField(
+        required=False,
+        min_value=1,
+        max_value=64,
+        help_text="Размер пачки для одного вызова модели, по умолчанию VISION_CHUNK_SIZE",
+    )
 
 
-class BatchStatusSerializer(serializers.ModelSerializer):
+class BatchStatusSerializer(serializers.Serializer):
+    """
+    Статус набора по счётчикам из vision.progress, без запросов к БД.
+    """
+    id = serializers.IntegerField()
+    name = serializers.CharField(allow_null=True)
+    uploaded_at = serializers.DateTimeField()
     processing_status = serializers.SerializerMethodField()
+    total = serializers.IntegerField(help_text="Всего снимков в наборе")
+    processed = serializers.IntegerField(help_text="Обработано моделью")
+    failed = serializers.IntegerField(help_text="Не удалось обработать при последнем запуске")
 
-    class Meta:
-        model = Batch
-        fields = ["id", "name", "uploaded_at", "processing_status"]
-
-    def get_processing_status(self, obj: Batch) -> str:
-        if obj.status:
-            return "reviewed"
-
-        images = LepImage.objects.filter(batch=obj)
-        total = images.count()
-
-        processed_count = images.filter(detection_result__isnull=False).count()
-
-        if processed_count == 0:
-            return "not_processed"
-
-        if processed_count < total:
-            return "processing"
-
-        if processed_count == total:
-            return "completed"
-
-        return "not_processed"
+    def get_processing_status(self, obj: dict) -> str:
+        return processing_status(obj["reviewed"], obj["total"], obj["processed"])
 
 
 class DeleteBatchSerializer(serializers.ModelSerializer):
@@ -160,10 +166,15 @@ class BatchUpdateSerializer(serializers.ModelSerializer):
         allow_empty=True,
         help_text="Список имен файлов для загрузки"
     )
+    upload_policy = serializers.BooleanField(
+        write_only=True,
+        required=False,
+        help_text="Выдать одну POST-политику на каталог набора"
+    )
 
     class Meta:
         model = Batch
-        fields = ['id', 'name', 'status', 'uploaded_at', 'upload_requests']
+        fields = ['id', 'name', 'status', 'uploaded_at', 'upload_requests', 'upload_policy']
         read_only_fields = ['id', 'uploaded_at']
 
 
@@ -174,10 +185,15 @@ class BatchUpdateResponseSerializer(serializers.ModelSerializer):
         read_only=True,
         help_text="Словарь с presigned URLs: {'filename.jpg': 'https://s3.amazonaws.com/...'}"
     )
+    upload_policy = UploadPolicySerializer(
+        read_only=True,
+        required=False,
+        help_text="Только при upload_policy=true в запросе"
+    )
 
     class Meta:
         model = Batch
-        fields = ['id', 'name', 'status', 'uploaded_at', 'presigned_urls']
+        fields = ['id', 'name', 'status', 'uploaded_at', 'presigned_urls', 'upload_policy']
 
 
 class DailyDefectSerializer(serializers.Serializer):
@@ -1,18 +1,25 @@
+import logging
+
+from celery.signals import task_postrun
 from django.conf import settings
-from django.db.models.signals import post_delete
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 
-from .models import LepImage
+from .models import AiModel, Batch, LepImage
+from .progress import progress
+from .response_cache import bump_versions_on_commit
+from . import stats
+
+logger = logging.getLogger(__name__)
 
 
 @receiver(post_delete, sender=LepImage)
 def delete_s3_files_on_image_delete(sender, instance, **kwargs):
     """
     Удаляет файлы из S3 при удалении записи LepImage из БД.
+    Само удаление выполняет воркер очереди artifacts после коммита транзакции.
     """
-    s3_client = settings.S3_CLIENT_PRIVATE
-    bucket = settings.AWS_STORAGE_BUCKET_NAME
-
     keys_to_delete = []
 
     if instance.file_key:
@@ -27,15 +34,167 @@ def delete_s3_files_on_image_delete(sender, instance, **kwargs):
     if not keys_to_delete:
         return
 
-    objects_to_delete = [{'Key': key} for key in keys_to_delete]
+    from .tasks import delete_artifacts_task
+
+    transaction.on_commit(
+        lambda: delete_artifacts_task.apply_async(
+            (keys_to_delete,), priority=settings.VISION_PRIORITY_CLEANUP
+        )
+    )
+
 
+@receiver(post_save, sender=LepImage)
+def count_created_image(sender, instance, created, **kwargs):
+    """
+    Учитывает новый снимок в счётчиках прогресса набора.
+    Обработанные снимки учитывают задачи инференса.
+    Недоступный Redis не должен мешать сохранению снимка: пропущенные
+    изменения восстановит reconcile_progress_task.
+    """
+    if not created:
+        return
     try:
-        s3_client.delete_objects(
-            Bucket=bucket,
-            Delete={
-                'Objects': objects_to_delete,
-                'Quiet': True
-            }
+        progress.increment(instance.batch_id, total=1)
+    except Exception as e:
+        logger.warning("Failed to count image %s in batch progress: %s", instance.id, e)
+
+
+@receiver(post_delete, sender=LepImage)
+def count_deleted_image(sender, instance, **kwargs):
+    try:
+        progress.increment(
+            instance.batch_id,
+            total=-1,
+            processed=-int(instance.detection_result is not None),
         )
     except Exception as e:
-        print(f"Error deleting files from S3 for Image {instance.id}: {str(e)}")
+        logger.warning("Failed to subtract image %s from batch progress: %s", instance.id, e)
+
+
+@receiver(post_save, sender=LepImage)
+def count_created_image_stats(sender, instance, created, **kwargs):
+    if created:
+        stats.add_batch_counters(instance.batch_id, total=1)
+
+
+@receiver(post_delete, sender=LepImage)
+def count_deleted_image_stats(sender, instance, origin=None, **kwargs):
+    """
+    Вычитает снимок из сводок. При удалении всего набора детекции
+    вычитаются одним запросом в subtract_batch_stats.
+    """
+    if isinstance(origin, Batch) or getattr(origin, "model", None) is Batch:
+        return
+    stats.forget_image(instance)
+
+
+@receiver(post_save, sender=Batch)
+def create_batch_stats(sender, instance, created, **kwargs):
+    """
+    Заводит сводку нового набора, а при изменении набора пересчитывает
+    его состояние: признак просмотра мог поменяться.
+    """
+    if created:
+        stats.create_batch_stats(instance)
+    else:
+        stats.refresh_state(instance.id)
+
+
+@receiver(pre_delete, sender=Batch)
+def subtract_batch_stats(sender, instance, **kwargs):
+    stats.forget_batch(instance)
+
+
+@receiver(post_save, sender=LepImage)
+@receiver(post_delete, sender=LepImage)
+def invalidate_image_responses(sender, instance, origin=None, **kwargs):
+    """
+    Сбрасывает закэшированные списки и статистику при появлении
+    или удалении снимка. Удаление всего набора сбрасывает их один раз.
+    """
+    if isinstance(origin, Batch) or getattr(origin, "model", None) is Batch:
+        return
+    bump_versions_on_commit(instance.batch_id)
+
+
+@receiver(post_save, sender=Batch)
+@receiver(post_delete, sender=Batch)
+def invalidate_batch_responses(sender, instance, **kwargs):
+    bump_versions_on_commit(instance.id)
+
+
+@receiver(post_save, sender=Batch)
+def update_batch_progress_meta(sender, instance, created, **kwargs):
+    if created:
+        return
+    try:
+        progress.update_meta(instance)
+    except Exception as e:
+        logger.warning("Failed to update progress of batch %s: %s", instance.id, e)
+
+
+@receiver(post_delete, sender=Batch)
+def forget_batch_progress(sender, instance, **kwargs):
+    try:
+        progress.forget(instance.id)
+    except Exception as e:
+        logger.warning("Failed to forget progress of batch %s: %s", instance.id, e)
+
+
+@receiver(post_delete, sender=LepImage)
+def forget_rendered_images_on_image_delete(sender, instance, **kwargs):
+    """
+    Убирает из кэша отрисованные по запросу изображения с разметкой.
+    """
+    if instance.detection_result is None:
+        return
+
+    from .render import forget_renders
+
+    try:
+        forget_renders(instance)
+    except Exception as e:
+        print(f"Error deleting rendered images for Image {instance.id}: {str(e)}")
+
+
+@receiver(post_save, sender=AiModel)
+@receiver(post_delete, sender=AiModel)
+def invalidate_model_registry(sender, instance, **kwargs):
+    """
+    Сбрасывает закэшированную модель при изменении или удалении записи AiModel.
+    В других процессах смена файла отлавливается по отпечатку весов.
+    """
+    from .registry import registry
+
+    registry.invalidate(instance.id)
+
+
+@receiver(post_save, sender=AiModel)
+def export_model_on_save(sender, instance, **kwargs):
+    """
+    Запускает экспорт весов под CPU-движок, если экспорта для текущих
+    файла и движка ещё нет.
+    """
+    if instance.engine == AiModel.Engine.PYTORCH:
+        return
+    if instance.engine_build == instance.engine_signature():
+        return
+
+    from .tasks import export_model_task
+
+    transaction.on_commit(lambda: export_model_task.delay(instance.id))
+
+
+@task_postrun.connect
+def refill_dispatch_window(task_id=None, **kwargs):
+    """
+    После завершения задачи из окна диспетчера (успешного или с ошибкой)
+    отправляет в брокер следующую порцию.
+    """
+    from .dispatcher import dispatcher
+
+    try:
+        if dispatcher.release(task_id):
+            dispatcher.dispatch()
+    except Exception as e:
+        print(f"Error refilling dispatch window after task {task_id}: {str(e)}")
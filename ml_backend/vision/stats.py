@@ -0,0 +1,195 @@
+from collections import Counter, defaultdict
+from datetime import timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Case, Count, Exists, F, OuterRef, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+
+from .models import Batch, BatchStats, DailyClassStats, Detection, LepImage
+from .response_cache import bump_versions_on_commit
+
+# Поля BatchStats, которые считаются по снимкам набора
+BATCH_COUNTERS = ("total", "processed", "images_with_damage", "damage_count")
+
+
+def stats_day(moment):
+    return moment.astimezone(dt_timezone.utc).date()
+
+
+def create_batch_stats(batch: Batch):
+    BatchStats.objects.get_or_create(batch=batch, defaults={"day": stats_day(batch.uploaded_at)})
+
+
+def add_batch_counters(batch_id: int, **deltas):
+    """
+    Атомарно меняет счётчики набора: add_batch_counters(batch_id, total=1).
+    Состояние набора пересчитывается по новым значениям.
+    """
+    deltas = {field: F(field) + value for field, value in deltas.items() if value}
+    if deltas:
+        BatchStats.objects.filter(batch_id=batch_id).update(**deltas)
+        refresh_state(batch_id)
+
+
+def batch_state():
+    """
+    Выражение состояния набора по признаку просмотра и счётчикам BatchStats,
+    те же правила, что у progress.processing_status.
+    """
+    counters = BatchStats.objects.filter(batch_id=OuterRef("id"))
+    return Case(
+        When(status=True, then=Value(Batch.State.REVIEWED)),
+        When(Exists(counters.filter(processed=0)), then=Value(Batch.State.UPLOADED)),
+        When(Exists(counters.filter(processed__lt=F("total"))), then=Value(Batch.State.PROCESSING)),
+        When(Exists(counters.filter(processed=F("total"))), then=Value(Batch.State.COMPLETED)),
+        default=Value(Batch.State.UPLOADED),
+    )
+
+
+def refresh_state(batch_id: int):
+    """
+    Пересчитывает Batch.state одним UPDATE.
+    """
+    Batch.objects.filter(id=batch_id).update(state=batch_state())
+
+
+def add_class_counts(day, counts: dict):
+    """
+    Прибавляет к дневной статистике количество детекций по классам.
+    Отрицательные значения вычитают.
+    """
+    for class_name, delta in counts.items():
+        if not delta:
+            continue
+        DailyClassStats.objects.get_or_create(day=day, class_name=class_name)
+        DailyClassStats.objects.filter(day=day, class_name=class_name).update(
+            count=F("count") + delta
+        )
+
+
+def record_results(images) -> set:
+    """
+    Учитывает в сводках пачку записываемых результатов.
+
+    Вызывается в транзакции ResultWriter до bulk_update. Прежнее состояние
+    снимков читается из БД под select_for_update: у уже обработанных
+    снимков старые сводные поля вычитаются, а в processed попадают только
+    снимки, которые обрабатываются впервые, так что повторная обработка
+    (перезапуск задачи, повторная доставка) не сдвигает счётчики.
+
+    Args:
+        images: снимки с заполненными сводными полями
+
+    Returns:
+        set: ID снимков, обработанных впервые
+    """
+    previous = {
+        row["id"]: row
+        for row in LepImage.objects.select_for_update()
+        .filter(id__in=[image_obj.id for image_obj in images], detection_result__isnull=False)
+        .values("id", "has_damage", "damage_count", "class_counts")
+    }
+
+    batch_deltas = defaultdict(Counter)
+    class_deltas = defaultdict(Counter)
+    for image_obj in images:
+        old = previous.get(image_obj.id, {"has_damage": False, "damage_count": 0, "class_counts": {}})
+        batch_deltas[image_obj.batch_id].update({
+            "processed": int(image_obj.id not in previous),
+            "images_with_damage": int(image_obj.has_damage) - int(old["has_damage"]),
+            "damage_count": image_obj.damage_count - old["damage_count"],
+        })
+        class_deltas[image_obj.batch_id].update(image_obj.class_counts)
+        class_deltas[image_obj.batch_id].subtract(old["class_counts"] or {})
+
+    for batch_id, deltas in batch_deltas.items():
+        add_batch_counters(batch_id, **deltas)
+
+    days = dict(
+        BatchStats.objects.filter(batch_id__in=list(class_deltas)).values_list("batch_id", "day")
+    )
+    for batch_id, counts in class_deltas.items():
+        if batch_id in days:
+            add_class_counts(days[batch_id], counts)
+
+    return {image_obj.id for image_obj in images} - set(previous)
+
+
+def forget_image(image_obj: LepImage):
+    """
+    Вычитает удалённый снимок из сводок его набора.
+    """
+    day = (
+        BatchStats.objects.filter(batch_id=image_obj.batch_id)
+        .values_list("day", flat=True)
+        .first()
+    )
+    if day is None:
+        return
+
+    add_batch_counters(
+        image_obj.batch_id,
+        total=-1,
+        processed=-int(image_obj.detection_result is not None),
+        images_with_damage=-int(image_obj.has_damage),
+        damage_count=-image_obj.damage_count,
+    )
+    add_class_counts(day, {name: -count for name, count in (image_obj.class_counts or {}).items()})
+
+
+def forget_batch(batch: Batch):
+    """
+    Вычитает детекции удаляемого набора из дневной статистики одним
+    GROUP BY по таблице детекций. Строка BatchStats удаляется каскадом.
+    """
+    counts = dict(
+        Detection.objects.filter(batch_id=batch.id)
+        .values("class_name")
+        .annotate(count=Count("id"))
+        .values_list("class_name", "count")
+    )
+    add_class_counts(stats_day(batch.uploaded_at), {name: -count for name, count in counts.items()})
+
+
+@transaction.atomic
+def rebuild() -> tuple:
+    """
+    Пересчитывает обе сводки с нуля по снимкам и детекциям
+    и по ним — состояние всех наборов.
+
+    Returns:
+        tuple: количество строк BatchStats и DailyClassStats
+    """
+    batches = Batch.objects.annotate(
+        total=Count("lepimage"),
+        processed=Count("lepimage", filter=Q(lepimage__detection_result__isnull=False)),
+        images_with_damage=Count("lepimage", filter=Q(lepimage__has_damage=True)),
+        damage_count=Sum("lepimage__damage_count"),
+    ).values("id", "uploaded_at", *BATCH_COUNTERS)
+
+    daily = (
+        Detection.objects.annotate(day=TruncDate("batch__uploaded_at", tzinfo=dt_timezone.utc))
+        .values("day", "class_name")
+        .annotate(count=Count("id"))
+    )
+
+    BatchStats.objects.all().delete()
+    DailyClassStats.objects.all().delete()
+    batch_stats = BatchStats.objects.bulk_create(
+        [
+            BatchStats(
+                batch_id=row["id"],
+                day=stats_day(row["uploaded_at"]),
+                **{field: row[field] or 0 for field in BATCH_COUNTERS},
+            )
+            for row in batches
+        ],
+        batch_size=1000,
+    )
+    daily_stats = DailyClassStats.objects.bulk_create(
+        [DailyClassStats(**row) for row in daily],
+        batch_size=1000,
+    )
+    Batch.objects.update(state=batch_state())
+    bump_versions_on_commit()
+    return len(batch_stats), len(daily_stats)
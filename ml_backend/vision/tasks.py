@@ -1,14 +1,40 @@
+import logging
 import os
-import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, wait
+from contextlib import contextmanager
 from io import BytesIO
+from itertools import batched
 
+import cv2
+import numpy as np
 from PIL import Image
 from PIL.ExifTags import GPSTAGS, IFD
 from celery import shared_task
 from django.conf import settings
-from ultralytics import YOLO
 
-from .models import LepImage, AiModel
+from .dispatcher import dispatcher
+from .engines import export_engine
+from .events import publish_image_failed
+from .models import Batch, LepImage, AiModel
+from .pipeline import BackgroundUploader, prefetch, shared_pool
+from .progress import progress
+from .registry import registry
+from .render import draw_detections
+from .result_cache import (
+    lookup_result,
+    result_cache,
+    result_cache_key,
+    reuse_result,
+)
+from .tiling import predict_tiled
+from .uploads import register_uploads, upload_prefix
+from .utils import make_derived_key
+from .writer import ResultWriter
+
+logger = logging.getLogger(__name__)
 
 
 def dms_to_decimal(dms, ref):
@@ -78,143 +104,502 @@ def extract_gps_from_image(image):
         return None
 
 
+class DecodedImage:
+    """
+    Изображение, декодированное из байтов один раз в памяти.
+
+    PIL читает только заголовок (формат и EXIF с GPS), пиксели декодируются
+    один раз в numpy массив BGR. Этот массив используется и для инференса,
+    и для превью, и для отрисовки результата.
+    """
+
+    def __init__(self, img_data: bytes):
+        header = Image.open(BytesIO(img_data))
+        self.format = header.format or "JPEG"
+        self.gps = extract_gps_from_image(header)
+
+        frame = cv2.imdecode(np.frombuffer(img_data, np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            # Форматы, которые OpenCV не умеет, декодируем через PIL
+            frame = np.ascontiguousarray(np.asarray(header.convert("RGB"))[..., ::-1])
+        self.frame = frame
+
+    def preview(self, size: int = 512):
+        """
+        Уменьшенная копия кадра с сохранением пропорций (как Image.thumbnail).
+        """
+        height, width = self.frame.shape[:2]
+        scale = min(size / width, size / height, 1.0)
+        if scale >= 1.0:
+            return to_pil(self.frame)
+
+        resized = cv2.resize(
+            self.frame,
+            (max(1, round(width * scale)), max(1, round(height * scale))),
+            interpolation=cv2.INTER_AREA,
+        )
+        return to_pil(resized)
+
+
+def to_pil(frame):
+    """
+    Переводит BGR массив в PIL изображение.
+    """
+    return Image.fromarray(np.ascontiguousarray(frame[..., ::-1]))
+
+
+class StageTimer:
+    """
+    Накапливает время выполнения этапов обработки в миллисекундах.
+    Этапы из разных потоков суммируются.
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self.timings[name] = round(self.timings.get(name, 0.0) + elapsed, 2)
+
+
+def extract_detections(r, names) -> list:
+    """
+    Переводит результат YOLO в список детекций для detection_result.
+    """
+    detections = []
+    if r.boxes is not None and len(r.boxes) > 0:
+        labels = r.boxes.cls.cpu().numpy()
+        scores = r.boxes.conf.cpu().numpy()
+        boxes = r.boxes.xyxy.cpu().numpy()
+
+        for cls, conf, box in zip(labels, scores, boxes):
+            detections.append({
+                "class": names[int(cls)],
+                "confidence": float(conf),
+                "bbox": box.tolist(),
+            })
+    return detections
+
+
+def upload_image(image, key: str, img_format: str):
+    """
+    Кодирует PIL изображение и загружает его в бакет.
+    """
+    buffer = BytesIO()
+    image.save(buffer, format=img_format)
+    buffer.seek(0)
+
+    settings.S3_CLIENT_PRIVATE.put_object(
+        Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+        Key=key,
+        Body=buffer,
+        ContentType=f"image/{img_format.lower()}",
+        ACL="public-read",
+    )
+
+
+def run_inference(model, model_obj: AiModel, frames: list) -> list:
+    """
+    Прогоняет модель по кадрам.
+
+    Обычный режим — один вызов predict на все кадры. Если у модели задан
+    tile_size, каждый кадр режется на тайлы, а детекции сводятся через NMS.
+
+    Returns:
+        list: пары (детекции, результат YOLO) для каждого кадра;
+        в тайловом режиме вместо результата YOLO — None
+    """
+    if model_obj.tile_size:
+        return [
+            (
+                predict_tiled(
+                    model,
+                    frame,
+                    tile_size=model_obj.tile_size,
+                    overlap=model_obj.tile_overlap,
+                    conf=settings.VISION_CONF,
+                    tile_batch=settings.VISION_TILE_BATCH,
+                ),
+                None,
+            )
+            for frame in frames
+        ]
+
+    results = model.predict(
+        frames,
+        imgsz=settings.VISION_IMGSZ,
+        conf=settings.VISION_CONF,
+        save=False,
+    )
+    return [(extract_detections(r, model.names), r) for r in results]
+
+
+def store_artifacts(file_key: str, decoded: DecodedImage, detections: list, r, timer: StageTimer):
+    """
+    Параллельно кодирует и загружает размеченное изображение и превью.
+    Возвращает ключи только если успешно загружены все файлы,
+    иначе пробрасывает первую ошибку.
+
+    При VISION_RESULT_RENDER = "lazy" размеченное изображение не создаётся,
+    его отрисовывает ImageRenderView по запросу.
+
+    Returns:
+        tuple: ключи результата (или None) и превью
+    """
+    eager = settings.VISION_RESULT_RENDER == "eager"
+    result_key = make_derived_key(file_key, "results") if eager else None
+    preview_key = make_derived_key(file_key, "previews")
+
+    def render():
+        with timer.stage("render"):
+            if r is not None:
+                plotted_image = to_pil(r.plot())
+            else:
+                plotted_image = draw_detections(to_pil(decoded.frame), detections)
+            upload_image(plotted_image, result_key, decoded.format)
+
+    def preview():
+        with timer.stage("preview"):
+            upload_image(decoded.preview(), preview_key, decoded.format)
+
+    pool = shared_pool()
+    with timer.stage("artifacts"):
+        futures = [pool.submit(preview)]
+        if eager:
+            futures.append(pool.submit(render))
+        wait(futures)
+    for future in futures:
+        future.result()
+
+    return result_key, preview_key
+
+
+def apply_gps(image_obj: LepImage, gps_data):
+    if gps_data:
+        image_obj.latitude = gps_data['latitude']
+        image_obj.longitude = gps_data['longitude']
+    else:
+        # СДЕЛАНО ИСКЛЮЧИТЕЛЬНО ДЛЯ ТЕСТА И ПОКАЗА ФУНКЦИОНАЛЬНОСТИ
+        # УБРАТЬ ДЛЯ ПРОДАКШЕНА
+        _gps = generate_random_russia_coordinates()
+        image_obj.latitude = _gps["latitude"]
+        image_obj.longitude = _gps["longitude"]
+
+
 @shared_task(
-    soft_time_limit=300,
-    time_limit=360,
+    soft_time_limit=3600,
+    time_limit=3660,
 )
-def process_image_task(file_key: str, model_id: int):
+def process_batch_task(batch_id: int, model_id: int, chunk_size: int = 8, image_ids: list = None):
     """
-    Обрабатывает изображение с помощью YOLO модели.
+    Обрабатывает все необработанные изображения набора пачками.
+    На каждую пачку делается один вызов YOLO.
+
+    Оригиналы скачиваются и декодируются в отдельном пуле с опережением,
+    пока модель занята текущей пачкой, а результаты и превью загружаются
+    в бакет другим пулом. Обе очереди ограничены, чтобы память не росла
+    вместе с размером набора.
 
     Args:
-        file_key: Ключ файла в S3
-        model_id: Объект модели
+        batch_id: ID набора
+        model_id: ID модели
+        chunk_size: Количество изображений в одном вызове predict
+        image_ids: ID изображений порции от диспетчера; если не переданы —
+            все необработанные изображения набора
     """
     s3_client = settings.S3_CLIENT_PRIVATE
     bucket = settings.AWS_STORAGE_BUCKET_NAME
 
     try:
-        image_obj = LepImage.objects.get(file_key=file_key)
-    except LepImage.DoesNotExist:
-        return {"error": f"Image with file_key={file_key} not found"}
+        model_obj = AiModel.objects.get(id=model_id)
+        model = registry.get(model_obj)
+    except AiModel.DoesNotExist:
+        return {"error": f"Model with id={model_id} not found"}
+
+    pending_images = LepImage.objects.filter(batch_id=batch_id, detection_result__isnull=True)
+    if image_ids is not None:
+        pending_images = pending_images.filter(id__in=image_ids)
+    pending_images = list(pending_images.order_by("id"))
+
+    cached = 0
+    errors = []
+    timer = StageTimer()
+
+    def fetch(image_obj):
+        with timer.stage("download"):
+            obj = s3_client.get_object(Bucket=bucket, Key=image_obj.file_key)
+            img_data = obj["Body"].read()
+
+        with timer.stage("cache"):
+            cache_key = result_cache_key(img_data, model_obj)
+            cached = lookup_result(cache_key)
+            if cached is not None and reuse_result(cache_key, cached, image_obj):
+                return cache_key, None
+
+        with timer.stage("decode"):
+            return cache_key, DecodedImage(img_data)
+
+    stream = prefetch(
+        pending_images,
+        fetch,
+        depth=settings.VISION_PREFETCH_DEPTH,
+        workers=settings.VISION_DOWNLOAD_WORKERS,
+    )
+    uploader = BackgroundUploader(
+        workers=settings.VISION_UPLOAD_WORKERS,
+        max_pending=settings.VISION_UPLOAD_MAX_PENDING,
+    )
+    uploads = deque()
+    writer = ResultWriter(flush_size=settings.VISION_RESULT_FLUSH_SIZE)
+
+    try:
+        for chunk in batched(stream, chunk_size):
+            loaded = []
+            for image_obj, fetched, error in chunk:
+                if error is not None:
+                    errors.append({"file_key": image_obj.file_key, "error": str(error)})
+                    continue
+
+                cache_key, decoded = fetched
+                if decoded is None:
+                    # Артефакты уже скопированы из кэша, остаётся записать строку
+                    future = Future()
+                    future.set_result((image_obj.result, image_obj.preview))
+                    uploads.append((image_obj, future, None))
+                    cached += 1
+                    continue
+                loaded.append((image_obj, cache_key, decoded))
+
+            if not loaded:
+                continue
+
+            try:
+                with timer.stage("predict"):
+                    results = run_inference(
+                        model, model_obj, [decoded.frame for _, _, decoded in loaded]
+                    )
+            except Exception as e:
+                errors.extend(
+                    {"file_key": image_obj.file_key, "error": str(e)}
+                    for image_obj, _, _ in loaded
+                )
+                continue
+
+            for (image_obj, cache_key, decoded), (detections, r) in zip(loaded, results):
+                image_obj.detection_result = detections
+                apply_gps(image_obj, decoded.gps)
+                future = uploader.submit(
+                    store_artifacts, image_obj.file_key, decoded, detections, r, timer
+                )
+                uploads.append((image_obj, future, cache_key))
+
+            write_uploaded(uploads, writer, errors, timer, wait=False)
+
+        write_uploaded(uploads, writer, errors, timer, wait=True)
+    finally:
+        uploader.shutdown()
+        # Уже загруженные результаты записываем и при прерывании задачи
+        with timer.stage("save"):
+            writer.flush()
+        try:
+            counters = progress.increment(batch_id, failed=len(errors))
+        except Exception as e:
+            logger.warning("Failed to count errors of batch %s: %s", batch_id, e)
+            counters = None
+        for error in errors:
+            publish_image_failed(batch_id, error["file_key"], error["error"], counters)
+
+    logger.info("Processed batch %s: %s", batch_id, timer.timings)
 
+    return {
+        "batch_id": batch_id,
+        "processed": writer.written,
+        "cached": cached,
+        "errors": errors,
+        "model_cache": registry.stats(),
+        "result_cache": result_cache.stats(),
+        "timings": timer.timings,
+    }
+
+
+def write_uploaded(uploads: deque, writer: ResultWriter, errors: list, timer: StageTimer, wait: bool):
+    """
+    Передаёт в ResultWriter изображения, для которых загрузка артефактов завершилась.
+    Результат пишется только после успешной загрузки результата и превью.
+
+    Args:
+        uploads: очередь (LepImage, Future загрузки, ключ кэша) в порядке отправки;
+            ключ None у снимков, взятых из кэша
+        wait: ждать ли завершения всех загрузок
+    """
+    with timer.stage("save"):
+        while uploads and (wait or uploads[0][1].done()):
+            image_obj, future, cache_key = uploads.popleft()
+            try:
+                image_obj.result, image_obj.preview = future.result()
+            except Exception as e:
+                errors.append({"file_key": image_obj.file_key, "error": str(e)})
+                continue
+            writer.add(image_obj, cache_key)
+
+
+@shared_task(
+    soft_time_limit=1800,
+    time_limit=1860,
+)
+def export_model_task(model_id: int):
+    """
+    Экспортирует веса модели в формат, выбранный в AiModel.engine.
+
+    Args:
+        model_id: ID модели
+    """
     try:
         model_obj = AiModel.objects.get(id=model_id)
-        model = YOLO(model_obj.model_file.path)
     except AiModel.DoesNotExist:
         return {"error": f"Model with id={model_id} not found"}
 
+    if model_obj.engine == AiModel.Engine.PYTORCH:
+        return {"model_id": model_id, "engine": model_obj.engine}
+
     try:
-        obj = s3_client.get_object(Bucket=bucket, Key=file_key)
-        img_data = obj["Body"].read()
+        engine_path = export_engine(model_obj)
     except Exception as e:
-        return {"error": f"Failed to load image from S3: {str(e)}"}
+        logger.exception("Failed to export model %s to %s", model_id, model_obj.engine)
+        return {"error": f"Export failed: {str(e)}", "model_id": model_id}
 
-    with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as tmp_file:
-        tmp_path = tmp_file.name
-        tmp_file.write(img_data)
+    # update() вместо save(), чтобы не запускать экспорт повторно из сигнала
+    AiModel.objects.filter(id=model_id).update(
+        engine_path=engine_path,
+        engine_build=model_obj.engine_signature(),
+    )
+    registry.invalidate(model_id)
 
-    try:
-        image = Image.open(BytesIO(img_data))
-        img_format = image.format if image.format else "JPEG"
+    return {"model_id": model_id, "engine": model_obj.engine, "engine_path": engine_path}
 
-        gps_data = extract_gps_from_image(image)
 
-        results = model.predict(tmp_path, imgsz=768, conf=0.25, save=False)
+@shared_task(
+    soft_time_limit=600,
+    time_limit=660,
+)
+def confirm_batch_task(batch_id: int, model_id: int, chunk_size: int):
+    """
+    Проверяет, какие изображения набора загружены в бакет, и передаёт их диспетчеру.
 
-        if not results or len(results) == 0:
-            return {
-                "error": "No results from YOLO prediction",
-                "file_key": file_key,
-                "detections_count": 0,
-            }
+    Вместо head_object на каждый файл листингом читаются каталоги набора:
+    один запрос на тысячу ключей. Файлы, загруженные по POST-политике
+    в каталог набора под именами клиента, регистрируются как новые снимки.
+    Файлы во вложенных каталогах отклоняются: они удаляются из бакета,
+    по каждому публикуется событие ошибки, а ключи попадают в результат задачи.
 
-        r = results[0]
-
-        detections = []
-        if r.boxes is not None and len(r.boxes) > 0:
-            labels = r.boxes.cls.cpu().numpy()
-            scores = r.boxes.conf.cpu().numpy()
-            boxes = r.boxes.xyxy.cpu().numpy()
-
-            for cls, conf, box in zip(labels, scores, boxes):
-                detections.append({
-                    "class": model.names[int(cls)],
-                    "confidence": float(conf),
-                    "bbox": box.tolist(),
-                })
-
-        plotted_image_array = r.plot()
-        plotted_image = Image.fromarray(plotted_image_array[..., ::-1])
-
-        result_bytes = BytesIO()
-        plotted_image.save(result_bytes, format=img_format)
-        result_bytes.seek(0)
-
-        result_key = file_key.replace("uploads", "results")
-        if result_key == file_key:
-            result_key = f"results/{file_key}"
-
-        s3_client.put_object(
-            Bucket=bucket,
-            Key=result_key,
-            Body=result_bytes,
-            ContentType=f"image/{img_format.lower()}",
-            ACL="public-read",
-        )
+    Args:
+        batch_id: ID набора
+        model_id: ID модели
+        chunk_size: Количество изображений в одном вызове predict
+    """
+    pending = list(
+        LepImage.objects.filter(batch_id=batch_id, detection_result__isnull=True)
+        .order_by("id")
+        .values_list("id", "file_key")
+    )
+    batch = Batch.objects.filter(id=batch_id).first()
+    directories = {os.path.dirname(file_key) for _, file_key in pending}
+    if batch is not None:
+        directories.add(upload_prefix(batch).rstrip("/"))
+    existing = existing_keys(directories)
+    created, rejected = register_uploads(batch_id, existing)
+    pending.extend((image.id, image.file_key) for image in created)
+    confirmed_ids = [image_id for image_id, file_key in pending if file_key in existing]
+
+    # Снимки без файла в бакете считаются ошибкой текущего запуска
+    progress.reset_failed(batch_id)
+    progress.increment(batch_id, failed=len(pending) - len(confirmed_ids))
+    dispatcher.enqueue(batch_id, model_id, confirmed_ids, chunk_size)
+
+    if rejected:
+        delete_artifacts_task.apply_async((rejected,), priority=settings.VISION_PRIORITY_CLEANUP)
+        for file_key in rejected:
+            publish_image_failed(batch_id, file_key, "Вложенные каталоги в имени файла не поддерживаются")
 
-        preview = image.copy()
-        preview.thumbnail((512, 512))
-        preview_bytes = BytesIO()
-        preview.save(preview_bytes, format=img_format)
-        preview_bytes.seek(0)
-
-        preview_key = file_key.replace("uploads", "previews")
-        if preview_key == file_key:
-            preview_key = f"previews/{file_key}"
-
-        s3_client.put_object(
-            Bucket=bucket,
-            Key=preview_key,
-            Body=preview_bytes,
-            ContentType=f"image/{img_format.lower()}",
-            ACL="public-read",
-        )
+    return {
+        "batch_id": batch_id,
+        "confirmed": len(confirmed_ids),
+        "missing": len(pending) - len(confirmed_ids),
+        "rejected": rejected,
+    }
 
-        image_obj.preview = preview_key
-        image_obj.result = result_key
-        image_obj.detection_result = detections
 
-        if gps_data:
-            image_obj.latitude = gps_data['latitude']
-            image_obj.longitude = gps_data['longitude']
-        else:
-            # СДЕЛАНО ИСКЛЮЧИТЕЛЬНО ДЛЯ ТЕСТА И ПОКАЗА ФУНКЦИОНАЛЬНОСТИ
-            # УБРАТЬ ДЛЯ ПРОДАКШЕНА
-            _gps = generate_random_russia_coordinates()
-            image_obj.latitude = _gps["latitude"]
-            image_obj.longitude = _gps["longitude"]
+def existing_keys(directories) -> set:
+    """
+    Ключи объектов, лежащих в бакете в указанных каталогах.
+    """
+    paginator = settings.S3_CLIENT_PRIVATE.get_paginator("list_objects_v2")
+    keys = set()
+    for directory in directories:
+        prefix = f"{directory}/" if directory else ""
+        for page in paginator.paginate(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Prefix=prefix):
+            keys.update(obj["Key"] for obj in page.get("Contents", []))
+    return keys
 
-        image_obj.save()
 
-        response_data = {
-            "file_key": file_key,
-            "detections_count": len(detections),
-            "result_key": result_key,
-            "preview_key": preview_key,
-        }
+@shared_task(
+    soft_time_limit=60,
+    time_limit=90,
+)
+def dispatch_task():
+    """
+    Досылает порции диспетчера, если окно или очередь брокера освободились,
+    а задачи, которые должны были это сделать, не отчитались.
+    """
+    return {"sent": dispatcher.dispatch()}
 
-        return response_data
 
-    except Exception as e:
-        return {"error": f"Error during prediction: {str(e)}", "file_key": file_key}
+@shared_task(
+    soft_time_limit=300,
+    time_limit=330,
+)
+def reconcile_progress_task():
+    """
+    Сверяет счётчики прогресса наборов в Redis с БД.
+    """
+    return {"reconciled": progress.reconcile_all()}
 
-    finally:
-        if os.path.exists(tmp_path):
-            os.remove(tmp_path)
 
+@shared_task(
+    soft_time_limit=120,
+    time_limit=150,
+)
+def delete_artifacts_task(keys: list):
+    """
+    Удаляет из бакета оригиналы и производные файлы удалённых изображений.
 
+    Args:
+        keys: ключи объектов в бакете
+    """
+    s3_client = settings.S3_CLIENT_PRIVATE
+    bucket = settings.AWS_STORAGE_BUCKET_NAME
 
+    # delete_objects принимает не больше 1000 ключей за вызов
+    for chunk in batched(keys, 1000):
+        try:
+            s3_client.delete_objects(
+                Bucket=bucket,
+                Delete={
+                    'Objects': [{'Key': key} for key in chunk],
+                    'Quiet': True
+                }
+            )
+        except Exception as e:
+            print(f"Error deleting files from S3: {str(e)}")
+
+    return {"deleted": len(keys)}
 
 
 def generate_random_russia_coordinates():
@@ -1,3 +1,721 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, UTC
+from types import SimpleNamespace
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+import boto3
+import fakeredis
+import numpy as np
+import torch
+from botocore.config import Config
+from django.conf import settings
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from . import presign, views
+from .cache import BoundedCache
+from .dispatcher import BatchDispatcher
+from .models import AiModel, Batch, BatchStats, DailyClassStats, LepImage
+from .presign import S3Presigner
+from .progress import BatchProgress, progress
+from .registry import ModelRegistry
+from .response_cache import batch_scope, bump_versions, current_version, version_key
+from .stats import rebuild
+from .tasks import confirm_batch_task
+from .tiling import nms, predict_tiled, tile_origins
+from .uploads import register_uploads, upload_prefix
+from .writer import ResultWriter
+
+# Тестам не нужен живой Redis: кэш default подменяется на fakeredis
+# с Lua для скриптов BoundedCache и BatchProgress
+FAKE_REDIS = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": "redis://fakeredis:6379/0",
+        "OPTIONS": {
+            "CONNECTION_POOL_KWARGS": {
+                "connection_class": fakeredis.FakeConnection,
+                "server": fakeredis.FakeServer(),
+            },
+        },
+    },
+}
+
+
+@override_settings(CACHES=FAKE_REDIS)
+class RedisTestCase(TestCase):
+    """
+    TestCase с пустым fakeredis в каждом тесте.
+    """
+
+    def setUp(self):
+        get_redis_connection("default").flushall()
+
+
+DETECTIONS = [
+    {"class": "nest", "confidence": 0.9, "bbox": [0, 0, 10, 10]},
+    {"class": "traverse", "confidence": 0.8, "bbox": [5, 5, 20, 20]},
+]
+
+
+def write_results(images, detections=DETECTIONS, flush_size=10) -> ResultWriter:
+    """
+    Записывает результат снимкам через ResultWriter, как задача инференса.
+    """
+    writer = ResultWriter(flush_size=flush_size)
+    for image in images:
+        image = LepImage.objects.get(id=image.id)
+        image.detection_result = detections
+        writer.add(image)
+    writer.flush()
+    return writer
+
+
+class BatchListQueriesTest(RedisTestCase):
+    """
+    Страница списка наборов не должна делать запросов на каждую строку.
+    """
+
+    def create_batches(self, count):
+        # Колбэки on_commit сбрасывают версии кэша ответов
+        with self.captureOnCommitCallbacks(execute=True):
+            self._create_batches(count)
+
+    def _create_batches(self, count):
+        for index in range(count):
+            batch = Batch.objects.create(name=f"batch {index}")
+            # bulk_create не вызывает сигналов, счётчики считает rebuild()
+            LepImage.objects.bulk_create(
+                LepImage(
+                    batch=batch,
+                    file_key=f"uploads/{batch.id}/{i}.jpg",
+                    detection_result=[] if i % 2 else None,
+                )
+                for i in range(3)
+            )
+        rebuild()
+
+    def list_queries(self, size):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("batches"), {"size": size})
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_list_page_is_constant_number_of_queries(self):
+        self.create_batches(2)
+        _, few = self.list_queries(size=50)
+
+        self.create_batches(20)
+        response, many = self.list_queries(size=50)
+
+        self.assertEqual(many, few)
+        # COUNT для пагинации и одна выборка наборов со сводками
+        self.assertEqual(many, 2)
+        self.assertEqual(len(response.json()["results"]), 22)
+
+    def test_list_reads_stored_state_and_photo_count(self):
+        self.create_batches(1)
+        row = self.client.get(reverse("batches")).json()["results"][0]
+
+        self.assertEqual(row["photo_count"], 3)
+        self.assertEqual(row["processing_status"], Batch.State.PROCESSING)
+
+
+class S3PresignerTest(SimpleTestCase):
+    """
+    Ссылки S3Presigner должны совпадать с generate_presigned_url boto3.
+    """
+
+    KEYS = [
+        "uploads/2025/01/02/batch_1/a b.jpg",
+        "uploads/2025/01/02/batch_1/файл.jpg",
+        "uploads/2025/01/02/batch_1/a+b=c(1)!~'*.jpg",
+    ]
+
+    def s3_client(self, endpoint_url="http://minio.local:9000", token=None, **s3_config):
+        return boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name="us-east-1",
+            aws_access_key_id="access",
+            aws_secret_access_key="secret",
+            aws_session_token=token,
+            config=Config(signature_version="s3v4", s3=s3_config or None),
+        )
+
+    def assert_matches_boto3(self, client):
+        presigner = S3Presigner.from_client(client)
+        for key in self.KEYS:
+            expected = client.generate_presigned_url(
+                "put_object", Params={"Bucket": "media", "Key": key}, ExpiresIn=3600
+            )
+            # Подписываем тем же временем, что и boto3
+            amz_date = parse_qs(urlsplit(expected).query)["X-Amz-Date"][0]
+            now = datetime.strptime(amz_date, "%Y%m%dT%H%M%SZ").replace(tzinfo=UTC)
+            self.assertEqual(next(presigner.presign_put_many("media", [key], now=now)), expected)
+
+    def test_matches_boto3(self):
+        self.assert_matches_boto3(self.s3_client(addressing_style="path"))
+        self.assert_matches_boto3(self.s3_client())
+        self.assert_matches_boto3(self.s3_client("https://s3.example.com"))
+        self.assert_matches_boto3(self.s3_client("https://s3.example.com:8443/"))
+
+    def test_default_ports(self):
+        # boto3 оставляет порт в URL, но не подписывает его в host
+        self.assert_matches_boto3(self.s3_client("http://MinIO.local:80"))
+        self.assert_matches_boto3(self.s3_client("https://s3.example.com:443"))
+        self.assert_matches_boto3(self.s3_client("http://[::1]:9000"))
+
+    def test_session_token(self):
+        self.assert_matches_boto3(self.s3_client(token="token/with+special=chars"))
+        self.assert_matches_boto3(self.s3_client("https://s3.example.com:443", token="temporary"))
+
+    def test_falls_back_to_boto3(self):
+        client = self.s3_client(addressing_style="virtual")
+        presign._public_presigner.cache_clear()
+        self.addCleanup(presign._public_presigner.cache_clear)
+        with mock.patch.object(settings, "S3_CLIENT_PUBLIC", client):
+            urls = list(presign.presign_put_urls("media", self.KEYS[:1]))
+        self.assertEqual(len(urls), 1)
+        self.assertTrue(urls[0].startswith("http://media.minio.local:9000/"))
+
+    def test_rejects_unsupported_config(self):
+        with self.assertRaises(ValueError):
+            S3Presigner.from_client(self.s3_client(addressing_style="virtual"))
+        with self.assertRaises(ValueError):
+            S3Presigner("http://proxy.local/s3", "us-east-1", None)
+
+
+class RegisterUploadsTest(RedisTestCase):
+    """
+    Подтверждение регистрирует файлы, загруженные по POST-политике.
+    """
+
+    def test_registers_new_files_in_batch_prefix(self):
+        batch = Batch.objects.create(name="policy")
+        prefix = upload_prefix(batch)
+        LepImage.objects.create(batch=batch, file_key=f"{prefix}known.jpg")
+
+        created, rejected = register_uploads(batch.id, [
+            f"{prefix}known.jpg",
+            f"{prefix}new 1.jpg",
+            f"{prefix}new 2.png",
+            f"{prefix}nested/skip.jpg",
+            "uploads/2000/01/01/batch_0/other.jpg",
+        ])
+
+        self.assertEqual(sorted(image.file_key for image in created), [f"{prefix}new 1.jpg", f"{prefix}new 2.png"])
+        self.assertEqual(rejected, [f"{prefix}nested/skip.jpg"])
+        self.assertEqual(batch.lepimage_set.count(), 3)
+        batch.stats.refresh_from_db()
+        self.assertEqual(batch.stats.total, 3)
+        self.assertEqual(register_uploads(batch.id, [f"{prefix}new 1.jpg"]), ([], []))
+
+    def test_confirm_deletes_nested_files(self):
+        batch = Batch.objects.create(name="policy")
+        prefix = upload_prefix(batch)
+        keys = {f"{prefix}photo.jpg", f"{prefix}dir/photo.jpg"}
+        with mock.patch("vision.tasks.existing_keys", return_value=keys), \
+                mock.patch("vision.tasks.dispatcher.enqueue") as enqueue, \
+                mock.patch("vision.tasks.delete_artifacts_task.apply_async") as delete, \
+                mock.patch("vision.tasks.publish_image_failed") as publish:
+            result = confirm_batch_task(batch.id, 1, 8)
+
+        self.assertEqual(result["rejected"], [f"{prefix}dir/photo.jpg"])
+        self.assertEqual(result["confirmed"], 1)
+        self.assertEqual(len(enqueue.call_args.args[2]), 1)
+        self.assertEqual(delete.call_args.args[0], ([f"{prefix}dir/photo.jpg"],))
+        self.assertEqual(publish.call_args.args[1], f"{prefix}dir/photo.jpg")
+
+
+class BoundedCacheTest(RedisTestCase):
+    """
+    Счётчик байт BoundedCache не должен расходиться с записями.
+    """
+
+    def test_concurrent_overwrites_keep_byte_counter(self):
+        cache = BoundedCache(f"test:{uuid.uuid4().hex}", max_bytes=10_000)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda i: cache.set("same", b"x" * (100 + i % 50)), range(400)))
+
+        stats = cache.stats()
+        self.assertEqual(stats["entries"], 1)
+        self.assertEqual(stats["bytes"], len(cache.get("same")))
+
+        cache.delete("same")
+        self.assertEqual(cache.stats()["bytes"], 0)
+
+
+class DispatcherEnqueueTest(RedisTestCase):
+    """
+    Повторное подтверждение набора не ставит изображения в очередь дважды.
+    """
+
+    def test_repeated_enqueue_does_not_duplicate(self):
+        dispatcher = BatchDispatcher(
+            f"test:{uuid.uuid4().hex}", window=1, unit_size=2, deadline=60,
+            queue="inference", max_queue_depth=100, recheck=60,
+        )
+        with mock.patch("vision.tasks.process_batch_task.apply_async") as apply_async, \
+                mock.patch.object(dispatcher, "queue_depth", return_value=0), \
+                mock.patch.object(dispatcher, "_schedule_recheck"):
+            dispatcher.enqueue(1, 1, [1, 2, 3, 4, 5], 8)
+            # Клиент повторил подтверждение: 1 и 2 уже отправлены в задаче окна
+            dispatcher.enqueue(1, 1, [1, 2, 3, 4, 5], 8)
+
+            redis = dispatcher.redis
+            self.assertEqual(apply_async.call_count, 1)
+            self.assertEqual(apply_async.call_args.args[1], {"image_ids": [1, 2]})
+            self.assertEqual(
+                [int(i) for i in redis.lrange(dispatcher._pending_key(1), 0, -1)], [3, 4, 5]
+            )
+
+            dispatcher.release(apply_async.call_args.kwargs["task_id"])
+            self.assertEqual(redis.zcard(dispatcher._sent_key(1)), 0)
+
+    def test_batches_take_turns(self):
+        dispatcher = BatchDispatcher(
+            f"test:{uuid.uuid4().hex}", window=1, unit_size=1, deadline=60,
+            queue="inference", max_queue_depth=100, recheck=60,
+        )
+        with mock.patch("vision.tasks.process_batch_task.apply_async") as apply_async, \
+                mock.patch.object(dispatcher, "queue_depth", return_value=0), \
+                mock.patch.object(dispatcher, "_schedule_recheck"):
+            dispatcher.enqueue(1, 1, list(range(100, 110)), 8)
+            for _ in range(3):
+                dispatcher.release(apply_async.call_args.kwargs["task_id"])
+                dispatcher.dispatch()
+            # Новый набор получает порцию сразу, дальше наборы чередуются
+            dispatcher.enqueue(2, 1, list(range(200, 210)), 8)
+            for _ in range(4):
+                dispatcher.release(apply_async.call_args.kwargs["task_id"])
+                dispatcher.dispatch()
+
+        batches = [call.args[0][0] for call in apply_async.call_args_list]
+        self.assertEqual(batches, [1, 1, 1, 1, 2, 1, 2, 1])
+
+
+class InitUploadStreamTest(RedisTestCase):
+    """
+    Потоковая инициализация проверяет тело до ответа и сообщает
+    о сбое посреди потока последней строкой.
+    """
+
+    def post_ndjson(self, *lines):
+        body = "\n".join(line if isinstance(line, str) else json.dumps(line) for line in lines)
+        return self.client.post(reverse("init-upload"), body, content_type="application/x-ndjson")
+
+    def test_invalid_lines_reject_whole_request(self):
+        response = self.post_ndjson({"batch_name": "bad"}, {"filename": "a.jpg"}, "{oops", {"x": 1})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error["line"] for error in response.json()["files"]], [3, 4])
+        self.assertFalse(Batch.objects.filter(name="bad").exists())
+
+    def test_failure_mid_stream_is_last_line(self):
+        create_images = views.create_images
+
+        def fail_second_chunk(batch_id, images):
+            if LepImage.objects.filter(batch_id=batch_id).exists():
+                raise OSError("db down")
+            return create_images(batch_id, images)
+
+        with override_settings(VISION_INIT_CHUNK_SIZE=2), \
+                mock.patch.object(views, "create_images", side_effect=fail_second_chunk):
+            response = self.post_ndjson({"batch_name": "s"}, *({"filename": f"{i}.jpg"} for i in range(3)))
+            lines = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len([line for line in lines if "upload_url" in line]), 2)
+        self.assertEqual(lines[-1], {"error": "db down"})
+        self.assertEqual(LepImage.objects.filter(batch_id=lines[0]["batch_id"]).count(), 2)
+
+
+class RedisOutageTest(RedisTestCase):
+    """
+    Недоступный Redis не мешает сохранять снимки и результаты.
+    """
+
+    def test_progress_errors_are_logged(self):
+        down = mock.PropertyMock(side_effect=RedisConnectionError("redis down"))
+        with mock.patch.object(BatchProgress, "redis", down), self.assertLogs("vision", "WARNING"):
+            with self.captureOnCommitCallbacks(execute=True):
+                batch = Batch.objects.create(name="outage")
+                image = LepImage.objects.create(batch=batch, file_key="a.jpg")
+            image.detection_result = []
+            with self.captureOnCommitCallbacks(execute=True):
+                writer = ResultWriter(flush_size=10)
+                writer.add(image)
+                self.assertEqual(writer.flush(), 1)
+            batch.name = "renamed"
+            batch.save()
+            image.delete()
+            batch.delete()
+
+        self.assertFalse(Batch.objects.exists())
+
+
+class ResultWriterTest(RedisTestCase):
+    """
+    Запись результатов обновляет сводки и прогресс ровно один раз на снимок.
+    """
+
+    def test_reprocessing_keeps_rollups(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            batch = Batch.objects.create(name="twice")
+            image = LepImage.objects.create(batch=batch, file_key="a.jpg")
+        progress.get(batch.id)
+
+        for _ in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                write_results([image])
+
+            batch.stats.refresh_from_db()
+            self.assertEqual(
+                (batch.stats.processed, batch.stats.images_with_damage, batch.stats.damage_count),
+                (1, 1, 1),
+            )
+            self.assertEqual(
+                dict(DailyClassStats.objects.values_list("class_name", "count")),
+                {"nest": 1, "traverse": 1},
+            )
+            self.assertEqual(progress.get(batch.id)["processed"], 1)
+            self.assertEqual(image.detections.count(), 2)
+
+    def test_flushes_by_size(self):
+        batch = Batch.objects.create(name="flush")
+        images = [LepImage.objects.create(batch=batch, file_key=f"{i}.jpg") for i in range(5)]
+
+        with mock.patch.object(ResultWriter, "_after_commit") as after_commit:
+            with self.captureOnCommitCallbacks(execute=True):
+                writer = write_results(images, flush_size=2)
+
+        self.assertEqual(writer.written, 5)
+        # Пачки по 2 и остаток при явном flush
+        self.assertEqual([len(call.args[0]) for call in after_commit.call_args_list], [2, 2, 1])
+        self.assertEqual(after_commit.call_args_list[0].args[1], {images[0].id, images[1].id})
+        self.assertFalse(LepImage.objects.filter(batch=batch, detection_result__isnull=True).exists())
+        self.assertEqual(LepImage.objects.filter(batch=batch, has_damage=True, damage_count=1).count(), 5)
+
+
+class BatchStateTest(RedisTestCase):
+    """
+    Batch.state следует за счётчиками набора и признаком просмотра.
+    """
+
+    def assert_state(self, batch, state):
+        batch.refresh_from_db()
+        self.assertEqual(batch.state, state)
+
+    def test_transitions(self):
+        batch = Batch.objects.create(name="state")
+        self.assert_state(batch, Batch.State.UPLOADED)
+
+        first, second = (LepImage.objects.create(batch=batch, file_key=f"{i}.jpg") for i in range(2))
+        self.assert_state(batch, Batch.State.UPLOADED)
+
+        write_results([first])
+        self.assert_state(batch, Batch.State.PROCESSING)
+        write_results([second])
+        self.assert_state(batch, Batch.State.COMPLETED)
+
+        batch.status = True
+        batch.save()
+        self.assert_state(batch, Batch.State.REVIEWED)
+        batch.status = False
+        batch.save()
+        self.assert_state(batch, Batch.State.COMPLETED)
+
+        LepImage.objects.create(batch=batch, file_key="new.jpg")
+        self.assert_state(batch, Batch.State.PROCESSING)
+        LepImage.objects.get(file_key="new.jpg").delete()
+        self.assert_state(batch, Batch.State.COMPLETED)
+
+
+class StatsRollupTest(RedisTestCase):
+    """
+    Сводки, которые обновляются по ходу работы, совпадают с пересчётом с нуля.
+    """
+
+    def snapshot(self):
+        return (
+            sorted(BatchStats.objects.values_list(
+                "batch_id", "day", "total", "processed", "images_with_damage", "damage_count"
+            )),
+            sorted(DailyClassStats.objects.exclude(count=0).values_list("day", "class_name", "count")),
+            sorted(Batch.objects.values_list("id", "state")),
+        )
+
+    def assert_matches_rebuild(self):
+        incremental = self.snapshot()
+        rebuild()
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_incremental_matches_rebuild(self):
+        batches = [Batch.objects.create(name=f"rollup {index}") for index in range(2)]
+        images = [
+            LepImage.objects.create(batch=batch, file_key=f"{batch.id}/{i}.jpg")
+            for batch in batches
+            for i in range(3)
+        ]
+        write_results(images[:2])
+        write_results(images[3:4], detections=DETECTIONS[1:])
+        write_results(images[4:5], detections=[])
+        self.assert_matches_rebuild()
+        self.assertEqual(
+            dict(DailyClassStats.objects.values_list("class_name", "count")),
+            {"nest": 2, "traverse": 3},
+        )
+
+        # Повторная обработка с другим результатом
+        write_results(images[:1], detections=DETECTIONS[1:])
+        self.assert_matches_rebuild()
+
+        LepImage.objects.filter(id__in=[images[1].id, images[2].id]).delete()
+        self.assert_matches_rebuild()
+
+        batches[1].delete()
+        self.assert_matches_rebuild()
+        self.assertEqual(
+            dict(DailyClassStats.objects.exclude(count=0).values_list("class_name", "count")),
+            {"traverse": 1},
+        )
+
+
+class ModelRegistryTest(SimpleTestCase):
+    """
+    LRU моделей: повторное использование, перезагрузка по отпечатку весов
+    и вытеснение по объёму.
+    """
+
+    def setUp(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.paths = {}
+        for model_id in (1, 2, 3):
+            self.paths[model_id] = os.path.join(directory, f"{model_id}.onnx")
+            with open(self.paths[model_id], "wb") as f:
+                f.write(b"w" * 100)
+
+        def load_engine(model_obj):
+            return SimpleNamespace(id=model_obj.id), self.paths[model_obj.id], model_obj.engine
+
+        self.load_engine = self.enterContext(
+            mock.patch("vision.registry.load_engine", side_effect=load_engine)
+        )
+        self.enterContext(mock.patch(
+            "vision.registry.engine_weights_path",
+            side_effect=lambda model_obj: self.paths[model_obj.id],
+        ))
+
+    def model(self, model_id):
+        return AiModel(id=model_id, engine=AiModel.Engine.ONNX)
+
+    def test_reuses_loaded_model(self):
+        registry = ModelRegistry(max_bytes=1000)
+        first = registry.get(self.model(1))
+
+        self.assertIs(registry.get(self.model(1)), first)
+        self.assertEqual((registry.hits, registry.misses), (1, 1))
+
+        # Файл весов заменён: модель загружается заново
+        with open(self.paths[1], "ab") as f:
+            f.write(b"w")
+        self.assertIsNot(registry.get(self.model(1)), first)
+        self.assertEqual(self.load_engine.call_count, 2)
+
+        registry.invalidate(1)
+        registry.get(self.model(1))
+        self.assertEqual(self.load_engine.call_count, 3)
+
+    def test_evicts_least_recently_used(self):
+        registry = ModelRegistry(max_bytes=250)
+        registry.get(self.model(1))
+        registry.get(self.model(2))
+        registry.get(self.model(1))
+        registry.get(self.model(3))
+
+        stats = registry.stats()
+        self.assertEqual(set(stats["models"]), {1, 3})
+        self.assertEqual(stats["bytes"], 200)
+        self.assertEqual(registry.evictions, 1)
+
+
+class CachedResponseTest(RedisTestCase):
+    """
+    Условные запросы к закэшированным ответам.
+    """
+
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.batch = Batch.objects.create(name="cached")
+            LepImage.objects.create(batch=self.batch, file_key="a.jpg")
+        self.url = reverse("batch-detail", args=[self.batch.id])
+
+    def test_matching_etag_is_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Last-Modified", response.headers)
+        etag = response.headers["ETag"]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            LepImage.objects.create(batch=self.batch, file_key="b.jpg")
+        response = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["count"], 2)
+
+    def test_etags_survive_redis_flush(self):
+        scope = batch_scope(self.batch.id)
+        etag = self.client.get(self.url).headers["ETag"]
+        version = current_version(scope)
+        # Redis очищен, а затем набор изменился: версия не должна пойти заново
+        get_redis_connection("default").delete(version_key(scope))
+        bump_versions(self.batch.id)
+        self.assertGreater(current_version(scope), version)
+        response = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+
+
+class TilingTest(SimpleTestCase):
+    """
+    Разбиение на тайлы и сведение рамок соседних тайлов.
+    """
+
+    def test_tile_origins(self):
+        self.assertEqual(tile_origins(80, 100, 50), [0])
+        self.assertEqual(tile_origins(100, 100, 50), [0])
+        self.assertEqual(tile_origins(200, 100, 50), [0, 50, 100])
+        # Последний тайл прижат к краю
+        self.assertEqual(tile_origins(230, 100, 75), [0, 75, 130])
+
+    def test_nms(self):
+        boxes = np.array([
+            [0, 0, 10, 10],
+            [0, 0, 4, 10],
+            [0, 0, 10, 10],
+            [20, 20, 30, 30],
+        ], dtype=float)
+        scores = np.array([0.9, 0.95, 0.8, 0.5])
+        classes = np.array([0, 0, 1, 0])
+
+        # Рамки другого класса не подавляются, рамка внутри другой с IoU 0.4 — тоже
+        self.assertEqual(nms(boxes, scores, classes, 0.5), [1, 0, 2, 3])
+        self.assertEqual(nms(boxes, scores, classes, 0.5, containment_threshold=0.8), [1, 2, 3])
+        # Обрезанная рамка уступает целой, несмотря на уверенность
+        complete = np.array([True, False, True, True])
+        self.assertEqual(nms(boxes, scores, classes, 0.5, 0.8, complete), [0, 2, 3])
+        self.assertEqual(nms(boxes[:0], scores[:0], classes[:0], 0.5), [])
+
+    def test_object_on_tile_seam_is_kept_whole(self):
+        # Объект x 80..120 на стыке тайлов шириной 100 с шагом 50
+        seen = {
+            0: ([80, 10, 100, 40], 0.9),
+            50: ([30, 10, 70, 40], 0.6),
+            100: ([0, 10, 20, 40], 0.7),
+        }
+
+        class Boxes(SimpleNamespace):
+            def __len__(self):
+                return len(self.conf)
+
+        def predict(tiles, **kwargs):
+            results = []
+            for tile in tiles:
+                box, score = seen[int(tile[0, 0, 0])]
+                results.append(SimpleNamespace(boxes=Boxes(
+                    xyxy=torch.tensor([box], dtype=torch.float32),
+                    conf=torch.tensor([score]),
+                    cls=torch.tensor([0.0]),
+                )))
+            return results
+
+        model = SimpleNamespace(predict=predict, names={0: "nest"})
+        # В первом канале кадра — номер столбца, по нему predict узнаёт тайл
+        frame = np.zeros((100, 200, 3), np.uint8)
+        frame[..., 0] = np.arange(200)
+
+        detections = predict_tiled(model, frame, tile_size=100, overlap=0.5, conf=0.25, tile_batch=2)
+        self.assertEqual(len(detections), 1)
+        self.assertEqual(detections[0]["bbox"], [80.0, 10.0, 120.0, 40.0])
+        self.assertAlmostEqual(detections[0]["confidence"], 0.6, places=5)
+
+
+class KeysetPaginationTest(RedisTestCase):
+    """
+    Навигация по курсору по двум полям сортировки.
+    """
+
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.batches = [Batch.objects.create(name=f"batch {index}") for index in range(7)]
+            # У большинства наборов одинаковое время загрузки, порядок задаёт id
+            moment = timezone.now()
+            Batch.objects.filter(id__in=[batch.id for batch in self.batches[:5]]).update(uploaded_at=moment)
+            rebuild()
+
+    def walk(self, url, direction, params=None):
+        """
+        Страницы по ссылкам ``direction``, начиная с ``url``.
+        """
+        pages = []
+        while url:
+            body = self.client.get(url, params).json()
+            params = None
+            pages.append([row["id"] for row in body["results"]])
+            url = body[direction]
+        return pages
+
+    def test_same_uploaded_at_is_paged_without_gaps(self):
+        expected = list(
+            Batch.objects.order_by("-uploaded_at", "-id").values_list("id", flat=True)
+        )
+        params = {"pagination": "cursor", "size": 2}
+        pages = self.walk(reverse("batches"), "next", params)
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+        self.assertEqual(sum(pages, []), expected)
+
+        # Обратно по ссылкам previous с последней страницы
+        url = reverse("batches")
+        body = self.client.get(url, params).json()
+        while body["next"]:
+            body = self.client.get(body["next"]).json()
+        self.assertIsNone(body["next"])
+        back = self.walk(body["previous"], "previous")
+        self.assertEqual(back, pages[-2::-1])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("batches"), {"pagination": "cursor", "cursor": "garbage"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_estimated_count(self):
+        body = self.client.get(
+            reverse("batches"), {"pagination": "cursor", "estimate": "true", "size": 2}
+        ).json()
+        self.assertEqual(body["estimated_count"], 7)
+        self.assertNotIn("count", body)
+
+        batch = self.batches[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            for index in range(3):
+                LepImage.objects.create(batch=batch, file_key=f"{index}.jpg")
+        body = self.client.get(
+            reverse("batch-detail", args=[batch.id]), {"pagination": "cursor", "estimate": "1"}
+        ).json()
+        self.assertEqual(body["estimated_count"], 3)
+        self.assertEqual(len(body["results"]), 3)
@@ -0,0 +1,161 @@
+import numpy as np
+
+
+def tile_origins(length: int, tile_size: int, stride: int) -> list:
+    """
+    Начальные координаты тайлов вдоль одной оси.
+    Последний тайл прижимается к краю, чтобы не выходить за изображение.
+    """
+    if length <= tile_size:
+        return [0]
+
+    origins = list(range(0, length - tile_size, stride))
+    origins.append(length - tile_size)
+    return origins
+
+
+def make_tiles(frame: np.ndarray, tile_size: int, overlap: float) -> list:
+    """
+    Режет кадр на перекрывающиеся тайлы.
+    Тайлы — срезы исходного массива, данные не копируются.
+
+    Returns:
+        list: кортежи (x0, y0, тайл)
+    """
+    height, width = frame.shape[:2]
+    stride = max(1, int(tile_size * (1 - overlap)))
+
+    return [
+        (x0, y0, frame[y0:y0 + tile_size, x0:x0 + tile_size])
+        for y0 in tile_origins(height, tile_size, stride)
+        for x0 in tile_origins(width, tile_size, stride)
+    ]
+
+
+# Доля площади меньшей рамки, при которой рамки одного класса из соседних
+# тайлов считаются одним объектом: обрезанная краем тайла часть объекта
+# лежит внутри целой рамки, но IoU у них может быть намного меньше 0.5
+CONTAINMENT_THRESHOLD = 0.8
+# Рамка ближе этого расстояния (в пикселях) к внутреннему краю тайла
+# считается обрезанной
+EDGE_MARGIN = 2
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, classes: np.ndarray, iou_threshold: float,
+        containment_threshold: float = 1.0, complete: np.ndarray = None) -> list:
+    """
+    NMS с учётом классов: рамки разных классов друг друга не подавляют.
+
+    Кроме IoU рамка подавляется, если пересечение занимает больше
+    ``containment_threshold`` площади меньшей из двух рамок.
+    Если передан ``complete``, целые рамки обходятся раньше обрезанных:
+    из пары «целая — обрезанная» остаётся целая, даже с меньшей уверенностью.
+
+    Returns:
+        list: индексы оставленных рамок (целые, затем обрезанные;
+        внутри — по убыванию уверенности)
+    """
+    if len(boxes) == 0:
+        return []
+
+    # Сдвигаем рамки разных классов так, чтобы они не пересекались
+    offsets = classes[:, None] * (boxes.max() + 1)
+    shifted = boxes + offsets
+    x1, y1, x2, y2 = shifted.T
+    areas = (x2 - x1) * (y2 - y1)
+
+    if complete is None:
+        order = scores.argsort()[::-1]
+    else:
+        order = np.lexsort((scores, complete))[::-1]
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(int(i))
+
+        rest = order[1:]
+        xx1 = np.maximum(x1[i], x1[rest])
+        yy1 = np.maximum(y1[i], y1[rest])
+        xx2 = np.minimum(x2[i], x2[rest])
+        yy2 = np.minimum(y2[i], y2[rest])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        containment = inter / (np.minimum(areas[i], areas[rest]) + 1e-9)
+
+        order = rest[(iou <= iou_threshold) & (containment <= containment_threshold)]
+    return keep
+
+
+def touches_inner_edge(boxes: np.ndarray, x0: int, y0: int,
+                       tile_shape: tuple, frame_shape: tuple) -> np.ndarray:
+    """
+    Какие рамки тайла касаются его края внутри кадра, то есть могут быть
+    обрезаны тайлом. Края, совпадающие с краем кадра, не учитываются.
+
+    Args:
+        boxes: рамки в координатах тайла
+        x0, y0: начало тайла в кадре
+        tile_shape, frame_shape: (высота, ширина) тайла и кадра
+    """
+    tile_height, tile_width = tile_shape[:2]
+    height, width = frame_shape[:2]
+    bx1, by1, bx2, by2 = boxes.T
+    return (
+        ((bx1 <= EDGE_MARGIN) & (x0 > 0))
+        | ((by1 <= EDGE_MARGIN) & (y0 > 0))
+        | ((bx2 >= tile_width - EDGE_MARGIN) & (x0 + tile_width < width))
+        | ((by2 >= tile_height - EDGE_MARGIN) & (y0 + tile_height < height))
+    )
+
+
+def predict_tiled(model, frame: np.ndarray, tile_size: int, overlap: float,
+                  conf: float, tile_batch: int, iou_threshold: float = 0.5) -> list:
+    """
+    Прогоняет модель по тайлам кадра и собирает детекции в координатах кадра.
+
+    Тайлы подаются в predict пачками по ``tile_batch``, поэтому объём
+    промежуточных тензоров ограничен размером тайла, а не всего снимка.
+    Объект на стыке тайлов даёт целую рамку в одном тайле и обрезанную
+    в соседнем; такие рамки сливаются по доле площади меньшей рамки,
+    и остаётся целая.
+
+    Returns:
+        list: детекции в формате LepImage.detection_result
+    """
+    boxes, scores, classes, complete = [], [], [], []
+    tiles = make_tiles(frame, tile_size, overlap)
+
+    for start in range(0, len(tiles), tile_batch):
+        chunk = tiles[start:start + tile_batch]
+        results = model.predict(
+            [tile for _, _, tile in chunk],
+            imgsz=tile_size,
+            conf=conf,
+            save=False,
+            verbose=False,
+        )
+        for (x0, y0, tile), r in zip(chunk, results):
+            if r.boxes is None or len(r.boxes) == 0:
+                continue
+            tile_boxes = r.boxes.xyxy.cpu().numpy()
+            complete.append(~touches_inner_edge(tile_boxes, x0, y0, tile.shape, frame.shape))
+            boxes.append(tile_boxes + np.array([x0, y0, x0, y0]))
+            scores.append(r.boxes.conf.cpu().numpy())
+            classes.append(r.boxes.cls.cpu().numpy())
+
+    if not boxes:
+        return []
+
+    boxes = np.concatenate(boxes)
+    scores = np.concatenate(scores)
+    classes = np.concatenate(classes)
+    complete = np.concatenate(complete)
+
+    return [
+        {
+            "class": model.names[int(classes[i])],
+            "confidence": float(scores[i]),
+            "bbox": boxes[i].tolist(),
+        }
+        for i in nms(boxes, scores, classes, iou_threshold, CONTAINMENT_THRESHOLD, complete)
+    ]
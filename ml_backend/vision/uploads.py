@@ -0,0 +1,109 @@
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+
+from . import stats
+from .models import Batch, LepImage
+from .progress import progress
+from .response_cache import bump_versions_on_commit
+from .utils import make_batch_prefix
+
+
+def upload_prefix(batch: Batch) -> str:
+    """
+    Каталог набора для загрузки по POST-политике. Строится по дате создания
+    набора, поэтому не меняется между запросами политики.
+    """
+    return make_batch_prefix(batch.id, batch.uploaded_at)
+
+
+def upload_policy(batch: Batch) -> dict:
+    """
+    Одна presigned POST-политика на каталог набора вместо ссылки на каждый файл.
+
+    Клиент отправляет multipart/form-data на ``url`` с полями ``fields``,
+    полем ``Content-Type`` (image/*) и файлом; ключом станет
+    ``<prefix><имя файла>``. Политика ограничивает каталог, тип и размер
+    файла и действует VISION_UPLOAD_POLICY_EXPIRES секунд. Запретить
+    ``/`` в имени условия POST-политики не позволяют, такие файлы
+    отклоняет register_uploads.
+
+    Returns:
+        dict: url, fields, prefix, expires_at
+    """
+    prefix = upload_prefix(batch)
+    expires = settings.VISION_UPLOAD_POLICY_EXPIRES
+    expires_at = datetime.datetime.now(datetime.UTC) + datetime.timedelta(seconds=expires)
+    post = settings.S3_CLIENT_PUBLIC.generate_presigned_post(
+        Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+        Key=f"{prefix}${{filename}}",
+        Conditions=[
+            ["starts-with", "$Content-Type", "image/"],
+            ["content-length-range", 1, settings.VISION_UPLOAD_MAX_BYTES],
+        ],
+        ExpiresIn=expires,
+    )
+    return {**post, "prefix": prefix, "expires_at": expires_at}
+
+
+def create_images(batch_id: int, images: list) -> list:
+    """
+    Сохраняет снимки набора одним bulk_create. Вызывается в транзакции.
+
+    bulk_create не вызывает post_save, поэтому счётчики набора, прогресс
+    и версии кэша ответов обновляются здесь.
+    """
+    images = LepImage.objects.bulk_create(images, batch_size=1000)
+    if images:
+        stats.add_batch_counters(batch_id, total=len(images))
+        bump_versions_on_commit(batch_id)
+        transaction.on_commit(lambda: progress.increment(batch_id, total=len(images)))
+    return images
+
+
+def register_uploads(batch_id: int, keys) -> tuple:
+    """
+    Создаёт снимки для файлов, которые клиент загрузил по POST-политике
+    под своими именами: ключи прямо в каталоге набора, для которых ещё
+    нет LepImage. Координаты заполнятся из EXIF при обработке.
+
+    Ключи во вложенных каталогах (имя файла с ``/``) не регистрируются:
+    сервис таких ключей не создаёт, и производные файлы для них
+    не строятся. Они возвращаются отдельно, чтобы их удалить.
+
+    Args:
+        batch_id: ID набора
+        keys: ключи объектов в бакете
+
+    Returns:
+        tuple: созданные снимки и отклонённые ключи
+    """
+    with transaction.atomic():
+        # Блокировка набора не даёт параллельным подтверждениям создать дубли
+        batch = Batch.objects.select_for_update().filter(id=batch_id).first()
+        if batch is None:
+            return [], []
+
+        prefix = upload_prefix(batch)
+        uploaded, rejected = set(), []
+        for key in keys:
+            if not key.startswith(prefix) or key == prefix:
+                continue
+            if "/" in key[len(prefix):]:
+                rejected.append(key)
+            else:
+                uploaded.add(key)
+        rejected.sort()
+        if not uploaded:
+            return [], rejected
+
+        known = set(
+            LepImage.objects.filter(batch_id=batch_id, file_key__startswith=prefix)
+            .values_list("file_key", flat=True)
+        )
+        created = create_images(
+            batch_id,
+            [LepImage(batch_id=batch_id, file_key=key) for key in sorted(uploaded - known)],
+        )
+    return created, rejected
@@ -8,6 +8,7 @@ from .views import (
     ConfirmUploadAPIView,
     BatchStatusView,
     BatchImagesStatsView, BatchDeleteView, ImageDeleteView, BatchUpdateView, DefectStatsView,
+    ImageRenderView, BatchEventsView,
 )
 
 urlpatterns = [
@@ -17,9 +18,11 @@ urlpatterns = [
     path("batches/init/", InitUploadAPIView.as_view(), name="init-upload"),
     path("batches/confirm/", ConfirmUploadAPIView.as_view(), name="confirm-upload"),
     path("batches/status/<int:pk>/", BatchStatusView.as_view(), name="batch-status"),
+    path("batches/<int:pk>/events/", BatchEventsView.as_view(), name="batch-events"),
     path("batches/stats/", BatchImagesStatsView.as_view(), name="batch-stats"),
     path('batches/delete/<int:pk>/', BatchDeleteView.as_view(), name='delete-batch'),
     path('images/delete/', ImageDeleteView.as_view(), name='delete-image'),
+    path('images/<int:pk>/render/', ImageRenderView.as_view(), name='image-render'),
     path('batch/update/<int:pk>/', BatchUpdateView.as_view(), name='update-image'),
     path('defects/stats/', DefectStatsView.as_view(), name='defect-stats'),
 ]
@@ -2,11 +2,30 @@ import datetime
 import uuid
 
 
-def make_file_key(batch_id: int, original_name: str) -> str:
+def make_batch_prefix(batch_id: int, day: datetime.datetime = None) -> str:
+    """
+    Каталог загрузок набора в бакете: uploads/<дата UTC>/batch_<id>/.
+
+    Args:
+        batch_id: ID набора
+        day: момент, по дате которого строится каталог, по умолчанию текущий
+    """
+    day = (day or datetime.datetime.now(datetime.UTC)).astimezone(datetime.UTC)
+    return f"uploads/{day:%Y/%m/%d}/batch_{batch_id}/"
+
+
+def make_file_key(batch_id: int, original_name: str, day: datetime.datetime = None) -> str:
     ext = original_name.split(".")[-1].lower()
     uid = uuid.uuid4()
-    today = datetime.datetime.now(datetime.UTC)
 
-    return (
-        f"uploads/{today:%Y/%m/%d}/batch_{batch_id}/{uid}.{ext}"
-    )
\ No newline at end of file
+    return f"{make_batch_prefix(batch_id, day)}{uid}.{ext}"
+
+
+def make_derived_key(file_key: str, prefix: str) -> str:
+    """
+    Строит ключ производного файла (результат, превью) по ключу оригинала.
+    """
+    derived_key = file_key.replace("uploads", prefix)
+    if derived_key == file_key:
+        derived_key = f"{prefix}/{file_key}"
+    return derived_key
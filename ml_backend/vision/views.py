@@ -1,9 +1,18 @@
+import json
+import logging
 from collections import defaultdict
-from datetime import timedelta
+from datetime import timedelta, timezone as dt_timezone
+from itertools import batched
 
 from django.conf import settings
-from django.db.models import Count, Q
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.views import View
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import (
     OpenApiParameter,
@@ -13,25 +22,38 @@ from drf_spectacular.utils import (
 from drf_spectacular.utils import extend_schema
 from rest_framework import generics
 from rest_framework import status
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ParseError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from .events import batch_events
 from .filters import BatchFilter
-from .models import AiModel, Batch, LepImage
+from .models import AiModel, Batch, BatchStats, DailyClassStats, LepImage, DAMAGE_CLASSES
 from .serializers import (
     AiModelListSerializer,
     BatchListSerializer,
     LepImageSerializer,
+    InitUploadHeaderSerializer,
     InitUploadSerializer,
+    UploadFileItemSerializer,
     ConfirmUploadSerializer,
     BatchStatusSerializer,
     DeleteBatchSerializer,
     BulkDeleteImageSerializer, BatchUpdateResponseSerializer, BatchUpdateSerializer, DefectStatsWeeklySerializer,
 )
-from .tasks import process_image_task
+from .pagination import CURSOR_PARAMETERS, KeysetOptInPagination
+from .presign import presign_put_urls
+from .progress import progress
+from .render import RENDER_SIZES, render_image, render_key
+from .response_cache import cached_response
+from .tasks import confirm_batch_task
+from .uploads import create_images, upload_policy
 from .utils import make_file_key
 
+logger = logging.getLogger(__name__)
+
+NDJSON = "application/x-ndjson"
+
 
 @extend_schema(
     tags=["Модели ИИ"],
@@ -44,10 +66,8 @@ class AiModelListView(generics.ListAPIView):
     serializer_class = AiModelListSerializer
 
 
-class BatchPagination(PageNumberPagination):
-    page_size = 10
-    page_size_query_param = "size"
-    max_page_size = 50
+class BatchPagination(KeysetOptInPagination):
+    cursor_ordering = ("-uploaded_at", "-id")
 
 
 @extend_schema(
@@ -63,26 +83,26 @@ class BatchPagination(PageNumberPagination):
         OpenApiParameter(name="name", type=str, description="Фильтр по имени"),
         OpenApiParameter(name="date_from", type=str, description="Фильтр по дате (с)"),
         OpenApiParameter(name="date_to", type=str, description="Фильтр по дате (по)"),
+        *CURSOR_PARAMETERS,
     ],
     responses={200: BatchListSerializer(many=True)},
 )
 class BatchListView(generics.ListAPIView):
     queryset = (
-        Batch.objects.all().prefetch_related("lepimage_set").order_by("-uploaded_at")
+        Batch.objects.all().select_related("stats").order_by("-uploaded_at")
     )
     serializer_class = BatchListSerializer
     filterset_class = BatchFilter
     pagination_class = BatchPagination
 
     @extend_schema(operation_id="batch_list")
+    @cached_response()
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
 
-class BatchDetailPagination(PageNumberPagination):
-    page_size = 10
-    page_size_query_param = "size"
-    max_page_size = 50
+class BatchDetailPagination(KeysetOptInPagination):
+    cursor_ordering = ("id",)
 
 
 @extend_schema(
@@ -92,6 +112,7 @@ class BatchDetailPagination(PageNumberPagination):
     parameters=[
         OpenApiParameter(name="page", type=int, description="Номер страницы"),
         OpenApiParameter(name="size", type=int, description="Размер страницы"),
+        *CURSOR_PARAMETERS,
     ],
     responses={200: LepImageSerializer(many=True)},
 )
@@ -99,11 +120,24 @@ class BatchDetailView(generics.ListAPIView):
     serializer_class = LepImageSerializer
     pagination_class = BatchDetailPagination
 
+    def estimate_count(self, queryset) -> int:
+        # Количество снимков набора уже лежит в сводке, оценка не нужна
+        total = BatchStats.objects.filter(batch_id=self.kwargs.get("pk")).values_list(
+            "total", flat=True
+        ).first()
+        return total or 0
+
     def get_queryset(self):
         batch_id = self.kwargs.get("pk")
-        return LepImage.objects.filter(batch_id=batch_id)
+        return (
+            LepImage.objects.filter(batch_id=batch_id)
+            .select_related("batch")
+            .prefetch_related("detections")
+            .defer("detection_result")
+        )
 
     @extend_schema(operation_id="batch_detail")
+    @cached_response(per_batch=True)
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
@@ -118,8 +152,29 @@ class InitUploadAPIView(APIView):
                 "**Важно:** Django сам файл не принимает — загрузка происходит напрямую в MinIO.\n\n"
                 "**На вход:** список оригинальных имён файлов.\n\n"
                 "**На выход:** `batch_id`, список созданных объектов `LepImage` "
-                "с полями `image_id`, `file_key` и `upload_url`."
+                "с полями `image_id`, `file_key` и `upload_url`.\n\n"
+                "**Потоковый режим** (`?stream=true` или тело `application/x-ndjson`, "
+                "где первая строка — `{\"batch_name\": ...}`, а остальные — файлы): "
+                "ответ в NDJSON, первая строка — `{\"batch_id\": ...}`, далее по строке "
+                "на файл. Ссылки отдаются пачками, не дожидаясь обработки всего списка. "
+                "Тело проверяется целиком до ответа: ошибки в строках дают 400 "
+                "с номерами строк. Сбой посреди потока передаётся последней строкой "
+                "`{\"error\": ...}`, снимки из уже отданных строк остаются созданными.\n\n"
+                "**Режим policy** (`upload_mode: \"policy\"`, без `files`): вместо ссылки "
+                "на каждый файл выдаётся одна presigned POST-политика `upload_policy` "
+                "на каталог набора. Клиент загружает по ней любое количество файлов "
+                "под своими именами (поле формы `Content-Type` — image/*), снимки "
+                "создаются при подтверждении загрузки. Имена с `/` не принимаются: "
+                "такие файлы при подтверждении удаляются, по каждому приходит событие "
+                "`error`, а ключи возвращаются в `rejected` результата задачи."
         ),
+        parameters=[
+            OpenApiParameter(
+                name="stream",
+                type=bool,
+                description="Отдавать ответ потоком NDJSON",
+            ),
+        ],
         request=InitUploadSerializer,
         responses={
             201: OpenApiResponse(
@@ -143,49 +198,156 @@ class InitUploadAPIView(APIView):
                                 },
                             ],
                         },
-                    )
+                    ),
+                    OpenApiExample(
+                        "Режим policy",
+                        value={
+                            "batch_id": 12,
+                            "upload_policy": {
+                                "url": "https://minio.example.com/ml-media",
+                                "fields": {
+                                    "key": "uploads/2025/11/19/batch_12/${filename}",
+                                    "x-amz-algorithm": "AWS4-HMAC-SHA256",
+                                    "x-amz-credential": "...",
+                                    "x-amz-date": "20251119T120000Z",
+                                    "policy": "...",
+                                    "x-amz-signature": "...",
+                                },
+                                "prefix": "uploads/2025/11/19/batch_12/",
+                                "expires_at": "2025-11-19T12:15:00Z",
+                            },
+                        },
+                    ),
                 ],
             )
         },
     )
     def post(self, request):
-        serializer = InitUploadSerializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-
-        batch_name = serializer.validated_data["batch_name"]
-        batch = Batch.objects.create(name=batch_name)
-
-        response_files = []
-
-        for file_data in serializer.validated_data["files"]:
-            filename = file_data["filename"]
-            latitude = file_data.get("latitude")
-            longitude = file_data.get("longitude")
-
-            key = make_file_key(batch.id, filename)
-
-            image = LepImage.objects.create(
-                batch=batch,
-                file_key=key,
-                latitude=latitude,
-                longitude=longitude,
+        streaming = request.query_params.get("stream") in ("1", "true")
+        if request.content_type.startswith(NDJSON):
+            # Тело читается и проверяется целиком до ответа: после начала
+            # потокового ответа читать запрос под WSGI ненадёжно
+            streaming = True
+            serializer, files, errors = self._parse_ndjson(request)
+            if errors:
+                return Response({"files": errors}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            serializer = InitUploadSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            files = serializer.validated_data.get("files", [])
+
+        batch_name = serializer.validated_data.get("batch_name")
+
+        if serializer.validated_data.get("upload_mode") == "policy":
+            batch = Batch.objects.create(name=batch_name)
+            return Response(
+                {"batch_id": batch.id, "upload_policy": upload_policy(batch)},
+                status=status.HTTP_201_CREATED,
             )
 
-            url = settings.S3_CLIENT_PUBLIC.generate_presigned_url(
-                ClientMethod="put_object",
-                Params={"Bucket": settings.AWS_STORAGE_BUCKET_NAME, "Key": key},
-                ExpiresIn=3600,
+        if streaming:
+            batch = Batch.objects.create(name=batch_name)
+            return StreamingHttpResponse(
+                self._stream(batch, files),
+                status=status.HTTP_201_CREATED,
+                content_type=NDJSON,
+                headers={"X-Accel-Buffering": "no", "Cache-Control": "no-cache"},
             )
 
-            response_files.append(
-                {"image_id": image.id, "file_key": key, "upload_url": url}
-            )
+        with transaction.atomic():
+            batch = Batch.objects.create(name=batch_name)
+            response_files = self._create_images(batch, files)
 
         return Response(
             {"batch_id": batch.id, "files": response_files},
             status=status.HTTP_201_CREATED,
         )
 
+    def _stream(self, batch, files):
+        """
+        Отдаёт NDJSON: сначала batch_id, затем по строке на файл пачками
+        по VISION_INIT_CHUNK_SIZE. Каждая пачка создаётся в своей транзакции,
+        поэтому клиент начинает загрузку первых файлов, пока готовятся остальные.
+
+        Статус 201 уже отправлен, поэтому ошибка посреди потока передаётся
+        последней строкой ``{"error": ...}``: снимки из отданных строк созданы,
+        остальные — нет.
+        """
+        yield json.dumps({"batch_id": batch.id}) + "\n"
+        for chunk in batched(files, settings.VISION_INIT_CHUNK_SIZE):
+            try:
+                with transaction.atomic():
+                    created = self._create_images(batch, chunk)
+            except Exception as e:
+                logger.exception("Failed to create images for batch %s", batch.id)
+                yield json.dumps({"error": str(e)}, ensure_ascii=False) + "\n"
+                return
+            yield "".join(json.dumps(file_info) + "\n" for file_info in created)
+
+    @staticmethod
+    def _parse_ndjson(request):
+        """
+        Разбирает NDJSON-тело: первая строка — заголовок, остальные — файлы.
+
+        Returns:
+            tuple: проверенный InitUploadHeaderSerializer, список файлов
+            и ошибки строк файлов с номерами строк
+
+        Raises:
+            ParseError: первая строка не JSON-объект
+        """
+        lines = []
+        for line_number, line in enumerate(request.stream or [], start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                lines.append((line_number, json.loads(line), None))
+            except ValueError as e:
+                lines.append((line_number, None, str(e)))
+
+        if not lines or lines[0][2] or not isinstance(lines[0][1], dict):
+            raise ParseError("Первая строка должна быть JSON-объектом с batch_name")
+        serializer = InitUploadHeaderSerializer(data=lines[0][1])
+        serializer.is_valid(raise_exception=True)
+
+        files = []
+        errors = []
+        for line_number, data, error in lines[1:]:
+            item = UploadFileItemSerializer(data=data) if error is None else None
+            if item is not None and item.is_valid():
+                files.append(item.validated_data)
+            else:
+                errors.append({"line": line_number, "errors": error or item.errors})
+        return serializer, files, errors
+
+    @staticmethod
+    def _create_images(batch, files) -> list:
+        """
+        Создаёт снимки одним bulk_create и подписывает ссылки на загрузку.
+        """
+        images = create_images(
+            batch.id,
+            [
+                LepImage(
+                    batch=batch,
+                    file_key=make_file_key(batch.id, file_data["filename"], batch.uploaded_at),
+                    latitude=file_data.get("latitude"),
+                    longitude=file_data.get("longitude"),
+                )
+                for file_data in files
+            ],
+        )
+        urls = presign_put_urls(
+            settings.AWS_STORAGE_BUCKET_NAME,
+            [image.file_key for image in images],
+            expires=3600,
+        )
+        return [
+            {"image_id": image.id, "file_key": image.file_key, "upload_url": url}
+            for image, url in zip(images, urls)
+        ]
+
 
 class ConfirmUploadAPIView(APIView):
     @extend_schema(
@@ -193,13 +355,23 @@ class ConfirmUploadAPIView(APIView):
         summary="Подтверждение загрузки batch",
         description=(
                 "После того, как клиент загрузил все файлы через pre-signed URL, "
-                "эта ручка проверяет наличие файлов и помечает их как загруженные. "
-                "Также запускается прогон выбранной модели ИИ по новым изображениям."
+                "эта ручка ставит в очередь одну задачу и сразу отвечает. "
+                "Задача в фоне проверяет наличие файлов в бакете и запускает "
+                "прогон выбранной модели ИИ по новым изображениям.\n\n"
+                "Изображения ставятся в очередь диспетчера, который отправляет их "
+                "на воркеры порциями, чередуя наборы: маленький набор не ждёт "
+                "окончания обработки большого.\n\n"
+                "`chunk_size` — сколько изображений прогоняется через модель за один вызов.\n\n"
+                "`processed_images` — количество необработанных изображений набора "
+                "на момент подтверждения; файлы, которых нет в бакете, будут пропущены. "
+                "Файлы, загруженные по POST-политике, регистрируются задачей "
+                "и в это число не входят; файлы с `/` в имени задача удаляет "
+                "и перечисляет в `rejected` своего результата."
         ),
         request=ConfirmUploadSerializer,
         responses={
-            200: OpenApiResponse(
-                description="Batch подтвержден и запущен прогон моделей",
+            202: OpenApiResponse(
+                description="Batch принят, проверка файлов и прогон моделей запущены в фоне",
                 response=OpenApiTypes.OBJECT,
                 examples=[
                     OpenApiExample(
@@ -207,6 +379,7 @@ class ConfirmUploadAPIView(APIView):
                         value={
                             "batch_id": 12,
                             "processed_images": 10,
+                            "task_id": "0b6f3c1e-7a52-4c1b-9d9e-2f1f0c6a9e41",
                         },
                     )
                 ],
@@ -218,6 +391,7 @@ class ConfirmUploadAPIView(APIView):
         serializer.is_valid(raise_exception=True)
         batch_id = serializer.validated_data["batch_id"]
         model_id = serializer.validated_data["model_id"]
+        chunk_size = serializer.validated_data.get("chunk_size")
 
         try:
             batch = Batch.objects.get(id=batch_id)
@@ -233,21 +407,18 @@ class ConfirmUploadAPIView(APIView):
                 {"detail": "Модель не найдена"}, status=status.HTTP_404_NOT_FOUND
             )
 
-        s3 = settings.S3_CLIENT_PRIVATE
-        confirmed_count = 0
-        for image in batch.lepimage_set.filter(detection_result__isnull=True):
-            try:
-                s3.head_object(
-                    Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=image.file_key
-                )
-                confirmed_count += 1
-                process_image_task.delay(image.file_key, model_id)
-            except s3.exceptions.ClientError:
-                continue
+        pending_count = batch.lepimage_set.filter(detection_result__isnull=True).count()
+        task = confirm_batch_task.apply_async(
+            (batch.id, model_id, chunk_size or settings.VISION_CHUNK_SIZE)
+        )
 
         return Response(
-            {"batch_id": batch.id, "processed_images": confirmed_count},
-            status=status.HTTP_200_OK,
+            {
+                "batch_id": batch.id,
+                "processed_images": pending_count,
+                "task_id": task.id,
+            },
+            status=status.HTTP_202_ACCEPTED,
         )
 
 
@@ -258,9 +429,41 @@ class ConfirmUploadAPIView(APIView):
     responses={200: BatchStatusSerializer},
 )
 class BatchStatusView(generics.RetrieveAPIView):
-    queryset = Batch.objects.all()
     serializer_class = BatchStatusSerializer
 
+    def get_object(self):
+        counters = progress.get(self.kwargs["pk"])
+        if counters is None:
+            raise Http404
+        return counters
+
+
+class BatchEventsView(View):
+    """
+    Поток Server-Sent Events с прогрессом обработки набора.
+
+    События:
+        progress — текущие счётчики набора (первое событие потока);
+        image    — снимок обработан: image_id, file_key, detections_count,
+                   preview, result и счётчики набора;
+        error    — снимок не удалось обработать;
+        done     — обработка набора завершена, поток закрывается.
+
+    Представление асинхронное и рассчитано на запуск под ASGI (сервис
+    lep-events в docker-compose), чтобы открытые соединения не занимали
+    воркеры gunicorn.
+    """
+
+    async def get(self, request, pk: int):
+        if not await Batch.objects.filter(id=pk).aexists():
+            raise Http404
+
+        return StreamingHttpResponse(
+            batch_events(pk),
+            content_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
 
 class BatchImagesStatsView(APIView):
     @extend_schema(
@@ -285,47 +488,21 @@ class BatchImagesStatsView(APIView):
             }
         },
     )
+    @cached_response()
     def get(self, request):
-        damage_classes = {
-            "bad_insulator",
-            "damaged_insulator",
-            "nest",
-        }
-
-        # Получаем агрегированные данные по каждому батчу
-        batches_stats = Batch.objects.annotate(
-            total=Count('lepimage'),
-            processed=Count('lepimage', filter=Q(lepimage__detection_result__isnull=False))
-        ).values('id', 'name', 'total', 'processed')
+        # Счётчики наборов берутся из сводки BatchStats, снимки не сканируются
+        batches_stats = BatchStats.objects.order_by('-batch__uploaded_at').values(
+            'batch_id', 'batch__name', 'total', 'processed', 'images_with_damage'
+        )
 
         result = []
 
         for batch_stat in batches_stats:
-            batch_id = batch_stat['id']
+            batch_id = batch_stat['batch_id']
             total = batch_stat['total']
             processed = batch_stat['processed']
             not_processed = total - processed
-
-            # Подсчитываем изображения с повреждениями для данного батча
-            images_with_damage = 0
-
-            if processed > 0:
-                processed_images = LepImage.objects.filter(
-                    batch_id=batch_id,
-                    detection_result__isnull=False
-                ).only('detection_result')
-
-                for image in processed_images:
-                    if not image.detection_result:
-                        continue
-
-                    has_damage = any(
-                        item.get("class") in damage_classes
-                        for item in image.detection_result
-                    )
-
-                    if has_damage:
-                        images_with_damage += 1
+            images_with_damage = batch_stat['images_with_damage']
 
             damage_percentage = 0.0
             if processed > 0:
@@ -333,7 +510,7 @@ class BatchImagesStatsView(APIView):
 
             result.append({
                 "batch_id": batch_id,
-                "batch_name": batch_stat['name'] or '---',
+                "batch_name": batch_stat['batch__name'] or '---',
                 "total": total,
                 "processed": processed,
                 "not_processed": not_processed,
@@ -344,6 +521,64 @@ class BatchImagesStatsView(APIView):
         return Response(result, status=status.HTTP_200_OK)
 
 
+class ImageRenderView(APIView):
+    @extend_schema(
+        tags=["Обработка и отдача фото"],
+        summary="Изображение с разметкой",
+        description=(
+                "Рисует рамки детекций из `detection_result` поверх оригинала "
+                "и отдаёт JPEG. Готовые изображения кэшируются в Redis "
+                "с ограничением по суммарному размеру. Поддерживает If-None-Match."
+        ),
+        parameters=[
+            OpenApiParameter(
+                name="size",
+                type=str,
+                enum=list(RENDER_SIZES),
+                description="full — исходный размер, preview — до 512 px",
+            ),
+        ],
+        responses={
+            (200, "image/jpeg"): OpenApiTypes.BINARY,
+            304: OpenApiResponse(description="Разметка не менялась с прошлого запроса"),
+            404: OpenApiResponse(description="Фото не найдено или ещё не обработано"),
+        },
+    )
+    def get(self, request, pk):
+        size = request.query_params.get("size", "full")
+        if size not in RENDER_SIZES:
+            return Response(
+                {"detail": f"size должен быть одним из: {', '.join(RENDER_SIZES)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        image_obj = get_object_or_404(
+            LepImage.objects.only("id", "file_key", "detection_result"), pk=pk
+        )
+        if image_obj.detection_result is None:
+            return Response(
+                {"detail": "Фото ещё не обработано"}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        # Ключ отрисовки меняется вместе с детекциями, поэтому годится как ETag:
+        # повторный запрос получает 304 без чтения оригинала и отрисовки
+        headers = {
+            "Cache-Control": "private, max-age=3600",
+            "ETag": quote_etag(render_key(image_obj, size)),
+        }
+        not_modified = get_conditional_response(request, etag=headers["ETag"])
+        if not_modified is not None:
+            for header, value in headers.items():
+                not_modified.headers[header] = value
+            return not_modified
+
+        return HttpResponse(
+            render_image(image_obj, size),
+            content_type="image/jpeg",
+            headers=headers,
+        )
+
+
 @extend_schema(
     tags=["Обработка и отдача фото"],
     summary="Удаление набора фото",
@@ -400,9 +635,12 @@ class BatchUpdateView(generics.UpdateAPIView):
         **Параметры:**
         - `name` (опционально) — новое имя батча
         - `upload_requests` (опционально) — массив имен файлов
+        - `upload_policy` (опционально) — выдать одну POST-политику на каталог набора
 
         **Ответ:**
         - Данные батча + словарь `presigned_urls` с ссылками
+        - `upload_policy` — при запросе политики; файлы, загруженные по ней,
+          становятся снимками при подтверждении загрузки
         """,
         request=BatchUpdateSerializer,
         responses={200: BatchUpdateResponseSerializer},
@@ -429,6 +667,7 @@ class BatchUpdateView(generics.UpdateAPIView):
         serializer.is_valid(raise_exception=True)
 
         upload_requests = serializer.validated_data.pop('upload_requests', [])
+        with_policy = serializer.validated_data.pop('upload_policy', False)
 
         self.perform_update(serializer)
 
@@ -438,7 +677,8 @@ class BatchUpdateView(generics.UpdateAPIView):
             s3_client = settings.S3_CLIENT_PRIVATE
 
             for filename in upload_requests:
-                s3_key = make_file_key(instance.id, filename)
+                # Ключи в каталоге набора: подтверждение зарегистрирует загруженные файлы
+                s3_key = make_file_key(instance.id, filename, instance.uploaded_at)
 
                 try:
                     url = s3_client.generate_presigned_url(
@@ -455,6 +695,8 @@ class BatchUpdateView(generics.UpdateAPIView):
 
         response_data = serializer.data
         response_data['presigned_urls'] = presigned_urls
+        if with_policy:
+            response_data['upload_policy'] = upload_policy(instance)
 
         return Response(response_data, status=status.HTTP_200_OK)
 
@@ -463,44 +705,44 @@ class BatchUpdateView(generics.UpdateAPIView):
 class DefectStatsView(APIView):
     @extend_schema(
         summary="Статистика дефектов по дням за неделю",
-        description="Возвращает количество дефектов для каждого дня за последние 7 дней",
+        description=(
+            "Возвращает количество дефектов для каждого дня за последние 7 дней. "
+            "Период — целые сутки UTC с даты «сейчас − 7 дней» по сегодняшнюю "
+            "включительно: первый день учитывается полностью, а не с текущего часа."
+        ),
         responses={200: DefectStatsWeeklySerializer}
     )
+    @cached_response()
     def get(self, request):
         end_date = timezone.now()
         start_date = end_date - timedelta(days=7)
 
-        damage_classes = {
-            "bad_insulator",
-            "damaged_insulator",
-            "nest",
-        }
-
-        batches_last_week = Batch.objects.filter(
-            uploaded_at__gte=start_date,
-            uploaded_at__lte=end_date
-        ).prefetch_related('lepimage_set')
+        # Сводки хранят целые дни UTC, поэтому окно 7×24 ч расширяется
+        # до полных суток: первый день входит целиком
+        week = Q(
+            day__gte=start_date.astimezone(dt_timezone.utc).date(),
+            day__lte=end_date.astimezone(dt_timezone.utc).date(),
+        )
 
         daily_data = defaultdict(lambda: {'defect_count': 0, 'image_count': 0})
 
-        total_defects = 0
-
-        for batch in batches_last_week:
-            batch_date = batch.uploaded_at.date()
-
-            for image in batch.lepimage_set.all():
-                daily_data[batch_date]['image_count'] += 1
-
-                if not image.detection_result:
-                    continue
-
-                defect_count = sum(
-                    1 for item in image.detection_result
-                    if item.get("class") in damage_classes
-                )
+        image_counts = (
+            BatchStats.objects.filter(week)
+            .values('day')
+            .annotate(count=Sum('total'))
+        )
+        for row in image_counts:
+            daily_data[row['day']]['image_count'] = row['count']
 
-                daily_data[batch_date]['defect_count'] += defect_count
-                total_defects += defect_count
+        defect_counts = (
+            DailyClassStats.objects.filter(week, class_name__in=DAMAGE_CLASSES)
+            .values('day')
+            .annotate(count=Sum('count'))
+        )
+        total_defects = 0
+        for row in defect_counts:
+            daily_data[row['day']]['defect_count'] = row['count']
+            total_defects += row['count']
 
         daily_stats = []
         for day_date in sorted(daily_data.keys()):
@@ -0,0 +1,102 @@
+import logging
+
+from django.db import transaction
+
+from .events import publish_image_processed
+from .models import Detection, LepImage
+from .progress import progress
+from .response_cache import bump_versions
+from .result_cache import remember_result
+from .stats import record_results
+
+logger = logging.getLogger(__name__)
+
+# Поля LepImage, которые меняет инференс
+RESULT_FIELDS = ["preview", "result", "detection_result", "latitude", "longitude"]
+# Сводные поля, которые LepImage.summarize() считает по detection_result
+SUMMARY_FIELDS = ["has_damage", "damage_count", "object_count", "max_damage_confidence", "class_counts"]
+
+
+def replace_detections(images):
+    """
+    Пересобирает строки Detection для снимков по их detection_result.
+    Вызывается в той же транзакции, что и запись detection_result.
+    """
+    Detection.objects.filter(image_id__in=[image_obj.id for image_obj in images]).delete()
+    Detection.objects.bulk_create(
+        [detection for image_obj in images for detection in Detection.from_result(image_obj)],
+        batch_size=1000,
+    )
+
+
+class ResultWriter:
+    """
+    Буфер результатов инференса с записью в БД пачками.
+
+    Каждые ``flush_size`` результатов записываются одним bulk_update
+    только по RESULT_FIELDS в отдельной транзакции: вместо UPDATE всех
+    колонок на каждый снимок — один UPDATE ... CASE на пачку.
+    Вместе с результатом пишутся сводные поля снимка, а в той же
+    транзакции обновляются строки Detection и сводки vision.stats.
+    Счётчики прогресса, события, кэш результатов и версии кэша ответов
+    обновляются после коммита транзакции, чтобы подписчики не увидели незаписанные данные.
+    """
+
+    def __init__(self, flush_size: int):
+        self.flush_size = flush_size
+        self._buffer = []
+        self.written = 0
+
+    def add(self, image_obj: LepImage, cache_key: str = None):
+        """
+        Args:
+            image_obj: снимок с заполненными RESULT_FIELDS
+            cache_key: ключ кэша результатов; None — результат уже из кэша
+        """
+        self._buffer.append((image_obj, cache_key))
+        if len(self._buffer) >= self.flush_size:
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        Returns:
+            int: количество записанных снимков
+        """
+        if not self._buffer:
+            return 0
+
+        rows, self._buffer = self._buffer, []
+        images = [image_obj for image_obj, _ in rows]
+        for image_obj in images:
+            image_obj.summarize()
+        with transaction.atomic():
+            newly_processed = record_results(images)
+            LepImage.objects.bulk_update(images, fields=RESULT_FIELDS + SUMMARY_FIELDS)
+            replace_detections(images)
+            transaction.on_commit(lambda: self._after_commit(rows, newly_processed))
+
+        self.written += len(rows)
+        return len(rows)
+
+    @staticmethod
+    def _after_commit(rows, newly_processed: set):
+        processed = {}
+        for image_obj, _ in rows:
+            processed[image_obj.batch_id] = (
+                processed.get(image_obj.batch_id, 0) + (image_obj.id in newly_processed)
+            )
+
+        counters = {}
+        for batch_id, count in processed.items():
+            # Без Redis события уходят без прогресса, счётчики
+            # восстановит reconcile_progress_task
+            try:
+                counters[batch_id] = progress.increment(batch_id, processed=count)
+            except Exception as e:
+                logger.warning("Failed to update progress of batch %s: %s", batch_id, e)
+                counters[batch_id] = None
+        bump_versions(*counters)
+        for image_obj, cache_key in rows:
+            publish_image_processed(image_obj, counters[image_obj.batch_id])
+            if cache_key is not None:
+                remember_result(cache_key, image_obj)